@@ -8,5 +8,8 @@ import pmi
 import topkheap
 import class_tfidf
 import tfidf
+import vocabulary
+import keyword_server
+import minhash_index
 
-__all__ = ['inverted_index', 'pmi', 'topkheap', 'class_tfidf', 'tfidf']
\ No newline at end of file
+__all__ = ['inverted_index', 'pmi', 'topkheap', 'class_tfidf', 'tfidf', 'vocabulary', 'keyword_server', 'minhash_index']
\ No newline at end of file
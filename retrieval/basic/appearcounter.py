@@ -7,8 +7,35 @@
 
 from tfidf import TfIdf
 from operator import itemgetter
+import corpus_reader
+import itertools
+import multiprocessing
+import numpy
+import parallel_build
+
+# documents counted between two bincounts of a part
+COUNT_BATCH_SIZE = 100000
+
+# the AppearCount counting in the process pool, inherited by the workers
+_counting = None
+
+def _count_part(source):
+	return _counting._count_part(source)
 
 class AppearCount(TfIdf):
+
+	'''Count the appear times and docs of the words of a TfIdf vocabulary
+
+	The threshold queries run on the words sorted by count and by doc count,
+	built once after counting or loading, so each query is a binary search
+	and the word lists are slices.  Like get_count_result, the words of the
+	vocabulary which never appeared are counted 0.
+
+	Attributes:
+		word_count: dictory of "word : appear count"
+		word_doc_count: dictory of "word : appeared doc count"
+	'''
+
 	def __init__(self, corpus_filename = None, stopword_filename = None, DEFAULT_IDF = 1.5):
 		TfIdf.__init__(self, corpus_filename = corpus_filename, \
 			stopword_filename = stopword_filename, DEFAULT_IDF = DEFAULT_IDF)
@@ -19,6 +46,16 @@ class AppearCount(TfIdf):
 		'''
 		self.word_count = {}
 		self.word_doc_count = {}
+		self._sorted = None
+
+	def _add_tokens(self, tokens, filter_num):
+		# a term of a shared vocabulary may get its first count here
+		self._sorted = None
+		TfIdf._add_tokens(self, tokens, filter_num)
+
+	def merge(self, other):
+		self._sorted = None
+		return TfIdf.merge(self, other)
 
 	def count_file(self, _input, token = None):
 		'''count the given file
@@ -28,7 +65,7 @@ class AppearCount(TfIdf):
 			token : token to split term
 		'''
 		counted_words = set()
-		words = [word for word in self.get_tokens(_input, token = token) if word in self.term_num_docs]
+		words = [word for word in self.get_tokens(_input, token = token) if self.get_term_num_docs(word)]
 		for word in words:
 			try:
 				self.word_count[word] += 1
@@ -40,6 +77,88 @@ class AppearCount(TfIdf):
 				except:
 					self.word_doc_count[word] = 1
 			counted_words.add(word)
+		self._sorted = None
+
+	def count_files(self, source, workers = None, token = None, chunk_size = 100000):
+		'''Count the documents of a corpus over a process pool
+
+		Plain files are cut into one byte range per worker and each worker
+		reads its own ranges.  Compressed files and iterables are read here
+		and sent chunk_size documents at a time.  The workers count the term
+		ids of the vocabulary with numpy.bincount and the partial counts are
+		summed, so the result is the same as count_file for every document.
+
+		Args:
+			source : corpus file name with one document per line, .gz and .bz2
+				files are decompressed, a list of such names, or any other
+				iterable of documents
+			workers : number of processes, default is the cpu count
+			token : token to split term
+			chunk_size : documents sent to a worker at once for non plain files
+
+		Returns:
+			number of documents counted
+		'''
+		global _counting
+		workers = workers or multiprocessing.cpu_count()
+		if isinstance(source, basestring):
+			source = [source]
+		if isinstance(source, (list, tuple)):
+			tasks = itertools.chain(*[self._count_tasks(filename, workers, chunk_size)
+				for filename in source])
+		else:
+			tasks = corpus_reader.iter_batches(source, chunk_size)
+
+		self._count_token = token
+		num_docs = 0
+		word_count = numpy.zeros(len(self.vocab), dtype = numpy.int64)
+		word_doc_count = numpy.zeros(len(self.vocab), dtype = numpy.int64)
+		_counting = self
+		pool = multiprocessing.Pool(workers) if workers > 1 else None
+		try:
+			parts = pool.imap_unordered(_count_part, tasks) if pool else itertools.imap(_count_part, tasks)
+			for part_docs, part_count, part_doc_count in parts:
+				num_docs += part_docs
+				word_count += part_count
+				word_doc_count += part_doc_count
+		finally:
+			if pool:
+				pool.close()
+				pool.join()
+			_counting = None
+			del self._count_token
+
+		for term_id in numpy.nonzero(word_count)[0].tolist():
+			word = self.vocab.get_term(term_id)
+			self.word_count[word] = self.word_count.get(word, 0) + int(word_count[term_id])
+			self.word_doc_count[word] = self.word_doc_count.get(word, 0) + int(word_doc_count[term_id])
+		self._sorted = None
+		return num_docs
+
+	def _count_tasks(self, filename, workers, chunk_size):
+		if filename.endswith((".gz", ".bz2")):
+			return corpus_reader.iter_batches(corpus_reader.iter_documents(filename), chunk_size)
+		return [(filename, start, end) for start, end in parallel_build.shard_file(filename, workers)]
+
+	def _count_part(self, source):
+		if isinstance(source, tuple):
+			source = parallel_build.iter_shard(*source)
+		# only the terms of this TfIdf, a shared vocabulary may hold others
+		term_id = dict((term, i) for term, i in self.vocab.term_id.iteritems()
+			if i < len(self.term_num_docs) and self.term_num_docs[i])
+		num_docs = 0
+		word_count = numpy.zeros(len(self.vocab), dtype = numpy.int64)
+		word_doc_count = numpy.zeros(len(self.vocab), dtype = numpy.int64)
+		for docs in corpus_reader.iter_batches(source, COUNT_BATCH_SIZE):
+			ids, doc_ids = [], []
+			for doc in docs:
+				found = [i for i in map(term_id.get, self.get_tokens(doc, token = self._count_token)) if i is not None]
+				ids.extend(found)
+				doc_ids.extend(set(found))
+			num_docs += len(docs)
+			word_count += numpy.bincount(ids, minlength = len(word_count)).astype(numpy.int64)
+			word_doc_count += numpy.bincount(doc_ids, minlength = len(word_count)).astype(numpy.int64)
+		return num_docs, word_count, word_doc_count
 
 	def get_count_result(self, filename):
 		'''Write the count result to file
@@ -48,7 +167,7 @@ class AppearCount(TfIdf):
 			filename : file to save the result
 		'''
 		fw = open(filename, 'w')
-		for word in self.term_num_docs:
+		for word, _ in self:
 			if word not in self.word_doc_count:
 				self.word_doc_count[word] = 0
 				self.word_count[word] = 0
@@ -91,25 +210,41 @@ class AppearCount(TfIdf):
 		Args:
 			result_file : result file build by get_count_result method
 		'''
-		self.count_word = {}
-		self.doc_count_word = {}
+		# every line is "doc_count\tcount\tword", parsed as one block
 		with open(result_file, 'r') as fp:
-			for line in fp:
-				doc_count, count, word = line.strip().split("\t")
-				self.word_count[word] = int(count)
-				self.word_doc_count[word] = int(doc_count)
-				try:
-					self.count_word[int(count)] += 1
-				except:
-					self.count_word[int(count)] = 1
-				try:
-					self.doc_count_word[int(doc_count)] += 1
-				except:
-					self.doc_count_word[int(doc_count)] = 1
+			fields = fp.read().strip().replace("\r\n", "\n").replace("\n", "\t").split("\t")
+		if len(fields) < 3:
+			fields = []
+		words = fields[2::3]
+		counts = numpy.fromstring(" ".join(fields[1::3]), dtype = numpy.int64, sep = " ")
+		doc_counts = numpy.fromstring(" ".join(fields[0::3]), dtype = numpy.int64, sep = " ")
+		if not len(counts) == len(doc_counts) == len(words):
+			raise ValueError("not a count result file: " + result_file)
+		self.word_count.update(zip(words, counts.tolist()))
+		self.word_doc_count.update(zip(words, doc_counts.tolist()))
+		self.count_word = dict(zip(*[a.tolist() for a in numpy.unique(counts, return_counts = True)]))
+		self.doc_count_word = dict(zip(*[a.tolist() for a in numpy.unique(doc_counts, return_counts = True)]))
+		self._sorted = None
+
+	def _sorted_counts(self):
+		# (words by count, counts, words by doc count, doc counts), all sorted
+		if self._sorted is None:
+			words = list(self.word_count)
+			words.extend(set(word for word in self.word_doc_count if word not in self.word_count))
+			words.extend(set(word for word, _ in self if word not in self.word_count and
+				word not in self.word_doc_count))
+			words = numpy.array(words, dtype = object)
+			counts = numpy.array([self.word_count.get(word, 0) for word in words], dtype = numpy.int64)
+			doc_counts = numpy.array([self.word_doc_count.get(word, 0) for word in words], dtype = numpy.int64)
+			by_count = numpy.argsort(counts, kind = 'mergesort')
+			by_doc_count = numpy.argsort(doc_counts, kind = 'mergesort')
+			self._sorted = (words[by_count], counts[by_count],
+				words[by_doc_count], doc_counts[by_doc_count])
+		return self._sorted
 
 	def count_less_appear(self, less_than):
 		'''Count word count that appeared count less than given threshold
-		Must call after load_result_foranalyze
+		After counting or load_result_foranalyze
 
 		Args:
 			less_than : the threshold
@@ -117,15 +252,12 @@ class AppearCount(TfIdf):
 		Returns:
 			the count
 		'''
-		res = 0
-		for i in range(less_than):
-			if i in self.count_word:
-				res += self.count_word[i]
-		return res
+		_, counts, _, _ = self._sorted_counts()
+		return int(numpy.searchsorted(counts, less_than))
 
 	def doccount_less_appear(self, less_than):
 		'''Count word count that appeared doc count less than given threshold
-		Must call after load_result_foranalyze
+		After counting or load_result_foranalyze
 
 		Args:
 			less_than : the threshold
@@ -133,11 +265,8 @@ class AppearCount(TfIdf):
 		Returns:
 			the count
 		'''
-		res = 0
-		for i in range(less_than):
-			if i in self.doc_count_word:
-				res += self.doc_count_word[i]
-		return res
+		_, _, _, doc_counts = self._sorted_counts()
+		return int(numpy.searchsorted(doc_counts, less_than))
 
 	def get_words_doccount_less_appear(self, less_than):
 		'''Get word that doc it appeared in less than threshold
@@ -148,11 +277,8 @@ class AppearCount(TfIdf):
 		Returns:
 			List of words that doc it appeared in less than threshold
 		'''
-		res = []
-		for word, doc_count in self.word_doc_count.items():
-			if doc_count < less_than:
-				res.append(word)
-		return res
+		_, _, words, doc_counts = self._sorted_counts()
+		return words[:numpy.searchsorted(doc_counts, less_than)].tolist()
 
 	def get_words_less_appear(self, less_than):
 		'''Get the word appear less than threshold
@@ -163,8 +289,5 @@ class AppearCount(TfIdf):
 		Returns:
 			List of words that appeared in less than threshold
 		'''
-		res = []
-		for word, count in self.word_count.items():
-			if count < less_than:
-				res.append(word)
-		return res
\ No newline at end of file
+		words, counts, _, _ = self._sorted_counts()
+		return words[:numpy.searchsorted(counts, less_than)].tolist()
@@ -6,18 +6,47 @@
 #
 # @author: Jason Wu (Jasonwbw@yahoo.com)
 
+import corpus_reader
 import math
+import mmap as _mmap
+import numpy
 import re
+import struct
 from operator import itemgetter
 from topkheap import TopkHeap
+from topkheap import top_candidates
+from vocabulary import Vocabulary
+
+# binary corpus file layout, all in native byte order:
+#   header: magic, version, class_num, num_terms, size of the term dictionary
+#   num_docs: int64 * class_num
+#   term_cdf: float64 * num_terms * class_num, one row of classes per term
+#   term_num_docs: int32 * num_terms * class_num
+#   appeared, computed: uint8 * num_terms each, if the row is set
+#   terms: the term dictionary, terms joined by "\n" in row order
+BINARY_MAGIC = "CTFI"
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct("=4sIQQQ")
 
 class ClassTfIdf:
 
   '''Compute class realted tf-idf to find each class's keywords
+
+  The counts and the cdf are term id x class tables, so the cdf of every
+  term and class is computed in a few array operations.
+
+  Attributes:
+    class_num: number of classes
+    num_docs: list of the document count of every class
+    vocab: Vocabulary of the terms
+    term_num_docs: int32 array of the count of documents containing the term, by term id and class
+    term_cdf: float64 array of the class tf * class idf, by term id and class,
+      allocated by compute_all_cdf, so it has no rows for the terms added since
+    stopwords: all stop words
   '''
 
   def __init__(self, class_num, corpus_filename = None, 
-    cdf_filename = None, stopword_filename = None):
+    cdf_filename = None, stopword_filename = None, vocabulary = None):
     '''Initialize the idf dictionary.  
     
     If a corpus file is supplied, reads the term appeared dictionary from it, in the
@@ -38,12 +67,16 @@ class ClassTfIdf:
       corpus_filename: the term-appeared file name
       cdf_filename: the tern-cdf file name
       stopword_filename: file with one stopword in one line
+      vocabulary: Vocabulary instance to share term ids with other structures
     '''
     self.class_num = class_num
     self.num_docs = [0] * class_num
-    self.term_num_docs = {}     # term : [num_docs_containing_term]
-    self.term_cdf = {}          # term : [class tf * class idf]
-    self.stopwords = []
+    self.vocab = vocabulary if vocabulary is not None else Vocabulary()
+    self.term_num_docs = numpy.zeros((0, class_num), dtype = numpy.int32)
+    self.term_cdf = numpy.zeros((0, class_num), dtype = numpy.float64)
+    self.appeared = numpy.zeros(0, dtype = bool)   # term id : if term_num_docs is set
+    self.computed = numpy.zeros(0, dtype = bool)   # term id : if term_cdf is set
+    self.stopwords = set()
 
     if corpus_filename:
       self._load_corpus_file(corpus_filename)
@@ -53,7 +86,7 @@ class ClassTfIdf:
 
     if stopword_filename:
       stopword_file = open(stopword_filename, "r")
-      self.stopwords = [line.strip() for line in stopword_file]
+      self.stopwords = set([line.strip() for line in stopword_file])
 
   def _load_corpus_file(self, corpus_filename):
     with open(corpus_filename, "r") as corpus_file:
@@ -62,11 +95,19 @@ class ClassTfIdf:
       self.num_docs = map(int, line.strip().split("\t"))
 
       # Reads "term:frequency" from each subsequent line in the file.
+      ids, rows = [], []
       for line in corpus_file:
         tokens = line.rpartition(":")
         term = tokens[0].strip()
         frequencys = map(int, tokens[2].strip().split("\t"))
-        self.term_num_docs[term] = frequencys 
+        term_id = self.vocab.add(term)
+        if term_id is not None:
+          ids.append(term_id)
+          rows.append(frequencys)
+      if ids:
+        self._grow_to(max(ids))
+        self.term_num_docs[ids] = rows
+        self.appeared[ids] = True
 
   def _load_cdf_file(self, cdf_filename):
     with open(cdf_filename, 'r') as cdf_file:
@@ -74,65 +115,239 @@ class ClassTfIdf:
       line = cdf_file.readline()
       self.num_docs = map(int, line.strip().split("\t"))
 
+      ids, rows = [], []
       for line in cdf_file:
         tokens = line.rpartition(":")
         term = tokens[0].strip()
         cdfs = map(float, tokens[2].strip().split("\t"))
-        self.term_cdf[term] = cdfs
+        term_id = self.vocab.add(term)
+        if term_id is not None:
+          ids.append(term_id)
+          rows.append(cdfs)
+      if ids:
+        self._grow_to(max(ids))
+        self._grow_cdf()
+        self.term_cdf[ids] = rows
+        self.computed[ids] = True
+
+  def _grow_to(self, term_id):
+    # a shared vocabulary may have ids added by others, the tables grow by
+    # half so adding the terms one by one stays linear, and term_cdf only
+    # grows when a cdf is set
+    size = len(self.appeared)
+    if size > term_id:
+      return
+    grown = max(term_id + 1, size + size / 2)
+    self.term_num_docs = numpy.concatenate([self.term_num_docs,
+      numpy.zeros((grown - size, self.class_num), dtype = numpy.int32)])
+    self.appeared = numpy.concatenate([self.appeared, numpy.zeros(grown - size, dtype = bool)])
+    self.computed = numpy.concatenate([self.computed, numpy.zeros(grown - size, dtype = bool)])
+
+  def _grow_cdf(self):
+    size = len(self.term_cdf)
+    if size < len(self.appeared):
+      self.term_cdf = numpy.concatenate([self.term_cdf,
+        numpy.zeros((len(self.appeared) - size, self.class_num), dtype = numpy.float64)])
+
+  def _trim(self):
+    # drop the spare rows left by _grow_to
+    num_terms = min(len(self.vocab), len(self.appeared))
+    if len(self.appeared) > num_terms:
+      self.term_num_docs = self.term_num_docs[:num_terms].copy()
+      self.appeared = self.appeared[:num_terms].copy()
+      self.computed = self.computed[:num_terms].copy()
+    if len(self.term_cdf) > num_terms:
+      self.term_cdf = self.term_cdf[:num_terms].copy()
+
+  def _iter_terms(self, table, rows):
+    # term, value list pairs of term_num_docs or term_cdf
+    for term_id in numpy.nonzero(rows)[0].tolist():
+      yield self.vocab.get_term(term_id), table[term_id].tolist()
+
+  def __iter__(self):
+    '''Return the term : [num_docs_containing_term]'''
+    return self._iter_terms(self.term_num_docs, self.appeared)
 
   def get_tokens(self, str):
     return str.strip().split()
 
   def add_input_document(self, _class, input):
+    self._add_tokens(_class, self.get_tokens(input))
+
+  def add_documents(self, source, batch_size = 10000, interval = 10.0):
+    '''Add every document of a labelled corpus.
+
+    The corpus is streamed a batch at a time, so it does not need to fit in
+    memory, and the docs/sec rate is logged every interval seconds.
+
+    Args:
+      source: corpus file name with one "class\ttext" document per line,
+        .gz and .bz2 files are decompressed, or an iterable of such lines
+        or of (class, text) pairs
+      batch_size: documents to tokenize and add in one batch
+      interval: seconds between two progress log lines
+
+    Returns:
+      number of documents added
+    '''
+    return corpus_reader.feed(self._add_batch, source, batch_size,
+      "ClassTfIdf", interval)
+
+  def _add_batch(self, docs):
+    docs = list(corpus_reader.iter_labelled(docs))
+    for _class, tokens in [(int(_class), self.get_tokens(text)) for _class, text in docs]:
+      self._add_tokens(_class, tokens)
+    return len(docs)
+
+  def _add_tokens(self, _class, tokens):
     if _class >= self.class_num:
       raise IndexError
 
     self.num_docs[_class] += 1
-    words = set(self.get_tokens(input))
-    for word in words:
-      if word in self.term_num_docs:
-        self.term_num_docs[word][_class] += 1
-      else:
-        self.term_num_docs[word] = [0] * self.class_num
-        self.term_num_docs[word][_class] = 1
+    ids = []
+    for word in set(tokens):
+      term_id = self.vocab.add(word)
+      if term_id is not None:
+        ids.append(term_id)
+    if ids:
+      self._grow_to(max(ids))
+      self.term_num_docs[ids, _class] += 1
+      self.appeared[ids] = True
+
+  def _save_text(self, filename, items):
+    # one "term:value\t...value\t" line per term, written a line at a time
+    with open(filename, "w") as output_file:
+      output_file.write("\t".join(map(str, self.num_docs)) + "\n")
+      output_file.writelines(term + ":" + "".join(str(value) + "\t" for value in values) + "\n"
+        for term, values in items)
 
   def save_corpus_to_file(self, idf_filename):
-    output_file = open(idf_filename, "w")
-    output_file.write("\t".join(map(str, self.num_docs)) + "\n")
-    for term, num_docs in self.term_num_docs.items():
-      output_file.write(term + ":")
-      for num_doc in num_docs:
-        output_file.write(str(num_doc) + "\t")
-      output_file.write("\n")
-    output_file.close()
-  
+    self._save_text(idf_filename, self)
+
   def save_cdf_to_file(self, cdf_filename):
-    output_file = open(cdf_filename, "w")
-    output_file.write("\t".join(map(str, self.num_docs)) + "\n")
-    for term, cdfs in self.term_cdf.items():
-      output_file.write(term + ":")
-      for cdf in cdfs:
-        output_file.write(str(cdf) + "\t")
-      output_file.write("\n")
-    output_file.close()
+    self._save_text(cdf_filename, self._iter_terms(self.term_cdf, self.computed))
+
+  def save_to_binary(self, filename):
+    '''Save the counts and the cdf to the specified file in the binary format.
+
+    The tables are written as they are, in a few bulk writes.
+
+    Args:
+      filename: the specified file
+    '''
+    self._trim()
+    num_terms = len(self.appeared)
+    terms = "\n".join(self.vocab.get_term(term_id) for term_id in range(num_terms))
+    with open(filename, "wb") as output_file:
+      output_file.write(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION,
+        self.class_num, num_terms, len(terms)))
+      numpy.asarray(self.num_docs, dtype = numpy.int64).tofile(output_file)
+      self.term_cdf.tofile(output_file)
+      # the rows of the terms added since the last compute_all_cdf
+      numpy.zeros((num_terms - len(self.term_cdf), self.class_num),
+        dtype = numpy.float64).tofile(output_file)
+      self.term_num_docs.tofile(output_file)
+      self.appeared.astype(numpy.uint8).tofile(output_file)
+      self.computed.astype(numpy.uint8).tofile(output_file)
+      output_file.write(terms)
+
+  def load_from_binary(self, filename, mmap = True):
+    '''Load the counts and the cdf saved by save_to_binary
+
+    With mmap and an empty vocabulary the tables are copy-on-write views of
+    the mapped file, so loading only parses the terms and the pages of the
+    tables are read when they are used.  Changes, as compute_all_cdf, stay
+    in memory.  Otherwise the rows are copied to the ids of the vocabulary.
+
+    Args:
+      filename: build by save_to_binary
+      mmap: map the file instead of reading it into memory
+    '''
+    with open(filename, "rb") as fp:
+      if mmap:
+        buffer = _mmap.mmap(fp.fileno(), 0, access = _mmap.ACCESS_COPY)
+      else:
+        buffer = bytearray(fp.read())
+    magic, version, class_num, num_terms, terms_size = BINARY_HEADER.unpack_from(buffer, 0)
+    if magic != BINARY_MAGIC or version != BINARY_VERSION:
+      raise ValueError("not a binary ClassTfIdf file: " + filename)
+    if class_num != self.class_num:
+      raise ValueError("class_num differ: %d, %d" % (self.class_num, class_num))
+
+    offset = BINARY_HEADER.size
+    def table(dtype, shape):
+      array = numpy.frombuffer(buffer, dtype = dtype, count = int(numpy.prod(shape)),
+        offset = offset).reshape(shape)
+      return array, offset + array.nbytes
+    num_docs, offset = table(numpy.int64, (class_num, ))
+    term_cdf, offset = table(numpy.float64, (num_terms, class_num))
+    term_num_docs, offset = table(numpy.int32, (num_terms, class_num))
+    appeared, offset = table(numpy.bool_, (num_terms, ))
+    computed, offset = table(numpy.bool_, (num_terms, ))
+    terms = str(buffer[offset:offset + terms_size]).split("\n") if num_terms else []
+
+    self.num_docs = num_docs.tolist()
+    fresh = not len(self.vocab) and not len(self.appeared)
+    ids = [self.vocab.add(term) for term in terms]
+    if fresh and ids == range(num_terms):
+      self.term_cdf, self.term_num_docs = term_cdf, term_num_docs
+      self.appeared, self.computed = appeared, computed
+      self.buffer = buffer
+      return
+    rows = [row for row, term_id in enumerate(ids) if term_id is not None]
+    ids = [ids[row] for row in rows]
+    if ids:
+      self._grow_to(max(ids))
+      self._grow_cdf()
+      self.term_cdf[ids] = term_cdf[rows]
+      self.term_num_docs[ids] = term_num_docs[rows]
+      self.appeared[ids] = appeared[rows]
+      self.computed[ids] = computed[rows]
+
+  def merge(self, other):
+    '''Add the class document counts of another ClassTfIdf to this one
+
+    The cdf is not merged, call compute_all_cdf after merging.
+
+    Args:
+      other: ClassTfIdf instance with the same class_num, it is not changed
+    '''
+    if other.class_num != self.class_num:
+      raise ValueError("class_num differ: %d, %d" % (self.class_num, other.class_num))
+    self.num_docs = [a + b for a, b in zip(self.num_docs, other.num_docs)]
+    ids, other_ids = [], []
+    for other_id in numpy.nonzero(other.appeared)[0].tolist():
+      term_id = self.vocab.add(other.vocab.get_term(other_id))
+      if term_id is not None:
+        ids.append(term_id)
+        other_ids.append(other_id)
+    if ids:
+      self._grow_to(max(ids))
+      self.term_num_docs[ids] += other.term_num_docs[other_ids]
+      self.appeared[ids] = True
+    return self
 
   def get_num_docs(self, _class):
     return self.num_docs[_class]
 
   def compute_all_cdf(self):
-    for term in self.term_num_docs:
-      term_cla_p = [0.0] * self.class_num   # term's posibility of every class
-      for i in range(self.class_num):
-        term_cla_p[i] += self.term_num_docs[term][i] / self.get_num_docs(i)
-      sum_p = sum(term_cla_p)
-      term_cla_cdf = [0.0] * self.class_num # term's cdf of every class
-      for i in range(self.class_num):
-        term_cla_cdf[i] += self.term_num_docs[term][i] * math.log(1+((1+term_cla_p[i])/(1+sum_p-term_cla_p[i])))
-      self.term_cdf[term] = term_cla_cdf
+    self._trim()
+    self._grow_cdf()
+    ids = numpy.nonzero(self.appeared)[0]
+    num_docs = self.term_num_docs[ids].astype(numpy.float64)
+    class_docs = numpy.array(self.num_docs, dtype = numpy.float64)
+    # term's posibility of every class, a class without document has none
+    with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+      term_cla_p = numpy.where(class_docs > 0, num_docs / class_docs, 0.0)
+    sum_p = term_cla_p.sum(axis = 1)[:, numpy.newaxis]
+    self.term_cdf[ids] = num_docs * numpy.log(1 + (1 + term_cla_p) / (1 + sum_p - term_cla_p))
+    self.computed[ids] = True
 
   def get_class_keywords(self, _class, top_k):
+    ids = numpy.nonzero(self.computed)[0]
+    scores = self.term_cdf[ids, _class]
+    # everything tied with the k-th score is kept for the term order
+    keep = top_candidates(scores, top_k)
     heap = TopkHeap(top_k)
-    for term in self.term_num_docs:
-      heap.push((self.term_cdf[term][_class], term))
-    return [item[1] for item in heap.topk()]
-  
+    heap.push_many(scores[keep], [self.vocab.get_term(term_id) for term_id in ids[keep].tolist()])
+    return [term for _, term in heap.topk()]
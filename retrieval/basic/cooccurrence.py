@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+#
+# This is a sparse matrix co-occurrence engine based on inverted_index
+#
+# The postings of an InvertedIndex are the rows of a term x doc matrix Xt,
+# so the pairwise co-occurrence counts are Xt * X.  The product is computed
+# for a block of terms at a time to keep the memory bounded.
+#
+# @author: Jason Wu (Jasonwbw@yahoo.com)
+
+import numpy
+from scipy import sparse
+
+def build_term_doc_matrix(iindex, term_ids):
+  '''Build the term x doc CSR matrix of the given terms
+
+  Row i holds a 1 for each document term_ids[i] appeared in, which is
+  exactly the postings list of the term.
+
+  Args:
+    iindex: InvertedIndex instance
+    term_ids: the ids of the terms for rows, in order
+
+  Returns:
+    scipy.sparse.csr_matrix of shape (len(term_ids), num_docs)
+  '''
+  indptr = numpy.zeros(len(term_ids) + 1, dtype = numpy.int64)
+  for i, term_id in enumerate(term_ids):
+    indptr[i + 1] = indptr[i] + len(iindex.get_postings_by_id(term_id))
+  indices = numpy.empty(indptr[-1], dtype = numpy.int32)
+  for i, term_id in enumerate(term_ids):
+    indices[indptr[i]:indptr[i + 1]] = iindex.get_postings_by_id(term_id)
+  data = numpy.ones(len(indices), dtype = numpy.int32)
+  return sparse.csr_matrix((data, indices, indptr),
+    shape = (len(term_ids), iindex.get_num_docs()))
+
+def build_doc_term_matrix(iindex, term_ids):
+  '''Build the doc x term CSR matrix of the given terms
+
+  Args:
+    iindex: InvertedIndex instance
+    term_ids: the ids of the terms for columns, in order
+
+  Returns:
+    scipy.sparse.csr_matrix of shape (num_docs, len(term_ids))
+  '''
+  return build_term_doc_matrix(iindex, term_ids).T.tocsr()
+
+def iter_cooccurrence_blocks(iindex, term_ids, block_size = 1024):
+  '''Compute the co-occurrence counts of all term pairs block by block
+
+  Only the nonzero entries are kept, so pairs that never appeared in the
+  same document cost nothing.
+
+  Args:
+    iindex: InvertedIndex instance
+    term_ids: the ids of the terms to compute, in order
+    block_size: how many terms' rows to compute in one sparse product
+
+  Yields:
+    (start, block) pairs, block is a csr_matrix whose row r holds the counts
+    of term_ids[start + r] with every term in term_ids order, the diagonal
+    is the term's own document count
+  '''
+  term_doc = build_term_doc_matrix(iindex, term_ids)
+  doc_term = term_doc.T.tocsr()
+  for start in range(0, len(term_ids), block_size):
+    block = term_doc[start:start + block_size].dot(doc_term).tocsr()
+    block.sort_indices()
+    yield start, block
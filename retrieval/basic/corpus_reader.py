@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+#
+# This is a streaming reader for line-delimited corpora, one document per
+# line, shared by the add_documents methods of the index classes
+#
+# @author: Jason Wu (Jasonwbw@yahoo.com)
+
+import bz2
+import gzip
+import io
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# bytes of lines read from the file in one chunk
+READ_BUFFER_SIZE = 1 << 20
+
+def open_corpus(filename):
+  '''Open a corpus file, decompressing .gz and .bz2 files on the fly
+
+  Args:
+    filename: the corpus file
+
+  Returns:
+    a file object yielding lines
+  '''
+  if filename.endswith(".gz"):
+    return io.BufferedReader(gzip.open(filename, "rb"), READ_BUFFER_SIZE)
+  if filename.endswith(".bz2"):
+    return bz2.BZ2File(filename, "r", READ_BUFFER_SIZE)
+  return open(filename, "r", READ_BUFFER_SIZE)
+
+def iter_documents(source):
+  '''Iterate the documents of a corpus file or any iterable
+
+  Files are read a chunk of lines at a time, so the memory used does not
+  depend on the corpus size.
+
+  Args:
+    source: a corpus file name, or an iterable of documents
+
+  Yields:
+    the documents, lines have their line break removed
+  '''
+  if not isinstance(source, basestring):
+    for doc in source:
+      yield doc
+    return
+
+  with open_corpus(source) as fp:
+    while True:
+      lines = fp.readlines(READ_BUFFER_SIZE)
+      if not lines:
+        break
+      for line in lines:
+        yield line.rstrip("\r\n")
+
+def iter_batches(docs, batch_size):
+  '''Group documents into lists of batch_size documents
+
+  Args:
+    docs: iterable of documents
+    batch_size: documents in one batch
+
+  Yields:
+    lists of documents, the last one may be shorter
+  '''
+  batch = []
+  for doc in docs:
+    batch.append(doc)
+    if len(batch) >= batch_size:
+      yield batch
+      batch = []
+  if batch:
+    yield batch
+
+def split_labelled(doc):
+  '''Split a "class\\ttext" line of a labelled corpus
+
+  Args:
+    doc: the line, or an already split (class, text) pair
+
+  Returns:
+    (class, text) tuple, class is still a string for lines
+  '''
+  if isinstance(doc, basestring):
+    fields = doc.split("\t", 1)
+    if len(fields) != 2:
+      raise ValueError("not a \"class\\ttext\" line: %r" % doc)
+    return fields[0], fields[1]
+  return doc
+
+def iter_labelled(docs):
+  '''Split the documents of a labelled corpus, skipping the blank lines
+
+  Args:
+    docs: "class\\ttext" lines or (class, text) pairs
+
+  Yields:
+    (class, text) tuples, see split_labelled
+  '''
+  for doc in docs:
+    if isinstance(doc, basestring) and not doc.strip():
+      continue
+    yield split_labelled(doc)
+
+class Progress(object):
+
+  '''Log the ingestion rate in documents per second
+
+  Attributes:
+    name: what is being ingested, used in the log lines
+    interval: seconds between two log lines
+    num_docs: documents counted so far
+  '''
+
+  def __init__(self, name, interval = 10.0):
+    self.name = name
+    self.interval = interval
+    self.num_docs = 0
+    self.start = self.last = time.time()
+
+  def update(self, count):
+    '''Count newly added documents, log the rate if the interval passed
+
+    Args:
+      count: number of documents just added
+    '''
+    self.num_docs += count
+    now = time.time()
+    if now - self.last >= self.interval:
+      self.last = now
+      self.report(now)
+
+  def report(self, now = None):
+    '''Log the documents added so far and the average rate'''
+    now = now or time.time()
+    elapsed = max(now - self.start, 1e-9)
+    logger.info("%s: %d docs, %.0f docs/sec", self.name, self.num_docs,
+      self.num_docs / elapsed)
+
+def feed(add_batch, source, batch_size = 10000, name = "ingest", interval = 10.0):
+  '''Stream the documents of source into add_batch a batch at a time
+
+  Args:
+    add_batch: function taking a list of documents, it may return the
+      number of them it added when it skips some
+    source: a corpus file name, or an iterable of documents
+    batch_size: documents in one batch
+    name: label of the progress log lines
+    interval: seconds between two progress log lines
+
+  Returns:
+    number of documents added
+  '''
+  progress = Progress(name, interval)
+  for batch in iter_batches(iter_documents(source), batch_size):
+    added = add_batch(batch)
+    progress.update(len(batch) if added is None else added)
+  progress.report()
+  return progress.num_docs
@@ -7,7 +7,78 @@
 
 from operator import itemgetter
 from topkheap import TopkHeap
+from topkheap import top_candidates
+from vocabulary import Vocabulary
+import corpus_reader
 import math
+import mmap as _mmap
+import numpy
+import struct
+
+# binary index file layout, all in native byte order:
+#   header: magic, version, num_docs, num_terms, num_classes, size of the
+#     term dictionary, size of the class names
+#   class_totals: int64 * num_classes
+#   term_count: int32 * num_terms * num_classes, one row of classes per term id
+#   terms: the vocabulary, terms joined by "\n" in id order
+#   classes: one record per class in column order, a type tag ("s" for
+#     str, "u" for unicode in utf-8, "i" for int), the uint32 size of the
+#     name and the name, so a name may hold any byte
+INDEX_MAGIC = "CIDX"
+INDEX_VERSION = 1
+INDEX_HEADER = struct.Struct("=4sIQQQQQ")
+CLASS_RECORD = struct.Struct("=cI")
+
+# terms scored at once by find_top_word between two early exit checks
+TOP_WORD_BLOCK = 1024
+
+def estimate_arrays(A, class_count, N):
+  '''Vectorized estimate mi of the document counts
+
+  Args:
+    A: array of the documents of the class containing the word
+    class_count: array of the class counts, broadcast with A
+    N: number of documents
+
+  Returns:
+    float64 array of the estimate mi, 0 where the word or the class is not seen
+  '''
+  A = numpy.asarray(A, dtype = numpy.float64)
+  B = N - A
+  C = class_count - A
+  denominator = (A + C) * (A + B)
+  seen = (A != 0) & (A + C != 0) & (A + B != 0)
+  return numpy.where(seen, A * N / numpy.where(seen, denominator, 1.0), 0.0)
+
+def _pack_classes(classes):
+  records = []
+  for _class in classes:
+    if isinstance(_class, str):
+      tag, name = "s", _class
+    elif isinstance(_class, unicode):
+      tag, name = "u", _class.encode("utf-8")
+    elif isinstance(_class, (int, long)) and not isinstance(_class, bool):
+      tag, name = "i", str(_class)
+    else:
+      raise TypeError("can not save the class %r, only str, unicode and int are" % (_class, ))
+    records.append(CLASS_RECORD.pack(tag, len(name)) + name)
+  return "".join(records)
+
+def _unpack_classes(data, num_classes):
+  classes = []
+  offset = 0
+  for _ in range(num_classes):
+    tag, size = CLASS_RECORD.unpack_from(data, offset)
+    offset += CLASS_RECORD.size
+    name = data[offset:offset + size]
+    offset += size
+    if tag == "u":
+      classes.append(name.decode("utf-8"))
+    elif tag == "i":
+      classes.append(int(name))
+    else:
+      classes.append(name)
+  return classes
 
 class ClassInvertedIndex(object):
 
@@ -18,11 +89,13 @@ class ClassInvertedIndex(object):
 
   Attributes:
     num_docs: number of document computed
-    stopwords: stopword list
-    term_count: dictory of "term : {class : count}" 
+    vocab: Vocabulary of the terms, a frozen one restricts the index to its terms
+    classes: list of the classes, a class's column in term_count and class_totals
+    term_count: int32 array of the count by term id and class column
+    class_totals: int64 array of the count by class column
     class_count: dictory of "class : appeared document count" 
-    have_vocabulary: have vocabulary or not
-    vocabulary: the given vocabulary
+    have_vocabulary: read-only, whether the index is restricted to a frozen vocabulary
+    vocabulary: read-only list of the terms it is restricted to, None if it is not
     stopwords: all stop words
   '''   
 
@@ -33,24 +106,37 @@ class ClassInvertedIndex(object):
     the format of one stopword per line.
 
     Args:
-      vocabulary : to build inverted index just for term in this vocabulary
+      vocabulary : to build inverted index just for term in this vocabulary, a
+        Vocabulary instance is used as it is, so its ids can be shared
       stopword_filename: file with one stopword in one line
     '''
  
     self.num_docs = 0
-    self.stopwords = []    
-    self.term_count = {}  # word : {class : count}
-    self.class_count = {} # class : count
-    self.have_vocabulary = False
-
-    if vocabulary:
-      self.have_vocabulary = True
-      self.vocabulary = set(vocabulary)
+    self.stopwords = set()
+    self.classes = []
+    self.class_ids = {}   # class : column
+    self.term_count = numpy.zeros((0, 0), dtype = numpy.int32)
+    self.class_totals = numpy.zeros(0, dtype = numpy.int64)
+
+    if isinstance(vocabulary, Vocabulary):
+      self.vocab = vocabulary
+    elif vocabulary:
+      self.vocab = Vocabulary(vocabulary).freeze()
+    else:
+      self.vocab = Vocabulary()
 
     if stopword_filename:
       stopword_file = open(stopword_filename, "r")
       self.stopwords = set([line.strip() for line in stopword_file])
 
+  @property
+  def have_vocabulary(self):
+    return self.vocab.frozen
+
+  @property
+  def vocabulary(self):
+    return list(self.vocab) if self.vocab.frozen else None
+
   def get_tokens(self, _str):
     '''Break a string into tokens, preserving URL tags as an entire token.
 
@@ -69,26 +155,98 @@ class ClassInvertedIndex(object):
       _input: the input content
       _class: the class of intput content
     '''
-    words = set(self.get_tokens(_input))
-    for word in words:
-      if self.have_vocabulary and word not in self.vocabulary:
-        continue
+    self._add_tokens(self.get_tokens(_input), _class)
+
+  def add_documents(self, source, batch_size = 10000, interval = 10.0):
+    '''Add every document of a labelled corpus to the inverted index.
+
+    The corpus is streamed a batch at a time, so it does not need to fit in
+    memory, and the docs/sec rate is logged every interval seconds.
+
+    Args:
+      source: corpus file name with one "class\ttext" document per line,
+        .gz and .bz2 files are decompressed, or an iterable of such lines
+        or of (class, text) pairs, classes from lines stay strings
+      batch_size: documents to tokenize and add in one batch
+      interval: seconds between two progress log lines
+
+    Returns:
+      number of documents added
+    '''
+    return corpus_reader.feed(self._add_batch, source, batch_size,
+      "ClassInvertedIndex", interval)
+
+  def _add_batch(self, docs):
+    docs = list(corpus_reader.iter_labelled(docs))
+    for _class, tokens in [(_class, self.get_tokens(text)) for _class, text in docs]:
+      self._add_tokens(tokens, _class)
+    return len(docs)
+
+  def _add_tokens(self, tokens, _class):
+    ids = []
+    for word in set(tokens):
       if word in self.stopwords:
         continue
-
-      if word not in self.term_count:
-        self.term_count[word] = {}
-        self.term_count[word][_class] = 1
-      try:
-        self.term_count[word][_class] += 1
-      except:
-        self.term_count[word][_class] = 1
-      try:
-        self.class_count[_class] += 1
-      except:
-        self.class_count[_class] = 1
+      term_id = self.vocab.add(word)
+      if term_id is not None:
+        ids.append(term_id)
+    if ids:
+      class_id = self._class_id(_class)
+      self._grow_to(max(ids))
+      self.term_count[ids, class_id] += 1
+      self.class_totals[class_id] += len(ids)
     self.num_docs += 1
 
+  def _class_id(self, _class):
+    try:
+      return self.class_ids[_class]
+    except KeyError:
+      self.class_ids[_class] = len(self.classes)
+      self.classes.append(_class)
+      self.term_count = numpy.hstack([self.term_count,
+        numpy.zeros((len(self.term_count), 1), dtype = numpy.int32)])
+      self.class_totals = numpy.append(self.class_totals, 0)
+      return self.class_ids[_class]
+
+  def _grow_to(self, term_id):
+    # a shared vocabulary may have ids added by others, the rows are
+    # doubled so adding the terms one by one stays linear
+    size = len(self.term_count)
+    if size <= term_id:
+      self.term_count = numpy.vstack([self.term_count, numpy.zeros(
+        (max(term_id + 1, 2 * size) - size, len(self.classes)), dtype = numpy.int32)])
+
+  def merge(self, other):
+    '''Add the counts of another class inverted index to this one
+
+    Args:
+      other: ClassInvertedIndex instance, it is not changed
+    '''
+    class_ids = [self._class_id(_class) for _class in other.classes]
+    ids, other_ids = [], []
+    for other_id in other.get_term_ids():
+      term_id = self.vocab.add(other.vocab.get_term(other_id))
+      if term_id is not None:
+        ids.append(term_id)
+        other_ids.append(other_id)
+    if ids:
+      self._grow_to(max(ids))
+      self.term_count[numpy.ix_(ids, class_ids)] += other.term_count[other_ids]
+    self.class_totals[class_ids] += other.class_totals
+    self.num_docs += other.num_docs
+    return self
+
+  @property
+  def class_count(self):
+    return dict(zip(self.classes, self.class_totals.tolist()))
+
+  def __iter__(self):
+    '''Return the term : {class : count}'''
+    for term_id in self.get_term_ids():
+      counts = self.term_count[term_id].tolist()
+      yield self.vocab.get_term(term_id), dict((self.classes[i], count)
+        for i, count in enumerate(counts) if count)
+
   def get_num_docs(self):
     '''Return the total number of documents added.
 
@@ -103,7 +261,15 @@ class ClassInvertedIndex(object):
     Returns:
       A list object of terms
     '''
-    return self.term_count.keys()
+    return [self.vocab.get_term(term_id) for term_id in self.get_term_ids()]
+
+  def get_term_ids(self):
+    '''Return the ids of the terms
+
+    Returns:
+      An array of term ids in vocab, for the terms that appeared
+    '''
+    return numpy.nonzero(self.term_count.any(axis = 1))[0]
 
   def get_classes(self):
     '''Return all classes name
@@ -111,7 +277,7 @@ class ClassInvertedIndex(object):
     Returns:
       A list object for classes
     '''
-    return self.class_count.keys()
+    return list(self.classes)
 
   def get_word_appear(self, word, _class):
     '''Get the word's document num in the given class
@@ -123,10 +289,80 @@ class ClassInvertedIndex(object):
     Returns:
         total num
     '''
-    try:
-      return self.term_count[word][_class]
-    except:
+    term_id = self.vocab.get_id(word)
+    class_id = self.class_ids.get(_class)
+    if term_id is None or class_id is None or term_id >= len(self.term_count):
       return 0
+    return int(self.term_count[term_id, class_id])
+
+  def save(self, path):
+    '''Save the counts to a binary index file
+
+    The classes are loaded with their type, which must be str, unicode
+    or int.
+
+    Args:
+      path: the index file
+    '''
+    vocab = self.vocab
+    terms = "\n".join(vocab.get_term(term_id) for term_id in range(len(vocab)))
+    classes = _pack_classes(self.classes)
+    # the rows are grown ahead of the vocabulary, or after it when shared
+    term_count = numpy.zeros((len(vocab), len(self.classes)), dtype = numpy.int32)
+    rows = min(len(vocab), len(self.term_count))
+    term_count[:rows] = self.term_count[:rows]
+    with open(path, "wb") as output_file:
+      output_file.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, self.num_docs,
+        len(vocab), len(self.classes), len(terms), len(classes)))
+      numpy.asarray(self.class_totals, dtype = numpy.int64).tofile(output_file)
+      term_count.tofile(output_file)
+      output_file.write(terms)
+      output_file.write(classes)
+
+  @classmethod
+  def load(cls, path, mmap = True):
+    '''Load an index file saved by save
+
+    With mmap the counts are views of the mapped file, so loading only
+    parses the vocabulary and the class names.  The loaded index is
+    read-only, EstimateMi works on it as on a built one.
+
+    Args:
+      path: the index file
+      mmap: map the file instead of reading it into memory
+
+    Returns:
+      the loaded instance
+    '''
+    with open(path, "rb") as fp:
+      if mmap:
+        buffer = _mmap.mmap(fp.fileno(), 0, access = _mmap.ACCESS_READ)
+      else:
+        buffer = fp.read()
+    magic, version, num_docs, num_terms, num_classes, terms_size, classes_size = \
+      INDEX_HEADER.unpack_from(buffer, 0)
+    if magic != INDEX_MAGIC or version != INDEX_VERSION:
+      raise ValueError("not a class inverted index file: " + path)
+
+    offset = INDEX_HEADER.size
+    class_totals = numpy.frombuffer(buffer, dtype = numpy.int64,
+      count = num_classes, offset = offset)
+    offset += class_totals.nbytes
+    term_count = numpy.frombuffer(buffer, dtype = numpy.int32,
+      count = num_terms * num_classes, offset = offset).reshape(num_terms, num_classes)
+    offset += term_count.nbytes
+    terms = buffer[offset:offset + terms_size].split("\n") if num_terms else []
+    offset += terms_size
+    classes = _unpack_classes(buffer[offset:offset + classes_size], num_classes)
+
+    index = cls(Vocabulary(terms).freeze())
+    index.num_docs = num_docs
+    index.classes = classes
+    index.class_ids = dict((_class, i) for i, _class in enumerate(classes))
+    index.term_count = term_count
+    index.class_totals = class_totals
+    index.buffer = buffer
+    return index
 
   def get_class_count(self, _class):
     '''Get the class's document num
@@ -137,15 +373,17 @@ class ClassInvertedIndex(object):
     Returns:
         total num
     '''
-    try:
-      return self.class_count[_class]
-    except:
+    class_id = self.class_ids.get(_class)
+    if class_id is None:
       return 0
+    return int(self.class_totals[class_id])
 
 class EstimateMi(object):
 
   def __init__(self, ciindex):
     self.ciindex = ciindex
+    self._by_appear = None
+    self._by_appear_docs = None
 
   def estimate_mi(self, _class, word):
     '''Return the estimate mi of class and word
@@ -166,23 +404,88 @@ class EstimateMi(object):
     # return math.log(float(A*N)/((A+C) * (A+B)))
     return float(A*N)/((A+C) * (A+B))
 
+  def estimate_matrix(self):
+    '''Return the estimate mi of every term and class
+
+    Returns:
+      (term ids, float64 array of the estimate mi by term and class column)
+    '''
+    term_ids = self.ciindex.get_term_ids()
+    return term_ids, estimate_arrays(self.ciindex.term_count[term_ids],
+      self.ciindex.class_totals, self.ciindex.get_num_docs())
+
+  def _top(self, term_ids, scores, topk):
+    # (score, term) of the top k, ties ordered by term as the tuples sort
+    if topk is None:
+      topk = len(scores)
+    keep = top_candidates(scores, topk)
+    heap = TopkHeap(topk)
+    heap.push_many(scores[keep], [self.ciindex.vocab.get_term(term_id)
+      for term_id in numpy.asarray(term_ids)[keep].tolist()])
+    return heap.topk()
+
+  def _terms_by_appear(self):
+    # the document count of a term in all classes bounds its count in one,
+    # sorted once for every class until documents are added
+    if self._by_appear_docs != self.ciindex.get_num_docs():
+      term_ids = numpy.asarray(self.ciindex.get_term_ids(), dtype = numpy.int64)
+      appears = self.ciindex.term_count[term_ids].sum(axis = 1)
+      order = numpy.argsort(-appears, kind = "mergesort")
+      self._by_appear = (term_ids[order], appears[order])
+      self._by_appear_docs = self.ciindex.get_num_docs()
+    return self._by_appear
+
   def find_top_word(self, _class, topk = None):
     '''Find the keywords of given _class
 
+    With topk, the terms are walked by their document count in all classes,
+    a block at a time, and the walk stops once the estimate for that count,
+    which the estimate of the class does not exceed, is below the k-th one
+    found.
+
     Args:
       _class: the _class the chek word
-      topk: top k keywords to find, None means all words
+      topk: top k keywords to find, None or 0 means all words
 
     Returns:
-      a list of topk term
+      a list of topk (estimate mi, term)
     '''
-    if topk:
+    topk = topk or None
+    class_id = self.ciindex.class_ids.get(_class)
+    if class_id is not None and topk is not None:
+      term_ids, appears = self._terms_by_appear()
+      class_count = self.ciindex.class_totals[class_id]
+      N = self.ciindex.get_num_docs()
       heap = TopkHeap(topk)
-      for term in self.ciindex.get_terms():
-        heap.push((self.estimate_mi(_class, term), term))
+      for start in range(0, len(term_ids), TOP_WORD_BLOCK):
+        current_min = heap.current_min()
+        if current_min is not None and \
+            estimate_arrays(min(appears[start], class_count), class_count, N) < current_min[0]:
+          break
+        block = term_ids[start:start + TOP_WORD_BLOCK]
+        heap.push_many(estimate_arrays(self.ciindex.term_count[block, class_id], class_count, N),
+          [self.ciindex.vocab.get_term(term_id) for term_id in block.tolist()])
       return heap.topk()
+
+    term_ids = self.ciindex.get_term_ids()
+    if class_id is None:
+      scores = numpy.zeros(len(term_ids))
     else:
-      res = []
-      for term in self.ciindex.get_terms():
-        res.append((self.estimate_mi(_class, term), term))
-      return sorted(res)[::-1]
\ No newline at end of file
+      scores = estimate_arrays(self.ciindex.term_count[term_ids, class_id],
+        self.ciindex.class_totals[class_id], self.ciindex.get_num_docs())
+    return self._top(term_ids, scores, topk)
+
+  def find_top_words_all_classes(self, topk = None):
+    '''Find the keywords of every class
+
+    The estimate mi of every term and class is computed in one pass.
+
+    Args:
+      topk: top k keywords to find for a class, None means all words
+
+    Returns:
+      dictory of "class : list of topk (estimate mi, term)"
+    '''
+    term_ids, scores = self.estimate_matrix()
+    return dict((_class, self._top(term_ids, scores[:, i], topk))
+      for i, _class in enumerate(self.ciindex.classes))
@@ -5,8 +5,202 @@
 #
 # @author: Jason Wu (Jasonwbw@yahoo.com)
 
+from array import array
+from bisect import bisect_left
+from collections import Mapping
+from functools import partial
 from operator import itemgetter
 from topkheap import TopkHeap
+from vocabulary import Vocabulary
+import corpus_reader
+import mmap
+import numpy
+import struct
+
+# when one postings list is this many times longer than the other, gallop
+# through the long one instead of walking both
+GALLOP_RATIO = 8
+
+# binary index file layout, all in native byte order:
+#   header: magic, version, num_docs, num_terms, size of the term dictionary
+#   offsets: uint64 * (num_terms + 1), start of each term in the postings
+#   postings: uint32 * offsets[-1], all postings lists one after another
+#   terms: the term dictionary, terms joined by "\n" in offsets order
+BINARY_MAGIC = "IIDX"
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct("=4sIQQQ")
+
+def intersect_count(p1, p2):
+  '''Count the doc ids shared by two sorted postings lists
+
+  Walks both lists with a linear merge, or gallops through the longer list
+  when their lengths are very different.
+
+  Args:
+    p1: sorted sequence of doc ids
+    p2: another sorted sequence of doc ids
+
+  Returns:
+    number of doc ids in both lists
+  '''
+  if len(p1) > len(p2):
+    p1, p2 = p2, p1
+  n1, n2 = len(p1), len(p2)
+  if n1 == 0:
+    return 0
+
+  if isinstance(p1, numpy.ndarray) and isinstance(p2, numpy.ndarray):
+    # memory-mapped postings, binary search all of p1 in p2 at once
+    found = p2.searchsorted(p1)
+    found[found == n2] = n2 - 1
+    return int(numpy.count_nonzero(p2[found] == p1))
+
+  count = 0
+  if n2 > GALLOP_RATIO * n1:
+    lo = 0
+    for doc in p1:
+      # exponential search for an upper bound, then binary search inside it
+      step = 1
+      hi = lo
+      while hi < n2 and p2[hi] < doc:
+        lo = hi + 1
+        hi = lo + step
+        step <<= 1
+      lo = bisect_left(p2, doc, lo, min(hi + 1, n2))
+      if lo == n2:
+        break
+      if p2[lo] == doc:
+        count += 1
+        lo += 1
+    return count
+
+  i = j = 0
+  while i < n1 and j < n2:
+    d1, d2 = p1[i], p2[j]
+    if d1 == d2:
+      count += 1
+      i += 1
+      j += 1
+    elif d1 < d2:
+      i += 1
+    else:
+      j += 1
+  return count
+
+class MappedPostings(object):
+
+  '''Read-only list of postings over a memory-mapped binary index
+
+  The postings are numpy uint32 views into the mapped file, nothing is
+  copied or parsed until a term is looked up.
+
+  Attributes:
+    vocab: frozen Vocabulary of the terms in file order
+    offsets: uint64 array, postings of term id i are postings[offsets[i]:offsets[i+1]]
+    postings: uint32 array of all postings lists
+  '''
+
+  def __init__(self, index_filename):
+    '''Map the binary index file
+
+    Args:
+      index_filename: build by InvertedIndex.save_corpus_to_binary
+    '''
+    with open(index_filename, "rb") as fp:
+      self.buffer = mmap.mmap(fp.fileno(), 0, access = mmap.ACCESS_READ)
+    magic, version, self.num_docs, num_terms, terms_size = \
+      BINARY_HEADER.unpack_from(self.buffer, 0)
+    if magic != BINARY_MAGIC or version != BINARY_VERSION:
+      raise ValueError("not a binary index file: " + index_filename)
+
+    offset = BINARY_HEADER.size
+    self.offsets = numpy.frombuffer(self.buffer, dtype = numpy.uint64,
+      count = num_terms + 1, offset = offset)
+    offset += self.offsets.nbytes
+    self.postings = numpy.frombuffer(self.buffer, dtype = numpy.uint32,
+      count = int(self.offsets[-1]), offset = offset)
+    offset += self.postings.nbytes
+    terms = self.buffer[offset:offset + terms_size].split("\n") if num_terms else []
+    self.vocab = Vocabulary(terms).freeze()
+
+  def __getitem__(self, term_id):
+    return self.postings[self.offsets[term_id]:self.offsets[term_id + 1]]
+
+  def __len__(self):
+    return len(self.offsets) - 1
+
+  def __iter__(self):
+    for term_id in range(len(self)):
+      yield self[term_id]
+
+
+def _write_binary(index_filename, num_docs, num_terms, items):
+  # items yields (term, postings) for num_terms terms
+  offsets = numpy.zeros(num_terms + 1, dtype = numpy.uint64)
+  terms = []
+  with open(index_filename, "wb") as output_file:
+    output_file.seek(BINARY_HEADER.size + offsets.nbytes)
+    for i, (term, postings) in enumerate(items):
+      numpy.asarray(postings, dtype = numpy.uint32).tofile(output_file)
+      offsets[i + 1] = offsets[i] + len(postings)
+      terms.append(term)
+    if len(terms) != num_terms:
+      raise ValueError("expected %d terms, got %d" % (num_terms, len(terms)))
+    terms = "\n".join(terms)
+    output_file.write(terms)
+    output_file.seek(0)
+    output_file.write(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION,
+      num_docs, num_terms, len(terms)))
+    offsets.tofile(output_file)
+
+def convert_corpus_file(index_filename, binary_filename):
+  '''Convert a text index file to the binary format
+
+  The text file is streamed twice, the first time to count the terms, so
+  the postings are never all held in memory.
+
+  Args:
+    index_filename: build by InvertedIndex.save_corpus_to_file
+    binary_filename: the binary file to write
+  '''
+  with open(index_filename) as fp:
+    num_docs = int(fp.readline().strip())
+    num_terms = sum(1 for line in fp if line.strip())
+
+  def items():
+    with open(index_filename) as fp:
+      fp.readline()
+      for line in fp:
+        if not line.strip():
+          continue
+        word, docs = line.split("\t", 1)
+        yield word, numpy.fromstring(docs, dtype = numpy.uint32, sep = "\t")
+
+  _write_binary(binary_filename, num_docs, num_terms, items())
+
+
+class TermCounts(Mapping):
+
+  '''Read-only "term : appeared document count" view of an index
+
+  Looking a term up reads its postings length, so nothing is copied and
+  the view follows the documents added to the index.
+  '''
+
+  def __init__(self, index):
+    self.index = index
+
+  def __getitem__(self, term):
+    count = self.index.get_word_appear(term)
+    if not count:
+      raise KeyError(term)
+    return int(count)
+
+  def __iter__(self):
+    return iter(self.index.get_terms())
+
+  def __len__(self):
+    return len(self.index.get_term_ids())
 
 class InvertedIndex(object):
 
@@ -17,9 +211,13 @@ class InvertedIndex(object):
 
   Attributes:
     num_docs: number of document computed
-    term_doc: dictory of "term : doc number that term appeared"
-    stopwords: stopword list
-    term_count: dictory of "term : appeared document count" this is a lazy loading dictory
+    vocab: Vocabulary of the terms, a frozen one restricts the index to its terms
+    term_doc: list of postings by term id, postings are sorted array('I') of the doc
+      numbers the term appeared in, or a read-only MappedPostings after load_corpus_from_binary
+    stopwords: set of the stop words
+    term_count: read-only TermCounts mapping of "term : appeared document count"
+    have_vocabulary: read-only, whether the index is restricted to a frozen vocabulary
+    vocabulary: read-only list of the terms it is restricted to, None if it is not
   '''   
 
   def __init__(self, vocabulary = None, stopword_filename = None):
@@ -29,23 +227,38 @@ class InvertedIndex(object):
     the format of one stopword per line.
 
     Args:
-      vocabulary : to build inverted index just for term in this vocabulary
+      vocabulary : to build inverted index just for term in this vocabulary, a
+        Vocabulary instance is used as it is, so its ids can be shared
       stopword_filename: file with one stopword in one line
     '''
  
     self.num_docs = 0
-    self.term_doc = {}    
-    self.stopwords = []    
-    self.term_count = {}   
-    self.have_vocabulary = False
+    self.term_doc = []
+    self.stopwords = set()
 
-    if vocabulary:
-      self.have_vocabulary = True
-      self.vocabulary = vocabulary
+    if isinstance(vocabulary, Vocabulary):
+      self.vocab = vocabulary
+    elif vocabulary:
+      self.vocab = Vocabulary(vocabulary).freeze()
+    else:
+      self.vocab = Vocabulary()
 
     if stopword_filename:
       stopword_file = open(stopword_filename, "r")
-      self.stopwords = [line.strip() for line in stopword_file]
+      self.stopwords = set([line.strip() for line in stopword_file])
+
+  # the attributes of the term keyed index, derived from vocab and term_doc
+  @property
+  def term_count(self):
+    return TermCounts(self)
+
+  @property
+  def have_vocabulary(self):
+    return self.vocab.frozen
+
+  @property
+  def vocabulary(self):
+    return list(self.vocab) if self.vocab.frozen else None
 
   def get_tokens(self, _str):
     '''Break a string into tokens, preserving URL tags as an entire token.
@@ -64,19 +277,53 @@ class InvertedIndex(object):
     Args:
       _input: the input content
     '''
-    words = set(self.get_tokens(_input))
-    for word in words:
-      if self.have_vocabulary and word not in self.vocabulary:
-        continue
+    self._add_tokens(self.get_tokens(_input))
+
+  def add_documents(self, source, batch_size = 10000, interval = 10.0, doc_terms = None):
+    '''Add every document of a corpus to the inverted index.
+
+    The corpus is streamed a batch at a time, so it does not need to fit in
+    memory, and the docs/sec rate is logged every interval seconds.
+
+    Args:
+      source: corpus file name with one document per line, .gz and .bz2
+        files are decompressed, or an iterable of documents
+      batch_size: documents to tokenize and add in one batch
+      interval: seconds between two progress log lines
+      doc_terms: optional list, the term ids of every added document are
+        appended to it
+
+    Returns:
+      number of documents added
+    '''
+    return corpus_reader.feed(partial(self._add_batch, doc_terms = doc_terms),
+      source, batch_size, "InvertedIndex", interval)
+
+  def _add_batch(self, docs, doc_terms = None):
+    for tokens in map(self.get_tokens, docs):
+      term_ids = self._add_tokens(tokens)
+      if doc_terms is not None:
+        doc_terms.append(term_ids)
+
+  def _add_tokens(self, tokens):
+    # returns the ids of the terms the document was added to
+    term_ids = []
+    for word in set(tokens):
       if word in self.stopwords:
         continue
-      
-      try:
-        self.term_doc[word]
-        self.term_doc[word].append(self.num_docs)
-      except:
-        self.term_doc[word] = [self.num_docs, ]
+      term_id = self.vocab.add(word)
+      if term_id is None:
+        continue
+      self._postings_of(term_id).append(self.num_docs)
+      term_ids.append(term_id)
     self.num_docs += 1
+    return term_ids
+
+  def _postings_of(self, term_id):
+    # a shared vocabulary may have ids added by others
+    while len(self.term_doc) <= term_id:
+      self.term_doc.append(array('I'))
+    return self.term_doc[term_id]
 
   def save_corpus_to_file(self, index_filename):
     '''Save the inverted index to the specified file.
@@ -87,7 +334,7 @@ class InvertedIndex(object):
     output_file = open(index_filename, "w")
     
     output_file.write(str(self.num_docs) + "\n")
-    for key, value in self.term_doc.items():
+    for key, value in self:
       output_file.write(key + "\t" + "\t".join([str(i) for i in value]) + "\n")
     output_file.close()
   
@@ -97,14 +344,58 @@ class InvertedIndex(object):
     Args:
       index_filename: build by save_corpus_to_file
     '''
-    self.term_doc = {}   
-    self.term_count = {} 
+    self.term_doc = []
     with open(index_filename) as fp:
       line = fp.readline()
       self.num_docs = int(line.strip())
       for line in fp:
         word, docs = line.split("\t", 1)
-        self.term_doc[word] = map(int, docs.split("\t"))
+        term_id = self.vocab.add(word)
+        if term_id is not None:
+          self._postings_of(term_id).extend(map(int, docs.split("\t")))
+
+  def save_corpus_to_binary(self, index_filename):
+    '''Save the inverted index to the specified file in the binary format.
+
+    Args:
+      index_filename: the specified file
+    '''
+    items = list(self)
+    _write_binary(index_filename, self.num_docs, len(items), items)
+
+  def load_corpus_from_binary(self, index_filename):
+    '''Memory-map an index file builded by save_corpus_to_binary
+
+    Loading is almost free, the postings are read from the mapped file when
+    they are used.  The loaded index is read-only, no more documents can be
+    added to it, and it uses the file's own vocabulary.
+
+    Args:
+      index_filename: build by save_corpus_to_binary or convert_corpus_file
+    '''
+    self.term_doc = MappedPostings(index_filename)
+    self.vocab = self.term_doc.vocab
+    self.num_docs = self.term_doc.num_docs
+
+  def merge(self, other):
+    '''Append the documents of another inverted index to this one
+
+    The doc numbers of other are shifted by this index's document count, so
+    merging the indexes of consecutive parts of a corpus in order gives the
+    same index as adding the whole corpus to one.
+
+    Args:
+      other: InvertedIndex instance, it is not changed
+    '''
+    offset = numpy.uint32(self.num_docs)
+    for word, postings in other:
+      term_id = self.vocab.add(word)
+      if term_id is None:
+        continue
+      shifted = numpy.asarray(postings, dtype = numpy.uint32) + offset
+      self._postings_of(term_id).fromstring(shifted.tostring())
+    self.num_docs += other.num_docs
+    return self
 
   def get_num_docs(self):
     '''Return the total number of documents added.
@@ -121,13 +412,40 @@ class InvertedIndex(object):
       w1: one word
       w2: another word
     '''
-    count = 0.0
-    try:
-      for item in self.term_doc[w1]: 
-        if item in self.term_doc[w2] : count += 1
-    except:
-      pass
-    return count
+    return self.concurrence_by_id(self.vocab.get_id(w1), self.vocab.get_id(w2))
+
+  def concurrence_by_id(self, id1, id2):
+    '''Return the concurrence of two term ids in one document
+
+    Args:
+      id1: one term id, None for unknown terms
+      id2: another term id
+    '''
+    return 0.0 + intersect_count(self.get_postings_by_id(id1), self.get_postings_by_id(id2))
+
+  def get_postings(self, term):
+    '''Return the sorted doc numbers the term appeared in
+
+    Args:
+      term: the check term
+
+    Returns:
+      array('I') of doc numbers, empty if the term never appeared
+    '''
+    return self.get_postings_by_id(self.vocab.get_id(term))
+
+  def get_postings_by_id(self, term_id):
+    '''Return the sorted doc numbers of a term id
+
+    Args:
+      term_id: the id of the term in vocab, None for unknown terms
+
+    Returns:
+      array('I') of doc numbers, empty if the term never appeared
+    '''
+    if term_id is None or term_id >= len(self.term_doc):
+      return array('I')
+    return self.term_doc[term_id]
   
   def get_word_appear(self, term):
     '''Return the count of the document term appeared.
@@ -138,22 +456,29 @@ class InvertedIndex(object):
     Returns:
       term appear time
     '''
-    # recorded in term_count, lazy loading
-    base = 0.0
-    try:
-      return self.term_count[term]
-    except:
-      pass
-    try:
-      self.term_count[term] = base + len(self.term_doc[term])
-      return self.term_count[term]
-    except:
-      return base
+    return self.get_word_appear_by_id(self.vocab.get_id(term))
+
+  def get_word_appear_by_id(self, term_id):
+    '''Return the count of the document a term id appeared.
+
+    Args:
+      term_id: the id of the term in vocab, None for unknown terms
+    '''
+    return 0.0 + len(self.get_postings_by_id(term_id))
 
   def __iter__(self):
     '''Return the term : [docnum]'''
-    for x in self.term_doc.items():
-      yield x
+    for term_id, postings in enumerate(self.term_doc):
+      if len(postings):
+        yield self.vocab.get_term(term_id), postings
+
+  def get_term_ids(self):
+    '''Return the ids of the terms
+
+    Returns:
+      A list object of term ids in vocab, for the terms that appeared
+    '''
+    return [term_id for term_id, postings in enumerate(self.term_doc) if len(postings)]
 
   def get_terms(self):
     '''Return the terms
@@ -161,10 +486,10 @@ class InvertedIndex(object):
     Returns:
       A list object of terms
     '''
-    return self.term_doc.keys()
+    return [self.vocab.get_term(term_id) for term_id in self.get_term_ids()]
 
   def top_k_appear(self, k):
+    terms = self.get_terms()
     heap = TopkHeap(k)
-    for term in self.get_terms():
-      heap.push((self.get_word_appear(term), term))
+    heap.push_many([self.get_word_appear(term) for term in terms], terms)
     return heap.topk()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+#
+# This is a long-lived keyword extraction service based on tfidf
+#
+# The idf corpus is loaded once and frozen into an idf array by term id,
+# each request only counts its own tokens and keeps the top k keywords
+# with heapq.nlargest instead of sorting every term.
+#
+# @author: Jason Wu (Jasonwbw@yahoo.com)
+
+from collections import Counter
+from collections import deque
+from multiprocessing.pool import ThreadPool
+from operator import itemgetter
+from tfidf import TfIdf
+import SocketServer
+import heapq
+import threading
+import time
+
+class KeywordServer(object):
+
+  '''Serve top k tf-idf keywords of documents concurrently
+
+  Attributes:
+    tfidf: the frozen TfIdf instance
+    idf: idf array by term id of tfidf
+    top_k: default number of keywords returned
+    latencies: the latest request latencies in seconds
+  '''
+
+  def __init__(self, corpus_filename = None, stopword_filename = None,
+               tfidf = None, top_k = 10, threads = 8, latency_window = 100000):
+    '''Load the idf corpus once and start the worker threads.
+
+    Args:
+      corpus_filename: idf file saved by TfIdf, used when tfidf is None
+      stopword_filename: stopword file, used when tfidf is None
+      tfidf: an already built TfIdf instance, it is frozen
+      top_k: default number of keywords returned
+      threads: number of request threads
+      latency_window: number of latest requests kept for latency stats
+    '''
+    if tfidf is None:
+      tfidf = TfIdf(corpus_filename = corpus_filename,
+        stopword_filename = stopword_filename)
+    self.tfidf = tfidf
+    self.tfidf.freeze()
+    self.idf = self.tfidf.get_idf_array()
+    self.top_k = top_k
+    self.latencies = deque(maxlen = latency_window)
+    self.lock = threading.Lock()
+    self.pool = ThreadPool(threads)
+
+  def get_keywords(self, doc, top_k = None):
+    '''Get the top k keywords of a document.
+
+    Args:
+      doc: the document
+      top_k: number of keywords, default is the server's top_k
+
+    Returns:
+      list of (term, tf-idf) ordered by decreasing tf-idf
+    '''
+    begin = time.time()
+    keywords = self._top_keywords(self.tfidf.get_tokens(doc),
+      self.top_k if top_k is None else top_k)
+    latency = time.time() - begin
+    with self.lock:
+      self.latencies.append(latency)
+    return keywords
+
+  def _top_keywords(self, tokens, top_k):
+    if not tokens:
+      return []
+    stopwords = self.tfidf.stopwords
+    term_id = self.tfidf.vocab.term_id
+    idf, idf_default = self.idf, self.tfidf.idf_default
+    size = float(len(tokens))
+
+    scores = []
+    for word, count in Counter(tokens).iteritems():
+      i = term_id.get(word)
+      if i is not None and i < len(idf):
+        word_idf = idf[i]
+      elif word in stopwords:
+        word_idf = 0
+      else:
+        word_idf = idf_default
+      scores.append((word, count / size * word_idf))
+    return [(word, float(score)) for word, score in
+      heapq.nlargest(top_k, scores, key = itemgetter(1))]
+
+  def submit(self, doc, top_k = None):
+    '''Get the keywords of a document in a worker thread.
+
+    Returns:
+      multiprocessing.pool.AsyncResult, its get() returns the keywords
+    '''
+    return self.pool.apply_async(self.get_keywords, (doc, top_k))
+
+  def get_keywords_many(self, docs, top_k = None):
+    '''Get the keywords of many documents over the worker threads.
+
+    Returns:
+      list of keywords lists in docs order
+    '''
+    return self.pool.map(lambda doc: self.get_keywords(doc, top_k), docs)
+
+  def get_latency(self):
+    '''Get the latency stats of the latest requests.
+
+    Returns:
+      dictory with count, p50 and p99 latency in seconds
+    '''
+    with self.lock:
+      latencies = sorted(self.latencies)
+    if not latencies:
+      return {"count": 0, "p50": 0.0, "p99": 0.0}
+    def percentile(q):
+      return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+    return {"count": len(latencies), "p50": percentile(0.5), "p99": percentile(0.99)}
+
+  def serve_forever(self, host = "127.0.0.1", port = 9527):
+    '''Serve keywords over TCP, one document per line.
+
+    Every line received gets one line back: "term:score" pairs joined by
+    tabs.  Each connection is handled in its own thread.
+
+    Args:
+      host: the address to bind
+      port: the port to bind
+    '''
+    server = _ThreadingServer((host, port), _KeywordHandler)
+    server.keyword_server = self
+    try:
+      server.serve_forever()
+    finally:
+      server.server_close()
+
+  def close(self):
+    '''Stop the worker threads.'''
+    self.pool.close()
+    self.pool.join()
+
+
+class _ThreadingServer(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+  daemon_threads = True
+  allow_reuse_address = True
+
+
+class _KeywordHandler(SocketServer.StreamRequestHandler):
+
+  def handle(self):
+    keyword_server = self.server.keyword_server
+    for line in self.rfile:
+      keywords = keyword_server.get_keywords(line)
+      self.wfile.write("\t".join("%s:%s" % pair for pair in keywords) + "\n")
+      self.wfile.flush()
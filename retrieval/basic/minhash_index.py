@@ -0,0 +1,344 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+#
+# This is an approximate Inverted Index with a fixed-size sketch per term
+#
+# Every document number is hashed to 64 bits and a term keeps only the k
+# smallest hashes of its documents (a bottom-k MinHash sketch) instead of
+# the postings.  Document counts and concurrences are estimated from the
+# sketches, and are exact while a term appeared in less than k documents.
+#
+# Reference: Beyer et al., On Synopses for Distinct-Value Estimation Under
+# Multiset Operations
+#
+# @author: Jason Wu (Jasonwbw@yahoo.com)
+
+from functools import partial
+from topkheap import TopkHeap
+from vocabulary import Vocabulary
+import corpus_reader
+import math
+import numpy
+import struct
+
+HASH_MASK = (1 << 64) - 1
+HASH_RANGE = float(1 << 64)
+
+# binary sketch file layout, all in native byte order:
+#   header: magic, version, k, seed, first_doc, num_docs, num_terms,
+#           size of the term dictionary
+#   offsets: uint64 * (num_terms + 1), start of each term in the hashes
+#   hashes: uint64 * offsets[-1], all sketches one after another
+#   terms: the term dictionary, terms joined by "\n" in offsets order
+SKETCH_MAGIC = "MHIX"
+SKETCH_VERSION = 1
+SKETCH_HEADER = struct.Struct("=4sIQQQQQQ")
+
+def hash_doc(doc, seed = 0):
+  '''Hash a document number to 64 bits with the splitmix64 finalizer'''
+  x = (doc + (seed + 1) * 0x9E3779B97F4A7C15) & HASH_MASK
+  x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & HASH_MASK
+  x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & HASH_MASK
+  return x ^ (x >> 31)
+
+def sketch_size(error):
+  '''The sketch size k giving a relative standard error of the document counts
+
+  The bottom-k estimate (k - 1) / h_k has a relative standard error of
+  about 1 / sqrt(k - 2).
+  '''
+  return int(math.ceil(1.0 / error ** 2)) + 2
+
+class MinHashIndex(object):
+
+  '''Approximate Inverted Index with a bottom-k MinHash sketch per term
+
+  It is used in place of InvertedIndex for PMI, NPMI, MI and NMI, with the
+  memory of a term bounded by k hashes whatever its document count.  Only
+  the counts are kept, so it has the document count and concurrence
+  methods of InvertedIndex but no postings, and what needs them, as the
+  sparse and min_pair_count builds of PMI and PMI.update, can not use it.
+
+  The error of get_word_appear is about error relative to the count.  A
+  concurrence is estimated as the Jaccard similarity of the two terms times
+  their union count, its standard error is about
+  sqrt(union / (k * concurrence)) relative to the concurrence, so it is
+  good for the frequent pairs which matter for the top PMI elements.
+
+  Document i of the index is hashed as doc number first_doc + i, so the
+  indexes of consecutive parts of a corpus merge to the same sketches as
+  one index of it when each part is built with first_doc set to the number
+  of documents before it.
+
+  Attributes:
+    num_docs: number of document computed
+    vocab: Vocabulary of the terms, a frozen one restricts the index to its terms
+    stopwords: set of the stop words
+    k: the number of hashes kept per term
+    seed: seed of the document hash
+    first_doc: the doc number hashed for the first document
+    sketches: list of sorted uint64 arrays by term id, at most k hashes each
+    pending: list of hashes by term id not merged to the sketches yet
+  '''
+
+  def __init__(self, vocabulary = None, stopword_filename = None, error = 0.05, seed = 0,
+               first_doc = 0):
+    '''Initialize the index.
+
+    Args:
+      vocabulary : as for InvertedIndex
+      stopword_filename: file with one stopword in one line
+      error: the relative standard error of the document counts
+      seed: seed of the document hash
+      first_doc: the doc number of the first document
+    '''
+    self.num_docs = 0
+    self.stopwords = set()
+    if isinstance(vocabulary, Vocabulary):
+      self.vocab = vocabulary
+    elif vocabulary:
+      self.vocab = Vocabulary(vocabulary).freeze()
+    else:
+      self.vocab = Vocabulary()
+    if stopword_filename:
+      with open(stopword_filename) as stopword_file:
+        self.stopwords = set([line.strip() for line in stopword_file])
+
+    self.k = sketch_size(error)
+    self.seed = seed
+    self.first_doc = first_doc
+    self.sketches = []
+    self.pending = []
+
+  def get_tokens(self, _str):
+    '''Break a string into tokens, as InvertedIndex does
+
+    Args:
+      _str: the string to split
+    '''
+    return _str.strip().split()
+
+  def add_input_document(self, _input):
+    '''Add terms in the specified document to the index.
+
+    Args:
+      _input: the input content
+    '''
+    self._add_tokens(self.get_tokens(_input))
+
+  def add_documents(self, source, batch_size = 10000, interval = 10.0, doc_terms = None):
+    '''Add every document of a corpus to the index, see InvertedIndex.add_documents
+
+    Returns:
+      number of documents added
+    '''
+    return corpus_reader.feed(partial(self._add_batch, doc_terms = doc_terms),
+      source, batch_size, "MinHashIndex", interval)
+
+  def _add_batch(self, docs, doc_terms = None):
+    for tokens in map(self.get_tokens, docs):
+      term_ids = self._add_tokens(tokens)
+      if doc_terms is not None:
+        doc_terms.append(term_ids)
+
+  def _add_tokens(self, tokens):
+    doc_hash = hash_doc(self.first_doc + self.num_docs, self.seed)
+    term_ids = []
+    for word in set(tokens):
+      if word in self.stopwords:
+        continue
+      term_id = self.vocab.add(word)
+      if term_id is None:
+        continue
+      self._grow_to(term_id)
+      term_ids.append(term_id)
+      sketch = self.sketches[term_id]
+      if len(sketch) == self.k and doc_hash >= int(sketch[-1]):
+        continue
+      pending = self.pending[term_id]
+      pending.append(doc_hash)
+      if len(pending) >= self.k:
+        self._compact(term_id)
+    self.num_docs += 1
+    return term_ids
+
+  def _grow_to(self, term_id):
+    while len(self.sketches) <= term_id:
+      self.sketches.append(numpy.zeros(0, dtype = numpy.uint64))
+      self.pending.append([])
+
+  def _compact(self, term_id):
+    merged = numpy.union1d(self.sketches[term_id],
+      numpy.array(self.pending[term_id], dtype = numpy.uint64))
+    self.sketches[term_id] = merged[:self.k]
+    self.pending[term_id] = []
+
+  def get_sketch(self, term_id):
+    '''Return the sketch of a term id
+
+    Args:
+      term_id: the id of the term in vocab, None for unknown terms
+
+    Returns:
+      sorted uint64 array of the smallest hashes of the term's documents
+    '''
+    if term_id is None or term_id >= len(self.sketches):
+      return numpy.zeros(0, dtype = numpy.uint64)
+    if self.pending[term_id]:
+      self._compact(term_id)
+    return self.sketches[term_id]
+
+  def _estimate_count(self, sketch):
+    # all the hashes are there below k
+    if len(sketch) < self.k:
+      return float(len(sketch))
+    return (self.k - 1) / (float(sketch[self.k - 1]) / HASH_RANGE)
+
+  def get_word_appear_by_id(self, term_id):
+    '''Estimate the count of the document a term id appeared.
+
+    Args:
+      term_id: the id of the term in vocab, None for unknown terms
+    '''
+    return self._estimate_count(self.get_sketch(term_id))
+
+  def concurrence_by_id(self, id1, id2):
+    '''Estimate the concurrence of two term ids in one document
+
+    Args:
+      id1: one term id, None for unknown terms
+      id2: another term id
+    '''
+    s1, s2 = self.get_sketch(id1), self.get_sketch(id2)
+    if len(s1) < self.k and len(s2) < self.k:
+      return 0.0 + len(numpy.intersect1d(s1, s2, assume_unique = True))
+    # the k smallest hashes of the union are a sample of its documents
+    union = numpy.union1d(s1, s2)[:self.k]
+    both = numpy.in1d(union, s1, assume_unique = True) & \
+      numpy.in1d(union, s2, assume_unique = True)
+    return both.sum() / float(len(union)) * self._estimate_count(union)
+
+  def merge(self, other):
+    '''Append the documents of another index to this one
+
+    A sketch of the union of two document sets is the k smallest hashes of
+    both sketches.  The hashes can not be moved to other doc numbers, so
+    other must have been built with first_doc just after this index's last
+    document and the same k and seed.
+
+    Args:
+      other: MinHashIndex instance, it is not changed
+    '''
+    if (other.k, other.seed) != (self.k, self.seed):
+      raise ValueError("can not merge sketches of another k or seed")
+    if other.first_doc != self.first_doc + self.num_docs:
+      raise ValueError("the index to merge must start at doc %d, not %d" %
+        (self.first_doc + self.num_docs, other.first_doc))
+    for word, sketch in other:
+      term_id = self.vocab.add(word)
+      if term_id is None:
+        continue
+      self._grow_to(term_id)
+      self.sketches[term_id] = numpy.union1d(self.get_sketch(term_id), sketch)[:self.k]
+    self.num_docs += other.num_docs
+    return self
+
+  def save_corpus_to_binary(self, index_filename):
+    '''Save the sketches to the specified file in a binary format.
+
+    Args:
+      index_filename: the specified file
+    '''
+    items = list(self)
+    offsets = numpy.zeros(len(items) + 1, dtype = numpy.uint64)
+    numpy.cumsum([len(sketch) for _, sketch in items], out = offsets[1:])
+    terms = "\n".join(term for term, _ in items)
+    with open(index_filename, "wb") as output_file:
+      output_file.write(SKETCH_HEADER.pack(SKETCH_MAGIC, SKETCH_VERSION, self.k,
+        self.seed, self.first_doc, self.num_docs, len(items), len(terms)))
+      offsets.tofile(output_file)
+      for _, sketch in items:
+        sketch.tofile(output_file)
+      output_file.write(terms)
+
+  def load_corpus_from_binary(self, index_filename):
+    '''Load the sketches saved by save_corpus_to_binary
+
+    The k, seed and first_doc of the file replace this index's, and its
+    terms are added to the vocabulary as load_corpus_from_file does.
+
+    Args:
+      index_filename: build by save_corpus_to_binary
+    '''
+    with open(index_filename, "rb") as fp:
+      buffer = fp.read()
+    magic, version, self.k, self.seed, self.first_doc, self.num_docs, num_terms, \
+      terms_size = SKETCH_HEADER.unpack_from(buffer, 0)
+    if magic != SKETCH_MAGIC or version != SKETCH_VERSION:
+      raise ValueError("not a sketch file: " + index_filename)
+    offset = SKETCH_HEADER.size
+    offsets = numpy.frombuffer(buffer, dtype = numpy.uint64, count = num_terms + 1, offset = offset)
+    offset += offsets.nbytes
+    hashes = numpy.frombuffer(buffer, dtype = numpy.uint64, count = int(offsets[-1]), offset = offset)
+    offset += hashes.nbytes
+    terms = buffer[offset:offset + terms_size].split("\n") if num_terms else []
+    self.sketches, self.pending = [], []
+    for i, term in enumerate(terms):
+      term_id = self.vocab.add(term)
+      if term_id is None:
+        continue
+      self._grow_to(term_id)
+      self.sketches[term_id] = hashes[offsets[i]:offsets[i + 1]]
+
+  def get_num_docs(self):
+    '''Return the total number of documents added.
+
+    Returns:
+      Total number of documents
+    '''
+    return self.num_docs
+
+  def concurrence(self, w1, w2):
+    '''Estimate the concurrence of w1 and w2 in one document
+
+    Args:
+      w1: one word
+      w2: another word
+    '''
+    return self.concurrence_by_id(self.vocab.get_id(w1), self.vocab.get_id(w2))
+
+  def get_word_appear(self, term):
+    '''Estimate the count of the document term appeared.
+
+    Args:
+      term: the check term
+    '''
+    return self.get_word_appear_by_id(self.vocab.get_id(term))
+
+  def __iter__(self):
+    '''Iterate the (term, sketch) pairs of the terms that appeared'''
+    for term_id in self.get_term_ids():
+      yield self.vocab.get_term(term_id), self.get_sketch(term_id)
+
+  def get_term_ids(self):
+    '''Return the ids of the terms
+
+    Returns:
+      A list object of term ids in vocab, for the terms that appeared
+    '''
+    return [term_id for term_id in range(len(self.sketches))
+      if len(self.sketches[term_id]) or self.pending[term_id]]
+
+  def get_terms(self):
+    '''Return the terms
+
+    Returns:
+      A list object of terms
+    '''
+    return [self.vocab.get_term(term_id) for term_id in self.get_term_ids()]
+
+  def top_k_appear(self, k):
+    terms = self.get_terms()
+    heap = TopkHeap(k)
+    heap.push_many([self.get_word_appear(term) for term in terms], terms)
+    return heap.topk()
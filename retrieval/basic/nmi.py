@@ -9,17 +9,10 @@
 # @author: Jason Wu (Jasonwbw@yahoo.com)
 
 from pmi import MI
-import math
 
 class NMI(MI):
 
-	def compute_mi(self, sentence1, sentence2):
+	def compute_mi_batch(self, pairs):
 		# NMI(t1, t2) = mi / -sum_x_y_in_s12( p(x, y)logp(x, y))
-		mi = MI.compute_mi(self, sentence1, sentence2)
-		denominator = 0.0
-		for t1 in sentence1:
-			for t2 in sentence2:
-				p = self.iindex.concurrence(t1, t2) / self.iindex.get_num_docs()
-				if p > 0:
-					denominator += p * math.log(p, 2)
-		return mi != 0 and -mi / denominator or 0
\ No newline at end of file
+		return [mi != 0 and -mi / denominator or 0
+			for mi, denominator in self._compute_batch(pairs)]
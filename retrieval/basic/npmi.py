@@ -9,26 +9,65 @@
 # @author: Jason Wu (Jasonwbw@yahoo.com)
 
 from pmi import PMI
+from pmi import LOG2
 import math
+import numpy
+
+def npmi_arrays(concurrence, app1, app2, num_docs):
+	'''Compute npmi and pmi of many term pairs at once
+
+	The same as NPMI.pmi_from_counts element by element: -inf for a term
+	never appeared, -1 for a pair never appeared together and 1 for a pair
+	appeared in every document.
+
+	Args:
+		concurrence : array of document counts of both terms appeared
+		app1 : array or number of document counts of the first terms
+		app2 : array or number of document counts of the second terms
+		num_docs : total document count
+
+	Returns:
+		(npmi, pmi) float64 arrays, pmi is -inf where npmi is -inf or -1
+	'''
+	concurrence = numpy.asarray(concurrence, dtype = numpy.float64)
+	app1 = numpy.asarray(app1, dtype = numpy.float64)
+	app2 = numpy.asarray(app2, dtype = numpy.float64)
+	with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+		# NPMI(t1, t2) = log(p(t1,t2)/(p(t1)p(t2))) / -log(p(t1,t2))
+		to_log = concurrence * num_docs / (app1 * app2)
+		pmi = numpy.log(to_log) / LOG2
+		p_t1_t2 = numpy.log(concurrence / num_docs) / LOG2
+		npmi = -pmi / p_t1_t2
+	unseen = (app1 == 0) | (app2 == 0)
+	npmi[p_t1_t2 == 0] = 1
+	npmi[to_log == 0] = -1
+	npmi[unseen] = -float('inf')
+	pmi[unseen | (to_log == 0)] = -float('inf')
+	return npmi, pmi
 
 class NPMI(PMI):
 
-	def compute_pmi(self, t1 , t2):
-		if self.iindex.get_word_appear(t1) == 0 or self.iindex.get_word_appear(t2) == 0:
+	def pmi_from_counts(self, concurrence, app1, app2, num_docs):
+		if app1 == 0 or app2 == 0:
 			return -float('inf')
 		# NPMI(t1, t2) = log(p(t1,t2)/(p(t1)p(t2))) / -log(p(t1,t2))
-		to_log = self.iindex.concurrence(t1, t2) * self.iindex.get_num_docs()\
-			/(self.iindex.get_word_appear(t1) \
-			* self.iindex.get_word_appear(t2))
+		to_log = concurrence * num_docs / (app1 * app2)
 		if to_log == 0:
 			return -1
 
-		p_t1_t2 = math.log(self.iindex.concurrence(t1, t2) \
-		    /(self.iindex.get_num_docs()), 2)
+		p_t1_t2 = math.log(concurrence / num_docs, 2)
 		if p_t1_t2 == 0:
 			return 1
 		else:
 			return -math.log(to_log,  2) / p_t1_t2
 
+	def pmi_from_count_arrays(self, concurrence, app1, app2, num_docs):
+		return npmi_arrays(concurrence, app1, app2, num_docs)[0]
+
+	def score_shift(self, old_num_docs, num_docs):
+		# the normalization -log(p(t1,t2)) changes with N too
+		return None
+
 	def get_top_pmi(self, term):
-		return [i for i in super(NPMI,self).get_top_pmi(term)
\ No newline at end of file
+		# -1 means the pair never appeared together
+		return [i for i in super(NPMI,self).get_top_pmi(term) if i.pmi != -1]
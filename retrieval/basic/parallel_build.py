@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+#
+# This is a map-reduce driver to build an index over a process pool
+#
+# The corpus is cut into consecutive shards, each worker builds a partial
+# index of its shard with add_documents, then the partial indexes are merged
+# in shard order with their merge method.  Any class with add_documents and
+# merge works: InvertedIndex, TfIdf, AppearCount, ClassTfIdf and
+# ClassInvertedIndex.
+#
+# @author: Jason Wu (Jasonwbw@yahoo.com)
+
+import corpus_reader
+import itertools
+import multiprocessing
+import os
+
+def shard_file(filename, num_shards):
+  '''Cut a plain text file into byte ranges that start at line starts
+
+  Args:
+    filename: the corpus file
+    num_shards: number of ranges wanted
+
+  Returns:
+    list of (start, end) byte ranges covering the file in order, there may
+    be less than num_shards of them for small files
+  '''
+  size = os.path.getsize(filename)
+  bounds = [0]
+  with open(filename, "rb") as fp:
+    for k in range(1, num_shards):
+      fp.seek(max(size * k / num_shards - 1, bounds[-1]))
+      fp.readline()
+      if fp.tell() >= size:
+        break
+      if fp.tell() > bounds[-1]:
+        bounds.append(fp.tell())
+  bounds.append(size)
+  return [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1)
+    if bounds[i] < bounds[i + 1]]
+
+def iter_shard(filename, start, end):
+  '''Iterate the lines of a byte range made by shard_file
+
+  Yields:
+    the lines without their line break
+  '''
+  with open(filename, "rb") as fp:
+    fp.seek(start)
+    pos = start
+    while pos < end:
+      line = fp.readline()
+      if not line:
+        break
+      pos += len(line)
+      yield line.rstrip("\r\n")
+
+def tree_merge(indexes):
+  '''Merge partial indexes pairwise, neighbours first, keeping their order
+
+  The indexes are folded as they come, two neighbours are merged as soon as
+  they cover the same number of parts, like the carries of a binary counter.
+  So only about log2(number of parts) partial indexes are held at once,
+  whatever the length of the iterable.
+
+  Args:
+    indexes: iterable of partial indexes in corpus order
+
+  Returns:
+    the merged index, built in the first partial index
+  '''
+  stack = []   # (number of parts merged, index), in corpus order
+  for index in indexes:
+    size = 1
+    while stack and stack[-1][0] == size:
+      index = stack.pop()[1].merge(index)
+      size *= 2
+    stack.append((size, index))
+  if not stack:
+    raise ValueError("nothing to merge")
+  _, merged = stack.pop()
+  while stack:
+    merged = stack.pop()[1].merge(merged)
+  return merged
+
+def _build_part(task):
+  factory, add_kwargs, source = task
+  index = factory[0](*factory[1], **factory[2])
+  if isinstance(source, tuple):
+    source = iter_shard(*source)
+  index.add_documents(source, **add_kwargs)
+  return index
+
+def build_index(cls, source, workers = None, args = (), kwargs = None,
+                add_kwargs = None, chunk_size = 100000):
+  '''Build an index of a corpus over a process pool
+
+  A plain corpus file is cut into one byte range per worker and each
+  worker reads its own range.  Compressed files and iterables are read
+  here and sent to the workers chunk_size documents at a time.  Either way
+  the result is the same as a serial add_documents over the whole corpus.
+
+  Args:
+    cls: the index class, must have add_documents and merge
+    source: corpus file name with one document per line, or an iterable
+    workers: number of processes, default is the cpu count
+    args: positional arguments to create an index, e.g. class_num
+    kwargs: keyword arguments to create an index
+    add_kwargs: keyword arguments passed to add_documents
+    chunk_size: documents sent to a worker at once for non plain sources
+
+  Returns:
+    the built index
+  '''
+  workers = workers or multiprocessing.cpu_count()
+  factory = (cls, tuple(args), kwargs or {})
+  add_kwargs = add_kwargs or {}
+
+  if isinstance(source, basestring) and not source.endswith((".gz", ".bz2")):
+    tasks = [(factory, add_kwargs, (source, start, end))
+      for start, end in shard_file(source, workers)]
+  else:
+    tasks = ((factory, add_kwargs, chunk) for chunk in
+      corpus_reader.iter_batches(corpus_reader.iter_documents(source), chunk_size))
+
+  pool = multiprocessing.Pool(workers)
+  try:
+    # imap keeps the partial indexes in corpus order, they are merged as
+    # they arrive
+    parts = pool.imap(_build_part, tasks)
+    first = next(parts, None)
+    if first is None:
+      return _build_part((factory, add_kwargs, []))
+    return tree_merge(itertools.chain([first], parts))
+  finally:
+    pool.close()
+    pool.join()
@@ -8,8 +8,98 @@
 # @author: Jason Wu (bowenwu@sohu-inc.com)
 
 from inverted_index import InvertedIndex
+from array import array
+from collections import OrderedDict
 from topkheap import TopkHeap
+from vocabulary import Vocabulary
+import heapq
 import math
+import mmap as _mmap
+import multiprocessing
+import numpy
+import struct
+
+# the PMI instance being built, inherited by the forked pool workers so the
+# postings are shared copy-on-write instead of pickled for every task
+_building_pmi = None
+
+# binary model file layout, all in native byte order:
+#   header: magic, version, score itemsize, top, min_term_df, max_term_df
+#           (0 for no limit), min_pair_count, num_docs, num_docs of the last
+#           full build, num_terms, num_elements, size of the term dictionary
+#   offsets: uint64 * (num_terms + 1), start of each term's top elements
+#   scores: float32 or float64 * num_elements
+#   neighbors: uint32 * num_elements
+#   terms: the vocabulary, terms joined by "\n" in id order
+MODEL_MAGIC = "PMIX"
+MODEL_VERSION = 3
+MODEL_HEADER = struct.Struct("=4sIIIQQQQQQQQ")
+MODEL_SCORE_DTYPES = {4: numpy.float32, 8: numpy.float64}
+
+LOG2 = math.log(2)
+
+def pmi_arrays(concurrence, app1, app2, num_docs):
+	'''Compute pmi of many term pairs at once
+
+	The same as PMI.pmi_from_counts element by element, -inf for a term
+	never appeared or a pair never appeared together.
+
+	Args:
+		concurrence : array of document counts of both terms appeared
+		app1 : array or number of document counts of the first terms
+		app2 : array or number of document counts of the second terms
+		num_docs : total document count
+
+	Returns:
+		float64 array of pmi values
+	'''
+	concurrence = numpy.asarray(concurrence, dtype = numpy.float64)
+	app1 = numpy.asarray(app1, dtype = numpy.float64)
+	app2 = numpy.asarray(app2, dtype = numpy.float64)
+	with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+		to_log = concurrence * num_docs / (app1 * app2)
+		pmi = numpy.log(to_log) / LOG2
+	pmi[(to_log == 0) | (app1 == 0) | (app2 == 0)] = -float('inf')
+	return pmi
+
+def doc_index(items, postings, num_docs):
+	'''Invert postings to the items of every document, as a CSR
+
+	Args:
+		items : array of the item of every postings list
+		postings : list of int64 arrays of doc numbers
+		num_docs : total document count
+
+	Returns:
+		(doc_ptr, doc_items), the items of doc d are doc_items[doc_ptr[d]:doc_ptr[d+1]]
+	'''
+	lengths = numpy.array([len(p) for p in postings], dtype = numpy.int64)
+	docs = numpy.concatenate(postings) if postings else numpy.zeros(0, dtype = numpy.int64)
+	doc_items = numpy.repeat(items, lengths)[numpy.argsort(docs, kind = "mergesort")]
+	doc_ptr = numpy.zeros(num_docs + 1, dtype = numpy.int64)
+	numpy.cumsum(numpy.bincount(docs, minlength = num_docs), out = doc_ptr[1:])
+	return doc_ptr, doc_items
+
+def cooccurrence(doc_ptr, doc_items, docs, item):
+	'''Count the other items of some documents of a doc_index
+
+	Args:
+		doc_ptr, doc_items : as returned by doc_index
+		docs : int64 array of the doc numbers an item appeared in
+		item : the item itself, left out
+
+	Returns:
+		(others, counts) arrays, the items appeared with item and in how many docs
+	'''
+	starts = doc_ptr[docs]
+	sizes = doc_ptr[docs + 1] - starts
+	gather = numpy.repeat(starts - numpy.cumsum(sizes) + sizes, sizes) + \
+		numpy.arange(sizes.sum())
+	others, counts = numpy.unique(doc_items[gather], return_counts = True)
+	return others[others != item], counts[others != item]
+
+def _build_rows(rows):
+	return _building_pmi._build_rows(*rows)
 
 class PMIElement(object):
 
@@ -22,6 +112,8 @@ class PMIElement(object):
 		pmi: pmi value of this term and t2
 	'''
 
+	__slots__ = ('t2', 'pmi')
+
 	def __init__(self, t2, pmi = 0):
 		self.t2 = t2
 		self.pmi = pmi
@@ -32,6 +124,12 @@ class PMIElement(object):
 			return self.pmi > element.pmi
 		raise TypeError
 
+	def __lt__(self, element):
+		# heapq compares with <, without it python 2 falls back to identity
+		if isinstance(element, PMIElement):
+			return self.pmi < element.pmi
+		raise TypeError
+
 	def __eq__(self, other):  
 		# must t2 and pmi equal
 		if isinstance(other, PMIElement) and \
@@ -39,6 +137,9 @@ class PMIElement(object):
 			return True
 		return False
 
+	def __ne__(self, other):
+		return not self.__eq__(other)
+
 	def __str__(self):
 		# t2:pmi
 		return self.t2 + ":" + str(self.pmi)
@@ -60,21 +161,74 @@ class PMI(object):
     Then compute all terms' pmi top k element and pmi score 
 
     Attributes:
-    	iindex : the inverted index of given documents
+    	iindex : the inverted index of given documents, None for a loaded model
+    	vocab : the vocabulary of term ids, iindex's unless loaded from a file
     	top : means the k of top k elements while hold for one term
-    	term_pmi : dictory of terms top pmi elements "term : list of PMIElement"
+    	score_dtype : numpy dtype of the saved pmi scores
+    	min_term_df : terms appeared in fewer documents are left out
+    	max_term_df : terms appeared in more documents are left out, None for no limit
+    	min_pair_count : pairs appeared together in fewer documents are left out
+    	offsets : the top elements of term id i are [offsets[i], offsets[i+1])
+    		of neighbors and scores, None before build
+    	neighbors : uint32 array of the other term's id, terms are in vocab
+    	scores : array of the pmi values, decreasing within a term
+    	num_docs : document count the scores are computed with
+    	built_num_docs : document count of the last full build
+    	term_pmi : dictory of terms top pmi elements "term : TopkHeap of
+    		PMIElement", built from the arrays when first read
 	'''
 
-	def __init__(self, inverted_index, top = 50):
+	def __init__(self, inverted_index, top = 50, score_dtype = numpy.float64,
+		min_term_df = 1, max_term_df = None, min_pair_count = 0):
 		'''init all attributes
 
 		Args:
 			inverted_index : InvertedIndex instance
 			top : how many top element to save
+			score_dtype : numpy.float32 halves the memory of the scores, but
+				get_top_pmi will not be exactly equal to compute_pmi then
+			min_term_df : skip the terms appeared in fewer documents
+			max_term_df : skip the terms appeared in more documents
+			min_pair_count : skip the pairs appeared together in fewer
+				documents, 0 keeps the pairs never appeared together
 		'''
 		self.iindex = inverted_index
+		self._vocab = None
 		self.top = top
-		self.term_pmi = {}
+		self.score_dtype = score_dtype
+		self.min_term_df = min_term_df
+		self.max_term_df = max_term_df
+		self.min_pair_count = min_pair_count
+		self.offsets = None
+		self.neighbors = numpy.zeros(0, dtype = numpy.uint32)
+		self.scores = numpy.zeros(0, dtype = score_dtype)
+		self.num_docs = self.built_num_docs = 0
+		self._term_pmi = None
+		# the arguments of the last build, used again by update
+		self._build_args = {}
+		# doc number -> term ids and term id -> rows holding it, for update
+		self._doc_ptr = self._doc_terms = None
+		self._holders = None
+
+	@property
+	def vocab(self):
+		if self._vocab is not None:
+			return self._vocab
+		return self.iindex.vocab
+
+	@property
+	def term_pmi(self):
+		# the old term keyed view, kept until the arrays change
+		if self._term_pmi is None and self.offsets is not None:
+			vocab = self.vocab
+			term_pmi = {}
+			for term_id in range(len(self.offsets) - 1):
+				heap = TopkHeap(self.top)
+				heap.data = self.get_top_pmi(vocab.get_term(term_id))
+				heapq.heapify(heap.data)
+				term_pmi[vocab.get_term(term_id)] = heap
+			self._term_pmi = term_pmi
+		return self._term_pmi if self._term_pmi is not None else {}
 
 	def change_inverted_index(self, inverted_index):
 		'''change instance's iindex
@@ -84,34 +238,515 @@ class PMI(object):
 		'''
 		self.inverted_index = inverted_index
 
-	def build(self):
+	def build(self, sparse = False, block_size = 1024, workers = 1):
 		'''compute all terms' top pmi elements
 
-		All terms computed is from iindex's get_terms method.
+		All terms computed is from iindex's get_terms method, less the terms
+		out of the min_term_df and max_term_df range.
+
+		With a min_pair_count the candidate pairs come from walking the
+		postings: the documents of a term give the terms it appeared with
+		and their counts, so pairs sharing no document are never looked at.
+		This mode is serial and is used whatever the workers.
+
+		The default mode scores every term pair.  The sparse mode computes the
+		co-occurrence counts of a block of terms at once as a sparse matrix
+		product and only scores the pairs that appeared together, so those
+		pairs are skipped rather than pushed as -inf.
+
+		With more than one worker the default mode splits the terms into row
+		blocks for a process pool.  Each worker fills the whole heap of its
+		own terms, so every pair is scored twice, but the result is identical
+		to the serial build.
+
+		The heaps hold plain (pmi, term id) tuples while building, and are
+		frozen into the offsets, neighbors and scores arrays at the end.
+
+		Args:
+			sparse : use the sparse matrix co-occurrence engine
+			block_size : how many terms to compute in one block
+			workers : number of processes for the default mode
+		'''
+		self._build_args = dict(sparse = sparse, block_size = block_size, workers = workers)
+		if sparse:
+			return self._build_sparse(block_size)
+		if self.min_pair_count > 0:
+			return self._build_candidates()
+		if workers > 1:
+			return self._build_parallel(block_size, workers)
+
+		term_ids = self.get_term_ids()
+		appears = self._get_appears(term_ids)
+		num_docs = self.iindex.get_num_docs()
+		heaps = dict((term_id, TopkHeap(self.top)) for term_id in term_ids)
+		for i in range(len(term_ids)-1):
+			counts = [self.iindex.concurrence_by_id(term_ids[i], term_ids[j])
+				for j in range(i+1, len(term_ids))]
+			scores = self.pmi_from_count_arrays(counts, appears[i], appears[i+1:], num_docs)
+			heaps[term_ids[i]].push_many(scores, term_ids[i+1:])
+			for j, pmi in enumerate(scores.tolist(), i+1):
+				heaps[term_ids[j]].push((pmi, term_ids[i]))
+		self._freeze(dict((term_id, heap.data) for term_id, heap in heaps.iteritems()))
+
+	def _build_parallel(self, block_size, workers):
+		global _building_pmi
+
+		self._term_ids = numpy.array(self.get_term_ids(), dtype = numpy.int64)
+		self._appears = self._get_appears(self._term_ids)
+		n = len(self._term_ids)
+		# small enough blocks to keep all the workers busy until the end
+		block_size = max(1, min(block_size, n / (workers * 4)))
+		blocks = [(start, min(start + block_size, n)) for start in range(0, n, block_size)]
+
+		_building_pmi = self
+		pool = multiprocessing.Pool(workers)
+		heaps = {}
+		try:
+			for rows in pool.imap_unordered(_build_rows, blocks):
+				for i, data in rows:
+					heaps[int(self._term_ids[i])] = data
+		finally:
+			pool.close()
+			pool.join()
+			_building_pmi = None
+			del self._term_ids, self._appears
+		self._freeze(heaps)
+
+	def _build_rows(self, start, stop):
+		return [(i, self._build_row(i)) for i in range(start, stop)]
+
+	def _build_row(self, i):
+		# a row computed alone is the same as in a full build
+		term_ids = self._term_ids
+		others = numpy.array([j for j in range(len(term_ids)) if j != i], dtype = numpy.int64)
+		counts = numpy.array([self.iindex.concurrence_by_id(term_ids[i], term_ids[j])
+			for j in others.tolist()], dtype = numpy.float64)
+		return self._score_row(term_ids, others, counts, self._appears[i],
+			self._appears[others], self.iindex.get_num_docs())
+
+	def _score_row(self, term_ids, others, counts, appear, others_appears, num_docs):
+		# top elements of one term from its concurrence with others, by
+		# position in the term_ids array
+		keep = counts >= self.min_pair_count
+		if not keep.all():
+			others, counts, others_appears = others[keep], counts[keep], others_appears[keep]
+		scores = self.pmi_from_count_arrays(counts, appear, others_appears, num_docs)
+		heap = TopkHeap(self.top)
+		heap.push_many(scores, term_ids[others])
+		return heap.data
+
+	def _get_appears(self, term_ids):
+		return numpy.array([self.iindex.get_word_appear_by_id(term_id) for term_id in term_ids],
+			dtype = numpy.float64)
+
+	def _build_candidates(self):
+		term_ids = self.get_term_ids()
+		term_id_array = numpy.array(term_ids, dtype = numpy.int64)
+		postings = [numpy.asarray(self.iindex.get_postings_by_id(term_id), dtype = numpy.int64)
+			for term_id in term_ids]
+		appears = numpy.array([len(p) for p in postings], dtype = numpy.float64)
+		num_docs = self.iindex.get_num_docs()
+
+		# doc -> positions in term_ids of the terms in it
+		doc_ptr, doc_terms = doc_index(numpy.arange(len(term_ids)), postings, num_docs)
+
+		heaps = {}
+		for i, term_id in enumerate(term_ids):
+			others, counts = cooccurrence(doc_ptr, doc_terms, postings[i], i)
+			heaps[term_id] = self._score_row(term_id_array, others, counts.astype(numpy.float64),
+				appears[i], appears[others], num_docs)
+		self._freeze(heaps)
+
+	def _build_sparse(self, block_size):
+		# scipy is only needed for this mode
+		from cooccurrence import iter_cooccurrence_blocks
+
+		term_ids = self.get_term_ids()
+		term_id_array = numpy.array(term_ids, dtype = numpy.int64)
+		appears = self._get_appears(term_ids)
+		num_docs = self.iindex.get_num_docs()
+		heaps = {}
+		for start, block in iter_cooccurrence_blocks(self.iindex, term_ids, block_size):
+			for r in range(block.shape[0]):
+				i = start + r
+				others = block.indices[block.indptr[r]:block.indptr[r + 1]].astype(numpy.int64)
+				counts = block.data[block.indptr[r]:block.indptr[r + 1]].astype(numpy.float64)
+				counts, others = counts[others != i], others[others != i]
+				heaps[term_ids[i]] = self._score_row(term_id_array, others, counts,
+					appears[i], appears[others], num_docs)
+		self._freeze(heaps)
+
+	def _freeze(self, heaps):
+		'''Freeze the built heaps into the offsets, neighbors and scores arrays
+
+		Args:
+			heaps : dictory of "term id : list of (pmi, term id)"
+		'''
+		self._holders = None
+		self.offsets = numpy.zeros(1, dtype = numpy.int64)
+		self.neighbors = numpy.zeros(0, dtype = numpy.uint32)
+		self.scores = numpy.zeros(0, dtype = self.score_dtype)
+		self._splice(heaps, 0.0)
+		self.num_docs = self.built_num_docs = self.iindex.get_num_docs()
+
+	def _splice(self, rows, shift):
+		'''Replace some rows of the frozen arrays
+
+		Args:
+			rows : dictory of "term id : list of (pmi, term id)" to replace
+			shift : added to the scores of all the other rows
+		'''
+		vocab_size = len(self.vocab)
+		old_offsets = numpy.asarray(self.offsets, dtype = numpy.int64)
+		old_rows = len(old_offsets) - 1
+		for data in rows.itervalues():
+			data.sort(reverse = True)
+		if self._holders is not None:
+			for term_id, data in rows.iteritems():
+				if term_id < old_rows:
+					for t2 in self.neighbors[old_offsets[term_id]:old_offsets[term_id + 1]].tolist():
+						self._holders[t2].discard(term_id)
+				for _, t2 in data:
+					self._holders.setdefault(t2, set()).add(term_id)
+
+		if old_rows == vocab_size and self.scores.flags.writeable and \
+			self.neighbors.flags.writeable and all(len(data) == old_offsets[term_id + 1] -
+				old_offsets[term_id] for term_id, data in rows.iteritems()):
+			# the same row lengths, written over the old rows
+			if shift:
+				self.scores += shift
+			for term_id, data in rows.iteritems():
+				start, stop = old_offsets[term_id], old_offsets[term_id + 1]
+				self.scores[start:stop] = [pmi for pmi, _ in data]
+				self.neighbors[start:stop] = [t2 for _, t2 in data]
+			self._term_pmi = None
+			return
+
+		lengths = numpy.zeros(vocab_size, dtype = numpy.int64)
+		lengths[:old_rows] = numpy.diff(old_offsets)
+		replaced = numpy.zeros(vocab_size, dtype = bool)
+		for term_id, data in rows.iteritems():
+			lengths[term_id] = len(data)
+			replaced[term_id] = True
+		offsets = numpy.zeros(vocab_size + 1, dtype = numpy.int64)
+		numpy.cumsum(lengths, out = offsets[1:])
+		neighbors = numpy.empty(offsets[-1], dtype = numpy.uint32)
+		scores = numpy.empty(offsets[-1], dtype = self.score_dtype)
+
+		# the kept rows are moved as a whole
+		owner = numpy.repeat(numpy.arange(old_rows), numpy.diff(old_offsets))
+		kept = numpy.nonzero(~replaced[owner])[0]
+		moved = offsets[owner[kept]] + (kept - old_offsets[owner[kept]])
+		neighbors[moved] = self.neighbors[kept]
+		scores[moved] = self.scores[kept] + shift
+
+		for term_id, data in rows.iteritems():
+			start, stop = offsets[term_id], offsets[term_id + 1]
+			scores[start:stop] = [pmi for pmi, _ in data]
+			neighbors[start:stop] = [t2 for _, t2 in data]
+		self.offsets, self.neighbors, self.scores = offsets, neighbors, scores
+		self._term_pmi = None
+
+	def update(self, source, batch_size = 10000, rebuild_ratio = 0.5, stale_ratio = 0.1):
+		'''Add documents to iindex and repair the top pmi elements
+
+		PMI(t1, t2) = log(c * N / (a1 * a2)), so a larger N alone shifts every
+		score by the same log(N' / N) and changes no ranking.  The rows that
+		can change are:
+		  - the terms of the new documents, whose counts changed
+		  - the terms holding one of those in their top elements, as the
+		    pair's score dropped and another term may take its place
+		  - in the default mode, when new terms appeared, the rows not full
+		    yet or ending with a never-appeared-together pair, which the new
+		    pairs tie with
+		  - with a min_term_df, the rows of the terms appeared with an old
+		    term getting into the df range
+		No other pair can get into a top list.  These rows are recomputed
+		with the mode and arguments of the last build, the sparse and
+		min_pair_count ones only over the pairs appeared together, and the
+		scores of the others are shifted, so the top elements are the ones of
+		a full build of that mode.
+
+		The first update inverts the postings to the terms of every document
+		and the top elements to the rows holding every term, and the next
+		ones only add the new documents and repaired rows to them.  A repaired
+		row then costs the terms of its documents, plus the number of terms
+		in the default mode.  Documents added to iindex other than by update
+		are not in these, so they make a full build.
+
+		If more than rebuild_ratio of the rows need a repair, a full build is
+		cheaper and done instead.
+
+		Scores with no such uniform shift, as NPMI's, keep the others rows
+		from the last full build.  They are rebuilt fully once the document
+		count grew more than stale_ratio since then.
+
+		Args:
+			source : the new documents, as for InvertedIndex.add_documents
+			batch_size : documents added to iindex at a time
+			rebuild_ratio : fraction of repaired rows to do a full build
+			stale_ratio : document count growth allowed without a full build
+				when the scores can not be shifted
+
+		Returns:
+			the number of rows recomputed
+		'''
+		if self.offsets is None:
+			raise ValueError("build the PMI before updating it")
+		old_num_docs = self.num_docs
+		known = self.iindex.get_num_docs() == old_num_docs
+		new_docs = []
+		self.iindex.add_documents(source, batch_size = batch_size, doc_terms = new_docs)
+		num_docs = self.iindex.get_num_docs()
+		if num_docs == old_num_docs:
+			return 0
+		if not known or self._doc_ptr is None or len(self._doc_ptr) - 1 != old_num_docs:
+			self._doc_ptr = self._doc_terms = None
+		self._index_docs(new_docs)
+
+		term_ids = self.get_term_ids()
+		if not known:
+			self.build(**self._build_args)
+			return len(term_ids)
+		vocab_size = len(self.vocab)
+		position = numpy.empty(vocab_size, dtype = numpy.int64)
+		position.fill(-1)
+		position[term_ids] = numpy.arange(len(term_ids))
+		new_ids = [term_id for doc in new_docs for term_id in doc]
+		new_counts = numpy.bincount(new_ids, minlength = vocab_size)
+		touched = numpy.nonzero(new_counts)[0].tolist()
+		# terms which were out of the df range or did not exist before
+		entering = [term_id for term_id in touched if position[term_id] >= 0 and
+			not self._in_df_range(self.iindex.get_word_appear_by_id(term_id) - new_counts[term_id])]
+
+		pairs_only = self._build_args.get("sparse") or self.min_pair_count > 0
+		holders = self._get_holders()
+		repair = set(touched)
+		for term_id in touched:
+			repair.update(holders.get(term_id, ()))
+		for term_id in entering:
+			# an old term joining may beat the elements of rows it appeared with
+			if self.iindex.get_word_appear_by_id(term_id) > new_counts[term_id]:
+				others, counts = self._cooccurrence(term_id)
+				repair.update(others[(position[others] >= 0) &
+					(counts >= max(1, self.min_pair_count))].tolist())
+		old_rows = len(self.offsets) - 1
+		lengths = numpy.diff(numpy.asarray(self.offsets, dtype = numpy.int64))
+		if entering and not pairs_only:
+			# the score of new terms with a term they never appeared with
+			floor = self.pmi_from_counts(0.0, 1.0, 1.0, num_docs)
+			ends = numpy.asarray(self.offsets[1:], dtype = numpy.int64) - 1
+			last = self.scores[numpy.maximum(ends, 0)]
+			open_rows = (lengths > 0) & ((lengths < self.top) | (last <= floor))
+			repair.update(numpy.nonzero(open_rows)[0].tolist())
+
+		shift = self.score_shift(old_num_docs, num_docs)
+		if len(repair) > rebuild_ratio * len(term_ids) or (shift is None and
+			num_docs > self.built_num_docs * (1 + stale_ratio)):
+			self.build(**self._build_args)
+			return len(term_ids)
+
+		term_id_array = numpy.array(term_ids, dtype = numpy.int64)
+		appears = self._get_appears(term_ids)
+		rows = {}
+		for term_id in repair:
+			# the terms out of the df range now lose their row
+			if position[term_id] < 0:
+				rows[term_id] = []
+				continue
+			others, counts = self._cooccurrence(term_id)
+			others, counts = position[others], counts.astype(numpy.float64)
+			counts, others = counts[others >= 0], others[others >= 0]
+			if not pairs_only:
+				# the default mode scores the pairs never appeared together too
+				row = numpy.zeros(len(term_ids), dtype = numpy.float64)
+				row[others] = counts
+				others = numpy.delete(numpy.arange(len(term_ids)), position[term_id])
+				counts = row[others]
+			rows[term_id] = self._score_row(term_id_array, others, counts,
+				appears[position[term_id]], appears[others], num_docs)
+		self._splice(rows, shift or 0.0)
+		self.num_docs = num_docs
+		return len(rows)
+
+	def _index_docs(self, new_docs):
+		# the doc -> term ids index of update, from the postings the first
+		# time and then extended by the new documents
+		if self._doc_ptr is None:
+			term_ids = self.iindex.get_term_ids()
+			postings = [numpy.asarray(self.iindex.get_postings_by_id(term_id), dtype = numpy.int64)
+				for term_id in term_ids]
+			doc_ptr, doc_terms = doc_index(numpy.array(term_ids, dtype = numpy.int64),
+				postings, self.iindex.get_num_docs())
+			self._doc_ptr = array('l', doc_ptr.astype(numpy.int_).tostring())
+			self._doc_terms = array('I', doc_terms.astype(numpy.uint32).tostring())
+			return
+		for term_ids in new_docs:
+			self._doc_terms.extend(term_ids)
+			self._doc_ptr.append(len(self._doc_terms))
+
+	def _cooccurrence(self, term_id):
+		# the term ids appeared with term_id and their counts
+		docs = numpy.asarray(self.iindex.get_postings_by_id(term_id), dtype = numpy.int64)
+		others, counts = cooccurrence(numpy.frombuffer(self._doc_ptr, dtype = numpy.int_),
+			numpy.frombuffer(self._doc_terms, dtype = numpy.uint32), docs, term_id)
+		return others.astype(numpy.int64), counts
+
+	def _get_holders(self):
+		# term id -> ids of the rows holding it, kept up to date by _splice
+		if self._holders is None:
+			holders = {}
+			owner = numpy.repeat(numpy.arange(len(self.offsets) - 1),
+				numpy.diff(numpy.asarray(self.offsets, dtype = numpy.int64)))
+			for t2, term_id in zip(self.neighbors.tolist(), owner.tolist()):
+				holders.setdefault(t2, set()).add(term_id)
+			self._holders = holders
+		return self._holders
+
+	def score_shift(self, old_num_docs, num_docs):
+		'''How all the scores move when only the document count changed
+
+		Args:
+			old_num_docs : the document count the scores are computed with
+			num_docs : the new document count
+
+		Returns:
+			the value added to every score, None if there is no such value
+		'''
+		return math.log(float(num_docs) / old_num_docs, 2)
+
+	def get_term_ids(self):
+		'''Get the ids of the terms to compute
+
+		Returns:
+			ids of iindex's terms in the min_term_df and max_term_df range
 		'''
-		
-		terms = self.iindex.get_terms()
-		for term in terms:
-			self.term_pmi[term] = TopkHeap(self.top)
-		for i in range(len(terms)-1):
-			for j in range(i+1, len(terms)):
-				pmi = self.compute_pmi(terms[i], terms[j])
-				self.term_pmi[terms[i]].push(PMIElement(terms[j], pmi))
-				self.term_pmi[terms[j]].push(PMIElement(terms[i], pmi))
+		return [term_id for term_id in self.iindex.get_term_ids()
+			if self._in_df_range(self.iindex.get_word_appear_by_id(term_id))]
+
+	def _in_df_range(self, df):
+		return df > 0 and df >= self.min_term_df and \
+			(self.max_term_df is None or df <= self.max_term_df)
 
 	def compute_pmi(self, t1 , t2):
+		return self.pmi_from_counts(self.iindex.concurrence(t1, t2),
+			self.iindex.get_word_appear(t1), self.iindex.get_word_appear(t2),
+			self.iindex.get_num_docs())
+
+	def pmi_from_counts(self, concurrence, app1, app2, num_docs):
+		'''Compute pmi from the counts of a term pair
+
+		Args:
+			concurrence : document count of both terms appeared
+			app1 : document count of the first term
+			app2 : document count of the second term
+			num_docs : total document count
+
+		Returns:
+			pmi value
+		'''
 		# PMI(t1, t2) = log(p(t1,t2)/(p(t1)p(t2)))
 		#             = concurrent * N / (xapp * yapp)
-		if self.iindex.get_word_appear(t1) == 0 or self.iindex.get_word_appear(t2) == 0:
+		if app1 == 0 or app2 == 0:
 			return -float('inf')
-		to_log = self.iindex.concurrence(t1, t2) * self.iindex.get_num_docs() \
-			/(self.iindex.get_word_appear(t1) \
-			* self.iindex.get_word_appear(t2))
+		to_log = concurrence * num_docs / (app1 * app2)
 		if to_log == 0:
 			return -float('inf')
 		else:
 			return math.log(to_log,  2)
 
+	def pmi_from_count_arrays(self, concurrence, app1, app2, num_docs):
+		'''Compute pmi from the counts of many term pairs, see pmi_from_counts
+
+		Returns:
+			float64 array of pmi values
+		'''
+		return pmi_arrays(concurrence, app1, app2, num_docs)
+
+	def get_top_pmi_ids(self, term_id):
+		'''Get top pmi elements of given term id without building objects.
+
+		Args:
+			term_id : the given term's id in vocab
+
+		Returns:
+			(neighbors, scores) array views ordered by decreasing pmi
+		'''
+		if self.offsets is None or not 0 <= term_id < len(self.offsets) - 1:
+			raise KeyError(term_id)
+		start, stop = self.offsets[term_id], self.offsets[term_id + 1]
+		return self.neighbors[start:stop], self.scores[start:stop]
+
+	def save(self, path):
+		'''Save the built top pmi elements to a binary model file
+
+		Args:
+			path : the model file
+		'''
+		if self.offsets is None:
+			raise ValueError("build the PMI before saving it")
+		vocab = self.vocab
+		terms = "\n".join(vocab.get_term(term_id) for term_id in range(len(vocab)))
+		# a vocabulary grown after build has no elements for the new terms
+		offsets = numpy.empty(len(vocab) + 1, dtype = numpy.uint64)
+		offsets[:len(self.offsets)] = self.offsets
+		offsets[len(self.offsets):] = self.offsets[-1]
+		with open(path, "wb") as output_file:
+			output_file.write(MODEL_HEADER.pack(MODEL_MAGIC, MODEL_VERSION,
+				self.scores.dtype.itemsize, self.top, self.min_term_df, self.max_term_df or 0,
+				self.min_pair_count, self.num_docs, self.built_num_docs,
+				len(vocab), len(self.scores), len(terms)))
+			offsets.tofile(output_file)
+			self.scores.tofile(output_file)
+			numpy.asarray(self.neighbors, dtype = numpy.uint32).tofile(output_file)
+			output_file.write(terms)
+
+	@classmethod
+	def load(cls, path, mmap = True, inverted_index = None):
+		'''Load a model file saved by save
+
+		With mmap the arrays are views of the mapped file, so loading only
+		parses the vocabulary and get_top_pmi reads just the pages of the
+		term looked up.  Processes mapping the same file share the page cache.
+
+		Args:
+			path : the model file
+			mmap : map the file instead of reading it into memory
+			inverted_index : optional InvertedIndex for compute_pmi, it must
+				have the same vocabulary as the model
+
+		Returns:
+			the loaded, read-only instance
+		'''
+		with open(path, "rb") as fp:
+			if mmap:
+				buffer = _mmap.mmap(fp.fileno(), 0, access = _mmap.ACCESS_READ)
+			else:
+				buffer = fp.read()
+		magic, version, itemsize, top, min_term_df, max_term_df, min_pair_count, \
+			num_docs, built_num_docs, num_terms, num_elements, terms_size = \
+			MODEL_HEADER.unpack_from(buffer, 0)
+		if magic != MODEL_MAGIC or version != MODEL_VERSION:
+			raise ValueError("not a PMI model file: " + path)
+
+		model = cls(inverted_index, top, MODEL_SCORE_DTYPES[itemsize],
+			min_term_df, max_term_df or None, min_pair_count)
+		model.num_docs, model.built_num_docs = num_docs, built_num_docs
+		offset = MODEL_HEADER.size
+		model.offsets = numpy.frombuffer(buffer, dtype = numpy.uint64,
+			count = num_terms + 1, offset = offset)
+		offset += model.offsets.nbytes
+		model.scores = numpy.frombuffer(buffer, dtype = model.score_dtype,
+			count = num_elements, offset = offset)
+		offset += model.scores.nbytes
+		model.neighbors = numpy.frombuffer(buffer, dtype = numpy.uint32,
+			count = num_elements, offset = offset)
+		offset += model.neighbors.nbytes
+		terms = buffer[offset:offset + terms_size].split("\n") if num_terms else []
+		model._vocab = Vocabulary(terms).freeze()
+		model.buffer = buffer
+		return model
+
 	def get_top_pmi(self, term):
 		'''Get top pmi elements of given term.
 
@@ -121,7 +756,51 @@ class PMI(object):
 		Returns:
 			A list object of PMIElement
 		'''
-		return self.term_pmi[term].topk()
+		vocab = self.vocab
+		term_id = vocab.get_id(term)
+		if term_id is None:
+			raise KeyError(term)
+		neighbors, scores = self.get_top_pmi_ids(term_id)
+		return [PMIElement(vocab.get_term(t2), pmi)
+			for t2, pmi in zip(neighbors.tolist(), scores.tolist())]
+
+class PairCountCache(object):
+
+	'''Least recently used cache of the counts of term id pairs
+
+	The counts are only right for one document count, so the cache is
+	cleared when the index grows.
+
+	Attributes:
+		maxsize : most pairs kept
+		num_docs : the document count of the cached counts
+	'''
+
+	def __init__(self, maxsize = 1000000):
+		self.maxsize = maxsize
+		self.num_docs = None
+		self.data = OrderedDict()
+
+	def check(self, num_docs):
+		'''Clear the cache if the document count changed'''
+		if num_docs != self.num_docs:
+			self.data.clear()
+			self.num_docs = num_docs
+
+	def get(self, key):
+		value = self.data.pop(key, None)
+		if value is not None:
+			self.data[key] = value
+		return value
+
+	def put(self, key, value):
+		self.data[key] = value
+		if len(self.data) > self.maxsize:
+			self.data.popitem(last = False)
+
+	def __len__(self):
+		return len(self.data)
+
 
 class MI(object):
 
@@ -130,17 +809,20 @@ class MI(object):
     Attributes:
     	iindex : the inverted index of given documents
     	pmi : means the k of top k elements while hold for one term
+    	cache : PairCountCache of the concurrence of term id pairs
 	'''
 
-	def __init__(self, inverted_index, pmi):
+	def __init__(self, inverted_index, pmi, cache_size = 1000000):
 		'''Init all attributes
 
 		Args:
 			inverted_index : InvertedIndex instance
 			top : how many top element to save
+			cache_size : most term pair counts cached between the calls
 		'''
 		self.iindex = inverted_index
 		self.pmi = pmi
+		self.cache = PairCountCache(cache_size)
 
 	def compute_mi(self, sentence1, sentence2):
 		'''Compute mi of two sentence
@@ -149,10 +831,61 @@ class MI(object):
 			sentence1 : list of words
 			sentence2 : list of words
 		'''
-		res = 0.0
-		for t1 in sentence1:
-			for t2 in sentence2:
-				pmi = self.pmi.compute_pmi(t1, t2)
-				if pmi != -float('inf'):
-					res += self.iindex.concurrence(t1, t2) / self.iindex.get_num_docs() * pmi
-		return res
\ No newline at end of file
+		return self.compute_mi_batch([(sentence1, sentence2)])[0]
+
+	def compute_mi_batch(self, pairs):
+		'''Compute mi of many sentence pairs
+
+		Every distinct term pair of the batch is computed once, and the
+		counts are kept in the cache for the next calls.
+
+		Args:
+			pairs : list of (sentence1, sentence2), sentences are lists of words
+
+		Returns:
+			list of mi in pairs order
+		'''
+		return [mi for mi, _ in self._compute_batch(pairs)]
+
+	def _compute_batch(self, pairs):
+		# mi and the sum of p(x, y)log(p(x, y)) NMI divides it by, in one pass
+		vocab = self.iindex.vocab
+		num_docs = self.iindex.get_num_docs()
+		self.cache.check(num_docs)
+		parts = {}
+		results = []
+		for sentence1, sentence2 in pairs:
+			ids2 = [vocab.get_id(t2) for t2 in sentence2]
+			mi = denominator = 0.0
+			for t1 in sentence1:
+				id1 = vocab.get_id(t1)
+				for id2 in ids2:
+					part = parts.get((id1, id2))
+					if part is None:
+						part = parts[(id1, id2)] = self._compute_part(id1, id2, num_docs)
+					mi += part[0]
+					denominator += part[1]
+			results.append((mi, denominator))
+		return results
+
+	def _compute_part(self, id1, id2, num_docs):
+		concurrence = self._count(id1, id2)
+		pmi = self.pmi.pmi_from_counts(concurrence, self._count(id1, id1),
+			self._count(id2, id2), num_docs)
+		p = concurrence / num_docs
+		return (pmi != -float('inf') and p * pmi or 0.0,
+			p > 0 and p * math.log(p, 2) or 0.0)
+
+	def _count(self, id1, id2):
+		# a pair of the same id is the document count of the term
+		if id1 is None or id2 is None:
+			return 0.0
+		key = (id1, id2) if id1 <= id2 else (id2, id1)
+		count = self.cache.get(key)
+		if count is None:
+			if id1 == id2:
+				count = self.iindex.get_word_appear_by_id(id1)
+			else:
+				count = self.iindex.concurrence_by_id(id1, id2)
+			self.cache.put(key, count)
+		return count
@@ -12,7 +12,13 @@
 __author__ = "Niniane Wang"
 __email__ = "niniane at gmail dot com"
 
+from array import array
+from collections import Counter
+from functools import partial
+from vocabulary import Vocabulary
+import corpus_reader
 import math
+import numpy
 import re
 from operator import itemgetter
 
@@ -27,7 +33,7 @@ class TfIdf:
   '''
 
   def __init__(self, corpus_filename = None, stopword_filename = None,
-               DEFAULT_IDF = 1.5):
+               DEFAULT_IDF = 1.5, vocabulary = None):
     '''Initialize the idf dictionary.  
     
     If a corpus file is supplied, reads the idf dictionary from it, in the
@@ -45,11 +51,15 @@ class TfIdf:
       corpus_filename : old idf file, format: save by this class
       stopword_filename : stopword file, format: one stopword one line
       DEFAULT_IDF : default idf for the term that have not appeared
+      vocabulary : Vocabulary instance to share term ids with other structures
     '''
     self.num_docs = 0
-    self.term_num_docs = {}     # term : num_docs_containing_term
-    self.stopwords = []
+    self.vocab = vocabulary if vocabulary is not None else Vocabulary()
+    self.term_num_docs = array('I')   # term id : num_docs_containing_term
+    self.stopwords = set()
     self.idf_default = DEFAULT_IDF
+    self.frozen = False
+    self.invalidate_idf()
 
     if corpus_filename:
       corpus_file = open(corpus_filename, "r")
@@ -62,11 +72,14 @@ class TfIdf:
       for line in corpus_file:
         term, fstr = line.strip().split("\t")
         frequency = int(fstr)
-        self.term_num_docs[term] = frequency
+        term_id = self.vocab.add(term)
+        if term_id is not None:
+          self._grow_to(term_id)
+          self.term_num_docs[term_id] = frequency
 
     if stopword_filename:
       stopword_file = open(stopword_filename, "r")
-      self.stopwords = [line.strip() for line in stopword_file]
+      self.stopwords = set([line.strip() for line in stopword_file])
 
   def get_tokens(self, _str, token = None):
     '''Break a string into tokens, preserving URL tags as an entire token.
@@ -90,17 +103,75 @@ class TfIdf:
       token : token to split term
       filter_num : whether filter all numbers
     '''
+    self._add_tokens(self.get_tokens(_input, token = token), filter_num)
+
+  def add_documents(self, source, batch_size = 10000, token = None,
+                    filter_num = True, interval = 10.0):
+    '''Add every document of a corpus to the idf dictionary.
+
+    The corpus is streamed a batch at a time, so it does not need to fit in
+    memory, and the docs/sec rate is logged every interval seconds.
+
+    Args:
+      source : corpus file name with one document per line, .gz and .bz2
+        files are decompressed, or an iterable of documents
+      batch_size : documents to tokenize and add in one batch
+      token : token to split term
+      filter_num : whether filter all numbers
+      interval : seconds between two progress log lines
+
+    Returns:
+      number of documents added
+    '''
+    return corpus_reader.feed(partial(self._add_batch, token = token,
+      filter_num = filter_num), source, batch_size, self.__class__.__name__, interval)
+
+  def _add_batch(self, docs, token = None, filter_num = True):
+    for tokens in [self.get_tokens(doc, token = token) for doc in docs]:
+      self._add_tokens(tokens, filter_num)
+
+  def _add_tokens(self, tokens, filter_num):
+    self._check_not_frozen()
     self.num_docs += 1
+    self._log_num_docs = None
+    self._idf = None
     if filter_num:
       p = re.compile(r'\d*', re.L)
-    words = set(self.get_tokens(_input, token = token))
+    words = set(tokens)
     for word in words:
       if filter_num:
         word = p.sub("", word)
-      if word in self.term_num_docs:
-        self.term_num_docs[word] += 1
-      else:
-        self.term_num_docs[word] = 1
+      term_id = self.vocab.add(word)
+      if term_id is None:
+        continue
+      self._grow_to(term_id)
+      self.term_num_docs[term_id] += 1
+      self._changed_ids.add(term_id)
+
+  def _grow_to(self, term_id):
+    # a shared vocabulary may have ids added by others
+    if len(self.term_num_docs) <= term_id:
+      self.term_num_docs.extend([0] * (term_id + 1 - len(self.term_num_docs)))
+
+  def __iter__(self):
+    '''Return the term : num_docs_containing_term'''
+    for term_id, num_docs in enumerate(self.term_num_docs):
+      if num_docs:
+        yield self.vocab.get_term(term_id), num_docs
+
+  def get_term_num_docs(self, term):
+    '''Get the number of documents containing the term
+
+    Args:
+      term : term to check
+
+    Returns:
+      the document count, 0 for unknown terms
+    '''
+    term_id = self.vocab.get_id(term)
+    if term_id is None or term_id >= len(self.term_num_docs):
+      return 0
+    return self.term_num_docs[term_id]
 
   def save_corpus_to_file(self, idf_filename, stopword_filename, stopword_less_k = 10):
     '''Save the idf dictionary and stopword list to the specified file.
@@ -110,7 +181,7 @@ class TfIdf:
       stopword_filename : new stopword file to save stopword words
       stopword_less_k : if term appear doc number less than this, it will save to stopwords
     '''
-    sorted_terms = sorted(self.term_num_docs.items(), key=itemgetter(1), reverse=True)
+    sorted_terms = sorted(self, key=itemgetter(1), reverse=True)
     output_file = open(idf_filename, "w")
     stopword_file = open(stopword_filename, "w")
 
@@ -133,7 +204,7 @@ class TfIdf:
       filters : lambda functions to filter terms if it return true
       keepwords: just for these words that appear less than stopword_less_k
     '''
-    sorted_terms = sorted(self.term_num_docs.items(), key=itemgetter(1), reverse=True)
+    sorted_terms = sorted(self, key=itemgetter(1), reverse=True)
     output_file = open(idf_filename, "w")
     stopword_file = open(stopword_file, "w")
 
@@ -159,6 +230,23 @@ class TfIdf:
     output_file.close()
     stopword_file.close()
 
+  def merge(self, other):
+    '''Add the document counts of another idf dictionary to this one
+
+    Args:
+      other : TfIdf instance, it is not changed
+    '''
+    self._check_not_frozen()
+    self.invalidate_idf()
+    self.num_docs += other.num_docs
+    for term, num_docs in other:
+      term_id = self.vocab.add(term)
+      if term_id is None:
+        continue
+      self._grow_to(term_id)
+      self.term_num_docs[term_id] += num_docs
+    return self
+
   def get_num_docs(self):
     '''Get total doc number
 
@@ -173,13 +261,15 @@ class TfIdf:
     Returns:
       Return the total number of term in the IDF corpus.
     '''
-    return len(self.term_num_docs)
+    return sum(1 for num_docs in self.term_num_docs if num_docs)
 
   def get_idf(self, term):
     '''Retrieve the IDF for the specified term. 
     
     This is computed by taking the logarithm of ((number of documents in corpus) divided by (number of documents containing this term) ).
 
+    The logarithms are memoized, see get_idf_array.
+
     Args:
       term : term to get idf
 
@@ -189,12 +279,54 @@ class TfIdf:
     if term in self.stopwords:
       return 0
 
-    if not term in self.term_num_docs:
+    term_id = self.vocab.get_id(term)
+    if term_id is None or term_id >= len(self.term_num_docs) or \
+        not self.term_num_docs[term_id]:
       return self.idf_default
 
-    return math.log(float(1 + self.get_num_docs()) / 
-      (1 + self.term_num_docs[term]))
-  
+    if self._idf is not None:
+      return float(self._idf[term_id])
+    self._update_log_num_docs()
+    return float(self._log_num_docs - self._log_term_num_docs[term_id])
+
+  def _update_log_num_docs(self):
+    # idf = log(1 + N) - log(1 + df), a new document only changes log(1 + N)
+    # and the df of its own terms, so only those entries are recomputed
+    if self._log_num_docs is None:
+      self._log_num_docs = numpy.log(1.0 + self.get_num_docs())
+    cached = self._log_term_num_docs
+    if len(cached) < len(self.term_num_docs):
+      grown = numpy.log(1.0 + numpy.array(self.term_num_docs[len(cached):], dtype = numpy.float64))
+      cached = self._log_term_num_docs = numpy.concatenate([cached, grown])
+    if self._changed_ids:
+      ids = numpy.fromiter(self._changed_ids, dtype = numpy.int64)
+      cached[ids] = numpy.log(1.0 + numpy.array([self.term_num_docs[i] for i in ids], dtype = numpy.float64))
+      self._changed_ids = set()
+
+  def invalidate_idf(self):
+    '''Drop the memoized idf.
+
+    Adding documents keeps the memo up to date by itself, call this after
+    changing the stopwords or the document counts directly.
+    '''
+    self._log_num_docs = None
+    self._log_term_num_docs = numpy.zeros(0, dtype = numpy.float64)
+    self._changed_ids = set()
+    self._idf = None
+
+  def freeze(self):
+    '''Compute the idf table once for serving.
+
+    A frozen model reads every idf from the table and refuses new
+    documents, so nothing needs to be invalidated any more.
+    '''
+    self.get_idf_array()
+    self.frozen = True
+
+  def _check_not_frozen(self):
+    if self.frozen:
+      raise RuntimeError("can not add documents to a frozen TfIdf")
+
   def get_doc_keywords(self, curr_doc):
     """Retrieve terms and corresponding tf-idf for the specified document.
 
@@ -206,13 +338,138 @@ class TfIdf:
     """
     tfidf = {}
     tokens = self.get_tokens(curr_doc)
-    tokens_set = set(tokens)
-    for word in tokens_set:
+    for word, count in Counter(tokens).items():
       # The definition of TF specifies the denominator as the count of terms
       # within the document, but for short documents, I've found heuristically
       # that sometimes len(tokens_set) yields more intuitive results.
-      mytf = float(tokens.count(word)) / len(tokens)
+      mytf = float(count) / len(tokens)
       myidf = self.get_idf(word)
       tfidf[word] = mytf * myidf
 
     return sorted(tfidf.items(), key=itemgetter(1), reverse=True)
+
+  def get_idf_array(self):
+    '''Get the idf of every term id at once.
+
+    Terms that have not appeared get DEFAULT_IDF and stopwords get 0, the
+    same as get_idf.  The array is memoized until the next document is
+    added, do not change it.
+
+    Returns:
+      numpy float64 array, the idf of term id i is at i
+    '''
+    if self._idf is not None:
+      return self._idf
+    self._update_log_num_docs()
+    idf = self._log_num_docs - self._log_term_num_docs
+    idf[self._log_term_num_docs == 0] = self.idf_default
+    for term in self.stopwords:
+      term_id = self.vocab.get_id(term)
+      if term_id is not None and term_id < len(idf):
+        idf[term_id] = 0
+    self._idf = idf
+    return idf
+
+  def _batch_term_counts(self, docs, token):
+    # count the terms of all docs in one numpy.unique over (doc, term id)
+    # keys, words missing from the vocabulary get ids after it
+    idf = self.get_idf_array()
+    term_id = self.vocab.term_id
+    unknown = {}
+    ids, lens = [], []
+    for doc in docs:
+      tokens = self.get_tokens(doc, token = token)
+      lens.append(len(tokens))
+      for word in tokens:
+        i = term_id.get(word)
+        if i is None or i >= len(idf):
+          i = unknown.setdefault(word, len(idf) + len(unknown))
+        ids.append(i)
+    width = len(idf) + len(unknown)
+    lens = numpy.array(lens, dtype = numpy.int64)
+    doc_index = numpy.repeat(numpy.arange(len(lens)), lens)
+    keys, counts = numpy.unique(doc_index * width + numpy.array(ids, dtype = numpy.int64),
+      return_counts = True)
+    return idf, unknown, lens, keys // width, keys % width, counts
+
+  def get_batch_keywords(self, docs, top_k = None, token = None):
+    '''Retrieve terms and corresponding tf-idf for a batch of documents.
+
+    The terms of the whole batch are counted in one vectorized pass against
+    an idf array indexed by term id, which is much faster than calling
+    get_doc_keywords for every document.
+
+    Args:
+      docs : list of documents
+      top_k : return only the top k terms of every document, None for all
+      token : token to split term
+
+    Returns:
+      A list with one list of (term, tf-idf) per document, ordered by
+      decreasing tf-idf.
+    '''
+    docs = list(docs)
+    idf, unknown, lens, doc_index, term_ids, counts = \
+      self._batch_term_counts(docs, token)
+    unknown_idf = [0 if word in self.stopwords else self.idf_default
+      for word, _ in sorted(unknown.items(), key = itemgetter(1))]
+    # a shared vocabulary is longer than idf, ids from there are unknown words
+    num_known = len(idf)
+    idf = numpy.concatenate([idf, numpy.array(unknown_idf, dtype = numpy.float64)])
+    terms = self.vocab.terms
+    unknown_terms = dict((i, word) for word, i in unknown.items())
+
+    scores = counts / lens[doc_index].astype(numpy.float64) * idf[term_ids]
+    bounds = numpy.searchsorted(doc_index, numpy.arange(len(docs) + 1))
+    results = []
+    for d in range(len(docs)):
+      doc_scores = scores[bounds[d]:bounds[d + 1]]
+      doc_ids = term_ids[bounds[d]:bounds[d + 1]]
+      if top_k is not None and top_k < len(doc_scores):
+        best = numpy.argpartition(-doc_scores, top_k)[:top_k]
+      else:
+        best = numpy.arange(len(doc_scores))
+      best = best[numpy.argsort(-doc_scores[best], kind = "mergesort")]
+      results.append([(terms[i] if i < num_known else unknown_terms[i], float(doc_scores[b]))
+        for b, i in zip(best, doc_ids[best])])
+    return results
+
+  def get_batch_matrix(self, docs, token = None):
+    '''Compute the tf-idf matrix of a batch of documents.
+
+    The matrix has one column per term id of the vocabulary, so its width
+    is the vocabulary size, not get_num_words: with a shared vocabulary the
+    terms this TfIdf has never counted have a column too, scored with
+    DEFAULT_IDF.  Words that are not in the vocabulary are left out.
+
+    Args:
+      docs : list of documents
+      token : token to split term
+
+    Returns:
+      scipy.sparse.csr_matrix of shape (len(docs), len(vocab))
+    '''
+    # scipy is only needed for this method
+    from scipy import sparse
+
+    docs = list(docs)
+    idf, unknown, lens, doc_index, term_ids, counts = \
+      self._batch_term_counts(docs, token)
+    width = len(self.vocab)
+    # the words after the idf array are moved back to their vocabulary ids
+    columns = numpy.arange(len(idf) + len(unknown))
+    for word, i in unknown.iteritems():
+      columns[i] = self.vocab.get_id(word, -1)
+    term_ids = columns[term_ids]
+    known = term_ids >= 0
+    doc_index, term_ids, counts = doc_index[known], term_ids[known], counts[known]
+    full_idf = numpy.empty(width, dtype = numpy.float64)
+    full_idf[:len(idf)] = idf
+    full_idf[len(idf):] = self.idf_default
+    for term in self.stopwords:
+      term_id = self.vocab.get_id(term)
+      if term_id is not None and term_id < width:
+        full_idf[term_id] = 0
+    scores = counts / lens[doc_index].astype(numpy.float64) * full_idf[term_ids]
+    return sparse.csr_matrix((scores, (doc_index, term_ids)),
+      shape = (len(docs), width))
@@ -6,12 +6,37 @@
 # @author: Jason Wu (Jasonwbw@yahoo.com)
 
 import heapq
+import numpy
+import threading
+
+def top_candidates(scores, k):
+	'''Select the k largest scores and everything tied with the k-th
+
+	The ties are kept so the caller can break them by its own order, as
+	TopkHeap.push_many does by id.
+
+	Args:
+		scores : array of the scores
+		k : how many scores are wanted
+
+	Returns:
+		int64 array of the indices of the selected scores, in no order
+	'''
+	scores = numpy.asarray(scores)
+	if k <= 0:
+		return numpy.zeros(0, dtype = numpy.int64)
+	if len(scores) <= k:
+		return numpy.arange(len(scores))
+	kth = len(scores) - k
+	threshold = scores[numpy.argpartition(scores, kth)[kth]]
+	return numpy.nonzero(scores >= threshold)[0]
 
 class TopkHeap(object):
 
 	'''Heap save the top k element
 
-	Use the heapq in python.
+	Use the heapq in python.  A block of scored candidates is pushed at
+	once with push_many, which selects with numpy.argpartition instead.
 
 	Attributes:
 		k : top k
@@ -21,6 +46,7 @@ class TopkHeap(object):
 	def __init__(self, k = 50):
 	    self.k = k
 	    self.data = []
+	    self._topk = None
 	
 	def push(self, elem):
 		'''Push new elem to heap
@@ -33,13 +59,43 @@ class TopkHeap(object):
 		'''
 		if len(self.data) < self.k:
 			heapq.heappush(self.data, elem)
+			self._topk = None
 			return True
 		else:
 			topk_small = self.data[0]
 			if elem > topk_small:
 				heapq.heapreplace(self.data, elem) 
+				self._topk = None
 				return True
 			return False
+
+	def push_many(self, scores, ids):
+		'''Push a block of (score, id) elems to heap
+
+		The elems are the same as pushing the (score, id) tuples one by one,
+		ties of score are broken by id, and they are merged with the ones
+		already in the heap, which must be (score, id) tuples too.
+
+		Args:
+			scores : array of the scores
+			ids : array of the ids, anything numpy sorts
+		'''
+		scores = numpy.asarray(scores)
+		ids = numpy.asarray(ids)
+		if not len(scores) or self.k <= 0:
+			return
+		if self.data:
+			scores = numpy.concatenate([numpy.array([score for score, _ in self.data]), scores])
+			ids = numpy.concatenate([numpy.array([i for _, i in self.data]), ids])
+		if len(scores) > self.k:
+			# everything tied with the k-th score is kept for the id order
+			keep = top_candidates(scores, self.k)
+			if len(keep) > self.k:
+				keep = keep[numpy.lexsort((ids[keep], scores[keep]))[-self.k:]]
+			scores, ids = scores[keep], ids[keep]
+		self.data = zip(scores.tolist(), ids.tolist())
+		heapq.heapify(self.data)
+		self._topk = None
 	
 	def topk(self):
 		'''Get top k elements
@@ -47,4 +103,127 @@ class TopkHeap(object):
 		Returns:
 			a list of top k
 		'''
-		return sorted(self.data)[::-1]
\ No newline at end of file
+		# kept until the next change of the heap
+		if self._topk is None:
+			self._topk = sorted(self.data)[::-1]
+		return list(self._topk)
+
+	def current_min(self):
+		'''Get the smallest elem kept once the heap is full
+
+		A candidate not greater than it would not be added, so it can be
+		skipped before it is scored fully.
+
+		Returns:
+			the k-th elem, None if there are less than k elems
+		'''
+		if not self.data or len(self.data) < self.k:
+			return None
+		return self.data[0]
+
+	def merge(self, other):
+		'''Push every elem of another heap to this one
+
+		Args:
+			other : TopkHeap instance, it is not changed
+
+		Returns:
+			this heap
+		'''
+		for elem in other.data:
+			self.push(elem)
+		return self
+
+class ConcurrentTopkHeap(object):
+
+	'''Top k heap shared by several producer threads
+
+	Every thread pushes to its own TopkHeap without locking, and the heaps
+	are merged when the top k elements are read.  The largest k-th elem of
+	the full thread heaps is shared as current_min, so a thread can skip
+	the candidates another one has already beaten k times.
+
+	Attributes:
+		k : top k
+		heaps: the TopkHeap of every thread which pushed
+	'''
+
+	def __init__(self, k = 50):
+		self.k = k
+		self.heaps = []
+		self._local = threading.local()
+		self._lock = threading.Lock()
+		self._threshold = None
+
+	def _heap(self):
+		try:
+			return self._local.heap
+		except AttributeError:
+			heap = self._local.heap = TopkHeap(self.k)
+			with self._lock:
+				self.heaps.append(heap)
+			return heap
+
+	def _raise_threshold(self, heap):
+		# a lost race only leaves a lower threshold, which is still safe
+		local_min = heap.current_min()
+		if local_min is not None and (self._threshold is None or local_min > self._threshold):
+			self._threshold = local_min
+
+	def push(self, elem):
+		'''Push new elem to the heap of the current thread
+
+		Args:
+			elem : the elem to add
+
+		Returns:
+			if the elem have added to the heap of the thread
+		'''
+		threshold = self._threshold
+		if threshold is not None and elem <= threshold:
+			return False
+		heap = self._heap()
+		if heap.push(elem):
+			self._raise_threshold(heap)
+			return True
+		return False
+
+	def push_many(self, scores, ids):
+		'''Push a block of (score, id) elems to the heap of the current thread
+
+		Args:
+			scores : array of the scores
+			ids : array of the ids
+		'''
+		heap = self._heap()
+		heap.push_many(scores, ids)
+		self._raise_threshold(heap)
+
+	def current_min(self):
+		'''Get the elem a candidate must beat to be in the top k
+
+		Returns:
+			the largest k-th elem of the full thread heaps, None if none is full
+		'''
+		return self._threshold
+
+	def reduce(self):
+		'''Merge the heaps of every thread
+
+		Returns:
+			a TopkHeap instance of the top k elems pushed by all threads
+		'''
+		with self._lock:
+			heaps = list(self.heaps)
+		result = TopkHeap(self.k)
+		for heap in heaps:
+			result.merge(heap)
+		return result
+
+	def topk(self):
+		'''Get top k elements pushed by all threads
+
+		Returns:
+			a list of top k
+		'''
+		return self.reduce().topk()
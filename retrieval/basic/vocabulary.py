@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+#
+# This is a term <-> integer id vocabulary shared by the retrieval structures
+#
+# The structures keep their per-term data in lists or arrays indexed by term
+# id, so every term string is stored once, here, and only used at the API.
+#
+# @author: Jason Wu (Jasonwbw@yahoo.com)
+
+class Vocabulary(object):
+
+  '''Two-way mapping between terms and consecutive integer ids
+
+  Ids are given in the order terms are first added.  A frozen vocabulary
+  does not take new terms any more, which restricts a structure using it
+  to the terms already known.
+
+  Attributes:
+    term_id: dictory of "term : id"
+    terms: list of terms, terms[id] is the term of id
+    frozen: whether new terms are refused
+  '''
+
+  def __init__(self, terms = None):
+    '''Initialize the vocabulary.
+
+    Args:
+      terms: terms to add first, in id order
+    '''
+    self.term_id = {}
+    self.terms = []
+    self.frozen = False
+    if terms:
+      for term in terms:
+        self.add(term)
+
+  def add(self, term):
+    '''Get the id of a term, adding it if it is new and not frozen
+
+    Args:
+      term: the term to add
+
+    Returns:
+      the term id, None if the term is new and the vocabulary is frozen
+    '''
+    try:
+      return self.term_id[term]
+    except KeyError:
+      if self.frozen:
+        return None
+      self.term_id[term] = len(self.terms)
+      self.terms.append(term)
+      return self.term_id[term]
+
+  def get_id(self, term, default = None):
+    '''Get the id of a term
+
+    Args:
+      term: the term to look up
+      default: returned when the term is unknown
+
+    Returns:
+      the term id
+    '''
+    return self.term_id.get(term, default)
+
+  def get_term(self, term_id):
+    '''Get the term of an id
+
+    Args:
+      term_id: the id to look up
+
+    Returns:
+      the term
+    '''
+    return self.terms[term_id]
+
+  def freeze(self):
+    '''Refuse new terms from now on
+
+    Returns:
+      the vocabulary itself
+    '''
+    self.frozen = True
+    return self
+
+  def __contains__(self, term):
+    return term in self.term_id
+
+  def __len__(self):
+    return len(self.terms)
+
+  def __iter__(self):
+    return iter(self.terms)
+
+  def save(self, filename):
+    '''Save the vocabulary to a file, one term per line in id order
+
+    Args:
+      filename: the file to write
+    '''
+    with open(filename, "w") as output_file:
+      for term in self.terms:
+        output_file.write(term + "\n")
+
+  @classmethod
+  def load(cls, filename, freeze = True):
+    '''Load a vocabulary saved by save
+
+    Args:
+      filename: the file to read
+      freeze: freeze the loaded vocabulary
+
+    Returns:
+      Vocabulary instance
+    '''
+    with open(filename) as fp:
+      vocab = cls(line.rstrip("\n") for line in fp)
+    vocab.frozen = freeze
+    return vocab
@@ -0,0 +1,7 @@
+#! /usr/bin/env python
+# -*- coding: UTF-8 -*-
+#
+# Benchmarks for the basic tools, run them from the directory holding the
+# package, e.g. python -m nlp_basic.benchmark.bench_pmi_build
+#
+# @author: Jason Wu (Jasonwbw@yahoo.com)
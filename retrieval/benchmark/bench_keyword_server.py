@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+#
+# The load test of KeywordServer against sorting every keyword
+#
+# @author: Jason Wu (Jasonwbw@yahoo.com)
+
+from ..basic.keyword_server import KeywordServer
+from ..basic.tfidf import TfIdf
+import bisect
+import optparse
+import random
+import time
+
+def synthetic_docs(num_docs, num_terms, doc_len, seed = 0):
+  '''Random documents with zipf-like term frequencies'''
+  rand = random.Random(seed)
+  cumulative = []
+  acc = 0.0
+  total = sum(1.0 / (rank + 1) for rank in range(num_terms))
+  for rank in range(num_terms):
+    acc += 1.0 / (rank + 1) / total
+    cumulative.append(acc)
+  return [" ".join("t%d" % min(bisect.bisect_left(cumulative, rand.random()), num_terms - 1)
+    for _ in range(doc_len)) for _ in range(num_docs)]
+
+def report(name, latencies, cost):
+  latencies = sorted(latencies)
+  print "%-10s requests: %d  qps: %9.1f  p50: %7.3fms  p99: %7.3fms" % (name,
+    len(latencies), len(latencies) / cost, latencies[len(latencies) / 2] * 1000,
+    latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))] * 1000)
+
+def main():
+  parser = optparse.OptionParser()
+  parser.add_option("--corpus-docs", type = "int", default = 20000)
+  parser.add_option("--requests", type = "int", default = 20000)
+  parser.add_option("--terms", type = "int", default = 50000)
+  parser.add_option("--doc-len", type = "int", default = 200)
+  parser.add_option("--top-k", type = "int", default = 10)
+  parser.add_option("--threads", type = "int", default = 8)
+  options, _ = parser.parse_args()
+
+  tfidf = TfIdf()
+  tfidf.add_documents(synthetic_docs(options.corpus_docs, options.terms, options.doc_len))
+  requests = synthetic_docs(options.requests, options.terms, options.doc_len, seed = 1)
+
+  latencies = []
+  begin = time.time()
+  for doc in requests:
+    start = time.time()
+    tfidf.get_doc_keywords(doc)[:options.top_k]
+    latencies.append(time.time() - start)
+  report("full sort", latencies, time.time() - begin)
+
+  server = KeywordServer(tfidf = tfidf, top_k = options.top_k,
+    threads = options.threads, latency_window = options.requests)
+  begin = time.time()
+  server.get_keywords_many(requests)
+  cost = time.time() - begin
+  report("server", list(server.latencies), cost)
+  server.close()
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+#
+# The benchmark of the top PMI recall of MinHashIndex against InvertedIndex
+#
+# @author: Jason Wu (Jasonwbw@yahoo.com)
+
+from ..basic.inverted_index import InvertedIndex
+from ..basic.minhash_index import MinHashIndex
+from ..basic.pmi import PMI
+import bisect
+import optparse
+import random
+import time
+
+def synthetic_docs(num_docs, num_terms, doc_len, num_topics, seed = 0):
+  '''Random documents of topics, so the top PMI elements mean something
+
+  Term t belongs to topic t % num_topics.  A document picks a topic and
+  each word is one of the topic's terms with probability 0.5, or any term
+  else, both with zipf-like frequencies.
+  '''
+  rand = random.Random(seed)
+  def zipf_cumulative(n):
+    total = sum(1.0 / (rank + 1) for rank in range(n))
+    cumulative, acc = [], 0.0
+    for rank in range(n):
+      acc += 1.0 / (rank + 1) / total
+      cumulative.append(acc)
+    return cumulative
+  def draw(cumulative):
+    return min(bisect.bisect_left(cumulative, rand.random()), len(cumulative) - 1)
+  every = zipf_cumulative(num_terms)
+  topic = zipf_cumulative(num_terms / num_topics)
+  docs = []
+  for _ in range(num_docs):
+    t = rand.randrange(num_topics)
+    docs.append(" ".join("t%d" % (draw(topic) * num_topics + t if rand.random() < 0.5 else draw(every))
+      for _ in range(doc_len)))
+  return docs
+
+def top_lists(iindex, top, min_term_df):
+  pmi = PMI(iindex, top = top, min_term_df = min_term_df)
+  begin = time.time()
+  pmi.build()
+  cost = time.time() - begin
+  # pairs never appeared together are padding, not results
+  return cost, dict((term, set(e.t2 for e in pmi.get_top_pmi(term) if e.pmi != -float('inf')))
+    for term in iindex.get_terms())
+
+def main():
+  parser = optparse.OptionParser()
+  parser.add_option("--docs", type = "int", default = 50000)
+  parser.add_option("--terms", type = "int", default = 300)
+  parser.add_option("--doc-len", type = "int", default = 10)
+  parser.add_option("--topics", type = "int", default = 20)
+  parser.add_option("--top", type = "int", default = 10)
+  parser.add_option("--min-term-df", type = "int", default = 50)
+  parser.add_option("--errors", default = "0.2,0.1,0.05")
+  options, _ = parser.parse_args()
+
+  docs = synthetic_docs(options.docs, options.terms, options.doc_len, options.topics)
+  iindex = InvertedIndex()
+  iindex.add_documents(docs)
+  cost, exact = top_lists(iindex, options.top, options.min_term_df)
+  print "exact      k: %5s  build: %7.2fs" % ("-", cost)
+
+  for error in map(float, options.errors.split(",")):
+    sketch = MinHashIndex(error = error)
+    sketch.add_documents(docs)
+    cost, approx = top_lists(sketch, options.top, options.min_term_df)
+    hits = total = 0
+    for term, expected in exact.iteritems():
+      hits += len(expected & approx.get(term, set()))
+      total += len(expected)
+    print "error %.2f  k: %5d  build: %7.2fs  recall@%d: %.3f" % (error, sketch.k,
+      cost, options.top, hits / float(max(total, 1)))
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+#
+# The benchmark of PMI.build by worker count
+#
+# @author: Jason Wu (Jasonwbw@yahoo.com)
+
+from ..basic.pmi import PMI
+from ..basic.inverted_index import InvertedIndex
+import multiprocessing
+import optparse
+import random
+import time
+
+def synthetic_index(num_docs, num_terms, doc_len, seed = 0):
+  '''Build an index over random documents with zipf-like term frequencies'''
+  rand = random.Random(seed)
+  weights = [1.0 / (rank + 1) for rank in range(num_terms)]
+  total = sum(weights)
+  cumulative = []
+  acc = 0.0
+  for weight in weights:
+    acc += weight / total
+    cumulative.append(acc)
+
+  import bisect
+  iindex = InvertedIndex()
+  for _ in range(num_docs):
+    words = ["t%d" % min(bisect.bisect_left(cumulative, rand.random()), num_terms - 1)
+      for _ in range(doc_len)]
+    iindex.add_input_document(" ".join(words))
+  return iindex
+
+def main():
+  parser = optparse.OptionParser()
+  parser.add_option("--docs", type = "int", default = 20000)
+  parser.add_option("--terms", type = "int", default = 1500)
+  parser.add_option("--doc-len", type = "int", default = 20)
+  parser.add_option("--max-workers", type = "int", default = multiprocessing.cpu_count())
+  options, _ = parser.parse_args()
+
+  iindex = synthetic_index(options.docs, options.terms, options.doc_len)
+  print "docs: %d terms: %d" % (iindex.get_num_docs(), len(iindex.get_terms()))
+
+  workers = 1
+  base = None
+  expected = None
+  while workers <= options.max_workers:
+    pmi = PMI(iindex, top = 50)
+    begin = time.time()
+    pmi.build(workers = workers)
+    cost = time.time() - begin
+    result = dict((term, [e.get_pair() for e in pmi.get_top_pmi(term)]) for term in iindex.get_terms())
+    if expected is None:
+      base, expected = cost, result
+    print "workers: %2d  time: %8.2fs  speedup: %5.2fx  identical: %s" % \
+      (workers, cost, base / cost, result == expected)
+    workers *= 2
+
+if __name__ == "__main__":
+  main()
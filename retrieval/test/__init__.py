@@ -9,5 +9,13 @@ import test_pmi_element
 import test_pmi_topkheap
 import test_class_tfidf
 import test_appearcounter
+import test_cooccurrence
+import test_corpus_reader
+import test_parallel_build
+import test_vocabulary
+import test_tfidf
+import test_keyword_server
+import test_minhash_index
+import test_emi_keywords
 
-__all__ = ['test_inverted_index', 'test_pmi', 'test_pmi_element', 'test_pmi_topkheap', 'test_class_tfidf', 'test_appearcounter']
\ No newline at end of file
+__all__ = ['test_inverted_index', 'test_pmi', 'test_pmi_element', 'test_pmi_topkheap', 'test_class_tfidf', 'test_appearcounter', 'test_cooccurrence', 'test_corpus_reader', 'test_parallel_build', 'test_vocabulary', 'test_tfidf', 'test_keyword_server', 'test_minhash_index', 'test_emi_keywords']
\ No newline at end of file
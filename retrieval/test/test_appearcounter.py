@@ -6,7 +6,11 @@
 # @author: Jason Wu (Jasonwbw@yahoo.com)
 
 from ..basic.appearcounter import AppearCount
+import gzip
+import os
+import shutil
 import sys
+import tempfile
 import unittest
 
 class AppearCountTestCase(unittest.TestCase):
@@ -65,7 +69,56 @@ class AppearCountTestCase(unittest.TestCase):
 		self.assertEqual(set(['b', 'c']), set(self.ac.get_words_less_appear(2))) #b,c
 		self.assertEqual(set(['b', 'c']), set(self.ac.get_words_less_appear(3))) #b,c
 		self.assertEqual(set(['b', 'c', 'd', 'e', 'f']), set(self.ac.get_words_less_appear(5))) #b,c,d,e,f
+
+	def testLoadResult(self):
+		path = os.path.join(tempfile.mkdtemp(), "count.result")
+		try:
+			self.ac.get_count_result(path)
+			loaded = AppearCount()
+			loaded.load_result_foranalyze(path)
+			for less_than in range(7):
+				self.assertEqual(self.ac.count_less_appear(less_than), loaded.count_less_appear(less_than))
+				self.assertEqual(self.ac.doccount_less_appear(less_than), loaded.doccount_less_appear(less_than))
+				self.assertEqual(set(self.ac.get_words_less_appear(less_than)),
+					set(loaded.get_words_less_appear(less_than)))
+			self.assertEqual({0: 1, 1: 1, 3: 1, 4: 2, 5: 1}, loaded.count_word)
+			self.assertEqual(4, loaded.get_term_appear_docs('a'))
+		finally:
+			shutil.rmtree(os.path.dirname(path))
+
+	def testCountFiles(self):
+		filename = "./nlp_basic/test/test.appearcount.file"
+		path = os.path.join(tempfile.mkdtemp(), "count.gz")
+		try:
+			with gzip.open(path, "wb") as fp:
+				fp.write(open(filename).read())
+			for workers in (1, 2):
+				sources = [filename, [filename, path], iter(open(filename).readlines() * 2), [path], iter([])]
+				for source, times in zip(sources, [1, 2, 2, 1, 0]):
+					ac = AppearCount()
+					ac.vocab, ac.term_num_docs = self.ac.vocab, self.ac.term_num_docs
+					self.assertEqual(4 * times, ac.count_files(source, workers = workers, chunk_size = 3))
+					self.assertEqual(dict((word, count * times) for word, count in self.ac.word_count.items() if times),
+						ac.word_count)
+					self.assertEqual(dict((word, count * times) for word, count in self.ac.word_doc_count.items() if times),
+						ac.word_doc_count)
+		finally:
+			shutil.rmtree(os.path.dirname(path))
 	
+	def testSharedVocabulary(self):
+		ac = AppearCount()
+		ac.vocab = self.ac.vocab
+		ac.add_input_document("a b")
+		self.ac.vocab.add("z")
+		ac.count_file("a c z")
+		self.assertEqual({'a': 1}, ac.word_count)
+		self.assertEqual(1, ac.count_files(iter(["a c z"]), workers = 1))
+		self.assertEqual({'a': 2}, ac.word_count)
+		# z is already in the vocabulary, its first document still counts
+		self.assertEqual(1, ac.count_less_appear(1)) #b
+		ac.add_input_document("z")
+		self.assertEqual(2, ac.count_less_appear(1)) #b,z
+
 	def testPrintSomething(self):
 		pass
 
@@ -6,7 +6,12 @@
 # @author: Jason Wu (Jasonwbw@yahoo.com)
 
 from ..basic.class_tfidf import ClassTfIdf
+from ..basic.vocabulary import Vocabulary
+import math
+import os
+import shutil
 import sys
+import tempfile
 import unittest
 
 class ClassTfIdfTestCase(unittest.TestCase):
@@ -16,13 +21,17 @@ class ClassTfIdfTestCase(unittest.TestCase):
 			_class, text = line.split("\t", 1)
 			self.cdf.add_input_document(int(_class), text)
 		self.cdf.compute_all_cdf()
-		self.cdf.save_corpus_to_file("./nlp_basic/test/inverted.cdf")
-		self.cdf.save_cdf_to_file("./nlp_basic/test/cdf.cdf")
-		self.cdf = ClassTfIdf(3, corpus_filename = "./nlp_basic/test/inverted.cdf",\
-			cdf_filename = "./nlp_basic/test/cdf.cdf")
+		self.tmpdir = tempfile.mkdtemp()
+		corpus_filename = os.path.join(self.tmpdir, "inverted.cdf")
+		cdf_filename = os.path.join(self.tmpdir, "cdf.cdf")
+		self.cdf.save_corpus_to_file(corpus_filename)
+		self.cdf.save_cdf_to_file(cdf_filename)
+		self.cdf = ClassTfIdf(3, corpus_filename = corpus_filename,\
+			cdf_filename = cdf_filename)
 
 	def tearDown(self):
 		self.cdf = None
+		shutil.rmtree(self.tmpdir)
 
 	def testGetNumDocs(self):
 		self.assertEqual(3, self.cdf.get_num_docs(0))
@@ -34,6 +43,64 @@ class ClassTfIdfTestCase(unittest.TestCase):
 		self.assertEqual(['b'], self.cdf.get_class_keywords(1, 1))
 		self.assertEqual(['c'], self.cdf.get_class_keywords(2, 1))
 
+	def testComputeAllCdf(self):
+		# a: 3, 1 and 0 documents of the classes having 3 documents each
+		p = [3 / 3.0, 1 / 3.0, 0.0]
+		expected = [n * math.log(1 + (1 + p[i]) / (1 + sum(p) - p[i])) for i, n in enumerate([3, 1, 0])]
+		self.cdf.compute_all_cdf()
+		cdfs = dict(self.cdf._iter_terms(self.cdf.term_cdf, self.cdf.computed))
+		for cdf, value in zip(expected, cdfs['a']):
+			self.assertAlmostEqual(cdf, value)
+		top = sorted((value[0], term) for term, value in cdfs.items())[::-1]
+		self.assertEqual([term for _, term in top[:2]], self.cdf.get_class_keywords(0, 2))
+		self.assertEqual([], self.cdf.get_class_keywords(0, 0))
+		self.assertEqual(len(cdfs), len(self.cdf.get_class_keywords(0, 100)))
+
+	def testBinary(self):
+		path = os.path.join(tempfile.mkdtemp(), "cdf.bin")
+		try:
+			self.cdf.save_to_binary(path)
+			cdfs = dict(self.cdf._iter_terms(self.cdf.term_cdf, self.cdf.computed))
+			for mmap in (True, False):
+				loaded = ClassTfIdf(3)
+				loaded.load_from_binary(path, mmap = mmap)
+				self.assertEqual(self.cdf.num_docs, loaded.num_docs)
+				self.assertEqual(dict(self.cdf), dict(loaded))
+				self.assertEqual(cdfs, dict(loaded._iter_terms(loaded.term_cdf, loaded.computed)))
+				self.assertEqual(self.cdf.get_class_keywords(1, 3), loaded.get_class_keywords(1, 3))
+				# the mapped tables are copy-on-write
+				loaded.add_input_document(0, "a z")
+				loaded.compute_all_cdf()
+				loaded = None
+			shared = ClassTfIdf(3, vocabulary = Vocabulary(['z', 'a']))
+			shared.load_from_binary(path)
+			self.assertEqual(dict(self.cdf), dict(shared))
+			self.assertEqual(0, shared.vocab.get_id('z'))
+			self.assertRaises(ValueError, ClassTfIdf(2).load_from_binary, path)
+		finally:
+			shutil.rmtree(os.path.dirname(path))
+
+	def testGrowth(self):
+		cdf = ClassTfIdf(2)
+		for i in range(10):
+			cdf.add_input_document(i % 2, "t%d" % i)
+		self.assertEqual(13, len(cdf.appeared))
+		self.assertEqual(0, len(cdf.term_cdf))
+		cdf.compute_all_cdf()
+		self.assertEqual((10, 2), cdf.term_cdf.shape)
+		self.assertEqual(10, len(cdf.appeared))
+		cdf.add_input_document(0, "t0 t10")
+		self.assertEqual(10, len(cdf.term_cdf))
+		# ties by term, t10 has no cdf yet
+		self.assertEqual(['t8'], cdf.get_class_keywords(0, 1))
+		path = os.path.join(self.tmpdir, "growth.bin")
+		cdf.save_to_binary(path)
+		loaded = ClassTfIdf(2)
+		loaded.load_from_binary(path, mmap = False)
+		self.assertEqual(dict(cdf), dict(loaded))
+		self.assertEqual(dict(cdf._iter_terms(cdf.term_cdf, cdf.computed)),
+			dict(loaded._iter_terms(loaded.term_cdf, loaded.computed)))
+
 	def testPrintSomething(self):
 		pass
 
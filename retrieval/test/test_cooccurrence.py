@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+#
+# The unit test case for cooccurrence and the sparse PMI build
+#
+# @author: Jason Wu (Jasonwbw@yahoo.com)
+
+from ..basic.cooccurrence import build_doc_term_matrix
+from ..basic.cooccurrence import iter_cooccurrence_blocks
+from ..basic.pmi import PMI
+from ..basic.npmi import NPMI
+from ..basic.inverted_index import InvertedIndex
+import sys
+import unittest
+
+class CooccurrenceTestCase(unittest.TestCase):
+    def setUp(self):
+      self.iindex = InvertedIndex()
+      for line in file("./nlp_basic/test/test.file"):
+        self.iindex.add_input_document(line.strip())
+      self.terms = sorted(self.iindex.get_terms())
+      self.term_ids = [self.iindex.vocab.get_id(term) for term in self.terms]
+
+    def tearDown(self):
+      self.iindex = None
+
+    def testDocTermMatrix(self):
+      matrix = build_doc_term_matrix(self.iindex, self.term_ids)
+      self.assertEqual((5, 6), matrix.shape)
+      # column of 'c'
+      self.assertEqual([1, 1, 0, 0, 0], list(matrix[:, 2].toarray().ravel()))
+
+    def testCooccurrenceBlocks(self):
+      starts = []
+      for start, block in iter_cooccurrence_blocks(self.iindex, self.term_ids, block_size = 4):
+        starts.append(start)
+        for r in range(block.shape[0]):
+          for j in range(len(self.terms)):
+            t1, t2 = self.terms[start + r], self.terms[j]
+            if t1 == t2:
+              expected = self.iindex.get_word_appear(t1)
+            else:
+              expected = self.iindex.concurrence(t1, t2)
+            self.assertEqual(expected, block[r, j])
+      self.assertEqual([0, 4], starts)
+
+    def testSparseBuild(self):
+      # every term here co-occurs with all others, so both modes agree
+      for cls in (PMI, NPMI):
+        serial = cls(self.iindex, top = 3)
+        serial.build()
+        blocked = cls(self.iindex, top = 3)
+        blocked.build(sparse = True, block_size = 4)
+        for term in self.terms:
+          self.assertEqual([e.get_pair() for e in serial.get_top_pmi(term)],
+            [e.get_pair() for e in blocked.get_top_pmi(term)])
+
+    def testSparseBuildSkipNeverAppeared(self):
+      self.iindex.add_input_document("x y")
+      pmi = PMI(self.iindex, top = 10)
+      pmi.build(sparse = True)
+      self.assertEqual(['y'], [e.t2 for e in pmi.get_top_pmi('x')])
+
+    def testPrintSomething(self):
+      pass
+
+if __name__ == "__main__":
+    unittest.main()
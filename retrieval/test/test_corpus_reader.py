@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+#
+# The unit test case for corpus_reader and the add_documents methods
+#
+# @author: Jason Wu (Jasonwbw@yahoo.com)
+
+from ..basic.corpus_reader import iter_documents
+from ..basic.corpus_reader import iter_batches
+from ..basic.corpus_reader import split_labelled
+from ..basic.inverted_index import InvertedIndex
+from ..basic.tfidf import TfIdf
+from ..basic.class_tfidf import ClassTfIdf
+from ..basic.emi_keywords import ClassInvertedIndex
+import bz2
+import gzip
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+class CorpusReaderTestCase(unittest.TestCase):
+    def setUp(self):
+      self.lines = [line.strip() for line in file("./nlp_basic/test/test.file")]
+      self.labelled = [line.strip() for line in file("./nlp_basic/test/cdf_test.file")]
+      self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+      shutil.rmtree(self.tmpdir)
+
+    def write(self, name, opener, lines):
+      filename = os.path.join(self.tmpdir, name)
+      fp = opener(filename, "wb")
+      fp.write("\n".join(lines) + "\n")
+      fp.close()
+      return filename
+
+    def testIterDocuments(self):
+      for name, opener in (("c.txt", open), ("c.gz", gzip.open), ("c.bz2", bz2.BZ2File)):
+        filename = self.write(name, opener, self.lines)
+        self.assertEqual(self.lines, list(iter_documents(filename)))
+      self.assertEqual(self.lines, list(iter_documents(iter(self.lines))))
+
+    def testIterBatches(self):
+      self.assertEqual([[1, 2], [3, 4], [5]], list(iter_batches(range(1, 6), 2)))
+
+    def testInvertedIndexAddDocuments(self):
+      expected = InvertedIndex()
+      for line in self.lines:
+        expected.add_input_document(line)
+      iindex = InvertedIndex()
+      self.assertEqual(5, iindex.add_documents(self.write("c.gz", gzip.open, self.lines), batch_size = 2))
+      self.assertEqual(expected.get_num_docs(), iindex.get_num_docs())
+      self.assertEqual(dict((k, list(v)) for k, v in expected),
+        dict((k, list(v)) for k, v in iindex))
+
+    def testTfIdfAddDocuments(self):
+      expected = TfIdf()
+      for line in self.lines:
+        expected.add_input_document(line)
+      tfidf = TfIdf()
+      tfidf.add_documents(self.lines, batch_size = 3)
+      self.assertEqual(expected.get_num_docs(), tfidf.get_num_docs())
+      self.assertEqual(dict(expected), dict(tfidf))
+
+    def testClassTfIdfAddDocuments(self):
+      expected = ClassTfIdf(3)
+      for line in self.labelled:
+        _class, text = line.split("\t", 1)
+        expected.add_input_document(int(_class), text)
+      cdf = ClassTfIdf(3)
+      cdf.add_documents(self.write("c.bz2", bz2.BZ2File, self.labelled), batch_size = 4)
+      self.assertEqual(expected.num_docs, cdf.num_docs)
+      self.assertEqual(dict(expected), dict(cdf))
+
+    def testClassInvertedIndexAddDocuments(self):
+      expected = ClassInvertedIndex()
+      for line in self.labelled:
+        _class, text = line.split("\t", 1)
+        expected.add_input_document(text, _class)
+      ciindex = ClassInvertedIndex()
+      ciindex.add_documents([line.split("\t", 1) for line in self.labelled])
+      self.assertEqual(expected.get_num_docs(), ciindex.get_num_docs())
+      self.assertEqual(dict(expected), dict(ciindex))
+      self.assertEqual(expected.class_count, ciindex.class_count)
+
+    def testBlankLabelledLines(self):
+      self.assertEqual(("1", "a b"), split_labelled("1\ta b"))
+      self.assertRaises(ValueError, split_labelled, "no label")
+      cdf = ClassTfIdf(3)
+      self.assertEqual(len(self.labelled), cdf.add_documents(self.labelled + ["", "  "]))
+      self.assertEqual(len(self.labelled), sum(cdf.num_docs))
+      ciindex = ClassInvertedIndex()
+      self.assertRaises(ValueError, ciindex.add_documents, ["0\ta", "no label"])
+
+    def testPrintSomething(self):
+      pass
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+#
+# The unit test case for emi_keywords.EstimateMi
+#
+# @author: Jason Wu (Jasonwbw@yahoo.com)
+
+from ..basic import emi_keywords
+from ..basic.emi_keywords import ClassInvertedIndex
+from ..basic.emi_keywords import EstimateMi
+import os
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+
+class EstimateMiTestCase(unittest.TestCase):
+    def setUp(self):
+      self.ciindex = ClassInvertedIndex()
+      self.ciindex.add_documents("./nlp_basic/test/cdf_test.file")
+      self.emi = EstimateMi(self.ciindex)
+
+    def tearDown(self):
+      self.ciindex = None
+      self.emi = None
+
+    def testFindTopWord(self):
+      rand = random.Random(0)
+      self.ciindex.add_documents([(rand.choice("xyz"), " ".join(rand.sample("abcdefghij", 4)))
+        for _ in range(50)])
+      self.addCleanup(setattr, emi_keywords, "TOP_WORD_BLOCK", emi_keywords.TOP_WORD_BLOCK)
+      for block in (1, 3, 1024):
+        # small blocks stop the walk before the last terms
+        emi_keywords.TOP_WORD_BLOCK = block
+        for _class in self.ciindex.get_classes():
+          every = self.emi.find_top_word(_class)
+          for topk in (1, 3, 100):
+            self.assertEqual(every[:topk], self.emi.find_top_word(_class, topk))
+          self.assertEqual(every, self.emi.find_top_word(_class, 0))
+      self.assertEqual([0.0] * 3, [score for score, _ in self.emi.find_top_word('not a class', 3)])
+
+    def testAllClasses(self):
+      self.assertEqual(['0', '1', '2'], sorted(self.ciindex.get_classes()))
+      every = self.emi.find_top_words_all_classes()
+      top = self.emi.find_top_words_all_classes(2)
+      for _class in self.ciindex.get_classes():
+        expected = sorted([(self.emi.estimate_mi(_class, term), term)
+          for term in self.ciindex.get_terms()])[::-1]
+        self.assertEqual(expected, every[_class])
+        self.assertEqual(expected[:2], top[_class])
+        self.assertEqual(expected[:2], self.emi.find_top_word(_class, 2))
+
+    def testSaveLoad(self):
+      path = os.path.join(tempfile.mkdtemp(), "ciindex.bin")
+      try:
+        self.ciindex.save(path)
+        expected = self.emi.find_top_words_all_classes(3)
+        for mmap in (True, False):
+          loaded = ClassInvertedIndex.load(path, mmap = mmap)
+          self.assertEqual(self.ciindex.get_num_docs(), loaded.get_num_docs())
+          self.assertEqual(dict(self.ciindex), dict(loaded))
+          self.assertEqual(self.ciindex.class_count, loaded.class_count)
+          self.assertEqual(expected, EstimateMi(loaded).find_top_words_all_classes(3))
+          self.assertEqual(expected['1'], EstimateMi(loaded).find_top_word('1', 3))
+          loaded = None
+        ClassInvertedIndex().save(path)
+        self.assertEqual([], ClassInvertedIndex.load(path).get_terms())
+        classes = [1, "1", u"\u4e2d", "two\nlines", 2 ** 40]
+        ciindex = ClassInvertedIndex()
+        ciindex.add_documents([(_class, "a b") for _class in classes])
+        ciindex.save(path)
+        loaded = ClassInvertedIndex.load(path)
+        self.assertEqual(classes, loaded.get_classes())
+        self.assertEqual([type(_class) for _class in classes], map(type, loaded.get_classes()))
+        self.assertEqual(1, loaded.get_word_appear('a', 1))
+        self.assertEqual(ciindex.class_count, loaded.class_count)
+        loaded = None
+        ciindex.add_input_document("b", 1.5)
+        self.assertRaises(TypeError, ciindex.save, path)
+        with open(path, "wb") as fp:
+          fp.write("not an index" * 10)
+        self.assertRaises(ValueError, ClassInvertedIndex.load, path)
+      finally:
+        shutil.rmtree(os.path.dirname(path))
+
+    def testPrintSomething(self):
+      pass
+
+if __name__ == "__main__":
+    unittest.main()
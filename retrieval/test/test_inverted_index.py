@@ -6,7 +6,13 @@
 # @author: Jason Wu (Jasonwbw@yahoo.com)
 
 from ..basic.inverted_index import InvertedIndex
+from ..basic.inverted_index import intersect_count
+from ..basic.inverted_index import convert_corpus_file
+from array import array
+import os
+import shutil
 import sys
+import tempfile
 import unittest
 
 class InvertedIndexTestCase(unittest.TestCase):  
@@ -14,11 +20,14 @@ class InvertedIndexTestCase(unittest.TestCase):
       self.iindex = InvertedIndex()
       for line in file("./nlp_basic/test/test.file"):
         self.iindex.add_input_document(line.strip())
-      self.iindex.save_corpus_to_file("./nlp_basic/test/inverted.index")
-      self.iindex.load_corpus_from_file("./nlp_basic/test/inverted.index")
+      self.tmpdir = tempfile.mkdtemp()
+      self.corpus_filename = os.path.join(self.tmpdir, "inverted.index")
+      self.iindex.save_corpus_to_file(self.corpus_filename)
+      self.iindex.load_corpus_from_file(self.corpus_filename)
           
     def tearDown(self):  
       self.iindex = None  
+      shutil.rmtree(self.tmpdir)
           
     def testGetNumDocs(self):      
       self.assertEqual(5, self.iindex.get_num_docs())
@@ -30,12 +39,59 @@ class InvertedIndexTestCase(unittest.TestCase):
       self.assertEqual(1, self.iindex.concurrence('b', 'e'))
       self.assertEqual(0, self.iindex.concurrence('a', 'g'))
 
+    def testIntersectCount(self):
+      # linear merge
+      self.assertEqual(2, intersect_count(array('I', [1, 3, 5, 7]), array('I', [2, 3, 4, 7])))
+      self.assertEqual(0, intersect_count(array('I', []), array('I', [2, 3])))
+      # galloping through the long list
+      long_list = array('I', range(0, 1000, 3))
+      self.assertEqual(2, intersect_count(array('I', [0, 4, 500, 999]), long_list))
+      self.assertEqual(2, intersect_count(long_list, array('I', [0, 4, 500, 999, 1200])))
+
+    def testGetPostings(self):
+      self.assertEqual([0, 1], list(self.iindex.get_postings('c')))
+      self.assertEqual([], list(self.iindex.get_postings('g')))
+      doc_terms = []
+      self.assertEqual(2, self.iindex.add_documents(["c g c", ""], doc_terms = doc_terms))
+      vocab = self.iindex.vocab
+      self.assertEqual([['c', 'g'], []], [sorted(map(vocab.get_term, ids)) for ids in doc_terms])
+      self.assertEqual([0, 1, 5], list(self.iindex.get_postings('c')))
+
+    def testBinaryCorpus(self):
+      path = os.path.join(self.tmpdir, "inverted.bin")
+      self.iindex.save_corpus_to_binary(path)
+      mapped = InvertedIndex()
+      mapped.load_corpus_from_binary(path)
+      self.assertEqual(5, mapped.get_num_docs())
+      self.assertEqual(set(self.iindex.get_terms()), set(mapped.get_terms()))
+      for w1 in self.iindex.get_terms():
+        self.assertEqual(list(self.iindex.get_postings(w1)), list(mapped.get_postings(w1)))
+        self.assertEqual(self.iindex.get_word_appear(w1), mapped.get_word_appear(w1))
+        for w2 in self.iindex.get_terms():
+          self.assertEqual(self.iindex.concurrence(w1, w2), mapped.concurrence(w1, w2))
+      self.assertEqual(0, mapped.concurrence('a', 'g'))
+      self.assertEqual(0, mapped.get_word_appear('g'))
+
+    def testConvertCorpusFile(self):
+      path = os.path.join(self.tmpdir, "inverted.bin")
+      convert_corpus_file(self.corpus_filename, path)
+      mapped = InvertedIndex()
+      mapped.load_corpus_from_binary(path)
+      self.assertEqual(5, mapped.get_num_docs())
+      self.assertEqual(dict((k, list(v)) for k, v in self.iindex),
+        dict((k, list(v)) for k, v in mapped))
+
     def testGetWordAppear(self):
       # added for smoothness
       self.assertEqual(5, self.iindex.get_word_appear('a'))
       self.assertEqual(4, self.iindex.get_word_appear('e'))
       self.assertEqual(3, self.iindex.get_word_appear('d'))
       self.assertEqual(1, self.iindex.get_word_appear('b'))
+      self.assertEqual({'a': 5, 'b': 1, 'c': 2, 'd': 3, 'e': 4, 'f': 5}, self.iindex.term_count)
+      term_count = self.iindex.term_count
+      self.assertRaises(KeyError, term_count.__getitem__, 'g')
+      self.iindex.add_input_document("b g")
+      self.assertEqual((2, 1, 7), (term_count['b'], term_count['g'], len(term_count)))
 
     def testGetTerms(self):
       self.assertEqual(set(['a', 'b', 'c', 'd', 'e', 'f']), set(self.iindex.get_terms()))
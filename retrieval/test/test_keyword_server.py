@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+#
+# The unit test case for keyword_server.KeywordServer
+#
+# @author: Jason Wu (Jasonwbw@yahoo.com)
+
+from ..basic.keyword_server import KeywordServer
+from .test_tfidf import TfIdfCorpusMixin
+import sys
+import unittest
+
+class KeywordServerTestCase(TfIdfCorpusMixin, unittest.TestCase):
+    def setUp(self):
+      TfIdfCorpusMixin.setUp(self)
+      self.server = KeywordServer(tfidf = self.tfidf, top_k = 2, threads = 2)
+
+    def tearDown(self):
+      self.server.close()
+      self.server = None
+      TfIdfCorpusMixin.tearDown(self)
+
+    def testGetKeywords(self):
+      for doc in self.docs:
+        expected = self.tfidf.get_doc_keywords(doc)
+        self.assertKeywordsEqual(expected[:2], self.server.get_keywords(doc))
+        self.assertKeywordsEqual(expected[:1], self.server.get_keywords(doc, top_k = 1))
+        self.assertEqual([], self.server.get_keywords(doc, top_k = 0))
+
+    def testConcurrent(self):
+      results = self.server.get_keywords_many(self.docs * 10)
+      self.assertEqual(40, len(results))
+      for doc, result in zip(self.docs * 10, results):
+        self.assertEqual(self.server.get_keywords(doc), result)
+      self.assertEqual(self.server.get_keywords("x x y"), self.server.submit("x x y").get())
+
+    def testFrozen(self):
+      self.assertRaises(RuntimeError, self.server.tfidf.add_input_document, "a b")
+
+    def testLatency(self):
+      self.assertEqual(0, self.server.get_latency()["count"])
+      self.server.get_keywords_many(self.docs)
+      latency = self.server.get_latency()
+      self.assertEqual(4, latency["count"])
+      self.assertTrue(0 <= latency["p50"] <= latency["p99"])
+
+    def testPrintSomething(self):
+      pass
+
+if __name__ == "__main__":
+    unittest.main()
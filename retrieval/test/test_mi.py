@@ -33,6 +33,23 @@ class MITestCase(unittest.TestCase):
     			res += self.iindex.concurrence(t1, t2) / self.iindex.get_num_docs() * self.pmi.compute_pmi(t1, t2)
     	self.assertEqual(res, self.mi.compute_mi(s1.split(), s2.split()))
 
+    def testComputeMIBatch(self):
+    	pairs = [('a d e'.split(), 'b d c c'.split()), ('c'.split(), 'a x'.split()),
+    		('a d e'.split(), 'b d c c'.split()), ([], ['a'])]
+    	self.assertEqual([self.mi.compute_mi(s1, s2) for s1, s2 in pairs],
+    		self.mi.compute_mi_batch(pairs))
+    	self.assertEqual(0.0, self.mi.compute_mi_batch(pairs)[3])
+
+    def testCache(self):
+    	self.mi = MI(self.iindex, self.pmi, cache_size = 3)
+    	self.mi.compute_mi('a d e'.split(), 'b d c c'.split())
+    	self.assertEqual(3, len(self.mi.cache))
+    	before = self.mi.compute_mi(['c'], ['d'])
+    	self.iindex.add_input_document('c d')
+    	after = self.mi.compute_mi(['c'], ['d'])
+    	self.assertNotEqual(before, after)
+    	self.assertEqual(after, MI(self.iindex, self.pmi).compute_mi(['c'], ['d']))
+
     def testPrintSomething(self):
     	pass
 
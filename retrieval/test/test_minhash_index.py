@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+#
+# The unit test case for minhash_index.MinHashIndex
+#
+# @author: Jason Wu (Jasonwbw@yahoo.com)
+
+from ..basic.minhash_index import MinHashIndex
+from ..basic.minhash_index import sketch_size
+from ..basic.inverted_index import InvertedIndex
+from ..basic.pmi import PMI
+from ..basic.pmi import MI
+from ..basic.npmi import NPMI
+from ..basic.nmi import NMI
+import os
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+
+class MinHashIndexTestCase(unittest.TestCase):
+    def setUp(self):
+      self.lines = [line.strip() for line in file("./nlp_basic/test/test.file")]
+      self.iindex = InvertedIndex()
+      self.iindex.add_documents(self.lines)
+      self.sketch = MinHashIndex()
+      self.sketch.add_documents(self.lines)
+
+    def tearDown(self):
+      self.iindex = None
+      self.sketch = None
+
+    def testExactBelowK(self):
+      self.assertEqual(402, self.sketch.k)
+      self.assertEqual(sorted(self.iindex.get_terms()), sorted(self.sketch.get_terms()))
+      for t1 in self.iindex.get_terms():
+        self.assertEqual(self.iindex.get_word_appear(t1), self.sketch.get_word_appear(t1))
+        for t2 in self.iindex.get_terms():
+          self.assertEqual(self.iindex.concurrence(t1, t2), self.sketch.concurrence(t1, t2))
+      self.assertEqual(0, self.sketch.get_word_appear('x'))
+
+    def testPluggable(self):
+      for cls in (PMI, NPMI):
+        exact = cls(self.iindex, top = 3)
+        exact.build()
+        approx = cls(self.sketch, top = 3)
+        approx.build()
+        for term in self.iindex.get_terms():
+          self.assertEqual([e.get_pair() for e in exact.get_top_pmi(term)],
+            [e.get_pair() for e in approx.get_top_pmi(term)])
+      s1, s2 = 'a d e'.split(), 'b d c c'.split()
+      for cls in (MI, NMI):
+        self.assertEqual(cls(self.iindex, PMI(self.iindex)).compute_mi(s1, s2),
+          cls(self.sketch, PMI(self.sketch)).compute_mi(s1, s2))
+      self.assertRaises(AttributeError, PMI(self.sketch, min_pair_count = 1).build)
+
+    def testEstimate(self):
+      rand = random.Random(0)
+      docs = []
+      for _ in range(20000):
+        words = ["a"] if rand.random() < 0.5 else []
+        if rand.random() < 0.3:
+          words.append("b")
+        if words and words[0] == "a" and rand.random() < 0.4:
+          words.append("c")
+        docs.append(" ".join(words))
+      self.iindex = InvertedIndex()
+      self.iindex.add_documents(docs)
+      self.sketch = MinHashIndex(error = 0.05, seed = 1)
+      self.sketch.add_documents(docs)
+      self.assertTrue(max(len(self.sketch.get_sketch(t)) for t in range(3)) == self.sketch.k)
+      for term in "abc":
+        exact = self.iindex.get_word_appear(term)
+        self.assertTrue(abs(self.sketch.get_word_appear(term) - exact) < 4 * 0.05 * exact)
+      for t1, t2 in (("a", "b"), ("a", "c"), ("b", "c")):
+        exact = self.iindex.concurrence(t1, t2)
+        self.assertTrue(abs(self.sketch.concurrence(t1, t2) - exact) < 0.25 * exact)
+
+    def testMerge(self):
+      docs = ["a b", "a c", "b c d"] * 300
+      whole = MinHashIndex(error = 0.1)
+      whole.add_documents(docs)
+      merged = MinHashIndex(error = 0.1)
+      merged.add_documents(docs[:500])
+      part = MinHashIndex(error = 0.1, first_doc = 500)
+      part.add_documents(docs[500:])
+      self.assertTrue(merged.merge(part) is merged)
+      self.assertEqual(900, merged.get_num_docs())
+      for term in "abcd":
+        self.assertEqual(list(whole.get_sketch(whole.vocab.get_id(term))),
+          list(merged.get_sketch(merged.vocab.get_id(term))))
+      self.assertRaises(ValueError, merged.merge, MinHashIndex(error = 0.1))
+      self.assertRaises(ValueError, merged.merge, MinHashIndex(error = 0.2, first_doc = 900))
+
+    def testSaveLoad(self):
+      path = os.path.join(tempfile.mkdtemp(), "sketch.bin")
+      self.addCleanup(shutil.rmtree, os.path.dirname(path))
+      self.sketch.add_documents(["g h"] * 500)
+      self.sketch.save_corpus_to_binary(path)
+      loaded = MinHashIndex(error = 0.5)
+      loaded.load_corpus_from_binary(path)
+      self.assertEqual((self.sketch.k, self.sketch.get_num_docs()), (loaded.k, loaded.get_num_docs()))
+      self.assertEqual(sorted(self.sketch.get_terms()), sorted(loaded.get_terms()))
+      for t1 in self.sketch.get_terms():
+        self.assertEqual(self.sketch.get_word_appear(t1), loaded.get_word_appear(t1))
+        for t2 in self.sketch.get_terms():
+          self.assertEqual(self.sketch.concurrence(t1, t2), loaded.concurrence(t1, t2))
+      loaded.add_documents(["g"])
+      self.assertEqual(len(self.lines) + 501, loaded.get_num_docs())
+
+    def testSketchSize(self):
+      self.assertEqual(102, sketch_size(0.1))
+
+    def testPrintSomething(self):
+      pass
+
+if __name__ == "__main__":
+    unittest.main()
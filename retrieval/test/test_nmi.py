@@ -41,6 +41,11 @@ class NMITestCase(unittest.TestCase):
             res /= -res2
     	self.assertEqual(res, self.mi.compute_mi(s1.split(), s2.split()))
 
+    def testComputeMIBatch(self):
+    	pairs = [('a d e'.split(), 'b d c c'.split()), ('c'.split(), 'a x'.split()), ([], ['a'])]
+    	self.assertEqual([self.mi.compute_mi(s1, s2) for s1, s2 in pairs],
+    		self.mi.compute_mi_batch(pairs))
+
     def testPrintSomething(self):
     	pass
 
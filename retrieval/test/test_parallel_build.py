@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+#
+# The unit test case for parallel_build and the merge methods
+#
+# @author: Jason Wu (Jasonwbw@yahoo.com)
+
+from ..basic.parallel_build import build_index
+from ..basic.parallel_build import shard_file
+from ..basic.parallel_build import iter_shard
+from ..basic.parallel_build import tree_merge
+from ..basic.inverted_index import InvertedIndex
+from ..basic.tfidf import TfIdf
+from ..basic.class_tfidf import ClassTfIdf
+from ..basic.emi_keywords import ClassInvertedIndex
+import sys
+import unittest
+
+class ParallelBuildTestCase(unittest.TestCase):
+    def setUp(self):
+      self.filename = "./nlp_basic/test/test.file"
+      self.labelled_filename = "./nlp_basic/test/cdf_test.file"
+      self.iindex = InvertedIndex()
+      self.iindex.add_documents(self.filename)
+
+    def tearDown(self):
+      self.iindex = None
+
+    def postings(self, iindex):
+      return dict((k, list(v)) for k, v in iindex)
+
+    def testShardFile(self):
+      shards = shard_file(self.filename, 3)
+      self.assertEqual(3, len(shards))
+      lines = []
+      for start, end in shards:
+        lines.extend(iter_shard(self.filename, start, end))
+      self.assertEqual([line.rstrip("\n") for line in file(self.filename)], lines)
+      # more shards than lines
+      self.assertEqual(5, len(shard_file(self.filename, 20)))
+
+    def testInvertedIndexMerge(self):
+      lines = [line.strip() for line in file(self.filename)]
+      first, second = InvertedIndex(), InvertedIndex()
+      first.add_documents(lines[:2])
+      second.add_documents(lines[2:])
+      first.merge(second)
+      self.assertEqual(self.iindex.get_num_docs(), first.get_num_docs())
+      self.assertEqual(self.postings(self.iindex), self.postings(first))
+      self.assertEqual(5, first.get_word_appear('a'))
+
+    def testBuildInvertedIndex(self):
+      for workers in (1, 2, 3):
+        iindex = build_index(InvertedIndex, self.filename, workers = workers)
+        self.assertEqual(self.iindex.get_num_docs(), iindex.get_num_docs())
+        self.assertEqual(self.postings(self.iindex), self.postings(iindex))
+
+    def testBuildTfIdf(self):
+      expected = TfIdf()
+      expected.add_documents(self.filename)
+      tfidf = build_index(TfIdf, file(self.filename), workers = 2, chunk_size = 2)
+      self.assertEqual(expected.get_num_docs(), tfidf.get_num_docs())
+      self.assertEqual(dict(expected), dict(tfidf))
+
+    def testBuildClassTfIdf(self):
+      expected = ClassTfIdf(3)
+      expected.add_documents(self.labelled_filename)
+      cdf = build_index(ClassTfIdf, self.labelled_filename, workers = 3, args = (3, ))
+      self.assertEqual(expected.num_docs, cdf.num_docs)
+      self.assertEqual(dict(expected), dict(cdf))
+      self.assertRaises(ValueError, cdf.merge, ClassTfIdf(2))
+
+    def testBuildClassInvertedIndex(self):
+      expected = ClassInvertedIndex()
+      expected.add_documents(self.labelled_filename)
+      ciindex = build_index(ClassInvertedIndex, self.labelled_filename, workers = 2)
+      self.assertEqual(expected.get_num_docs(), ciindex.get_num_docs())
+      self.assertEqual(dict(expected), dict(ciindex))
+      self.assertEqual(expected.class_count, ciindex.class_count)
+
+    def testTreeMerge(self):
+      class Part(object):
+        live = 0
+        peak = 0
+        def __init__(self, items):
+          self.items = items
+          Part.live += 1
+          Part.peak = max(Part.peak, Part.live)
+        def merge(self, other):
+          self.items.extend(other.items)
+          Part.live -= 1
+          return self
+      for n in range(1, 40):
+        Part.live = Part.peak = 0
+        self.assertEqual(range(n), tree_merge(Part([i]) for i in range(n)).items)
+        # the parts are folded as they come
+        self.assertTrue(Part.peak <= n.bit_length() + 1)
+      self.assertRaises(ValueError, tree_merge, [])
+
+    def testPrintSomething(self):
+      pass
+
+if __name__ == "__main__":
+    unittest.main()
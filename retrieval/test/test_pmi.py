@@ -8,10 +8,17 @@
 from ..basic.topkheap import TopkHeap
 from ..basic.pmi import PMIElement
 from ..basic.pmi import PMI
+from ..basic.npmi import NPMI
+from ..basic.npmi import npmi_arrays
+from ..basic.pmi import pmi_arrays
 from ..basic.inverted_index import InvertedIndex
 import sys
 import unittest
 import math
+import numpy
+import os
+import shutil
+import tempfile
 
 class PMITestCase(unittest.TestCase):  
     def setUp(self):  
@@ -31,11 +38,159 @@ class PMITestCase(unittest.TestCase):
       d = PMIElement('d', math.log(2*5/(2.0*3), 2))
       e = PMIElement('e', math.log(2*5/(2.0*4), 2))
       f = PMIElement('f', math.log(2*5/(2.0*5), 2))
-      for i in range(len(self.pmi.get_top_pmi('c'))):
-        if i == 0:
-          self.assertEqual(b, self.pmi.get_top_pmi('c')[i])
+      # c appeared with b once, with d twice in 3 documents of d
+      self.assertEqual([b, d], self.pmi.get_top_pmi('c'))
+
+    def testParallelBuild(self):
+      serial = PMI(self.iindex, top = 3)
+      serial.build()
+      parallel = PMI(self.iindex, top = 3)
+      parallel.build(workers = 2, block_size = 2)
+      for term in self.iindex.get_terms():
+        self.assertEqual([e.get_pair() for e in serial.get_top_pmi(term)],
+          [e.get_pair() for e in parallel.get_top_pmi(term)])
+
+    def testCompactStore(self):
+      vocab = self.iindex.vocab
+      neighbors, scores = self.pmi.get_top_pmi_ids(vocab.get_id('c'))
+      self.assertEqual([e.get_pair() for e in self.pmi.get_top_pmi('c')],
+        zip([vocab.get_term(t2) for t2 in neighbors], scores))
+      self.assertEqual(2, len(scores))
+      self.assertTrue(scores[0] >= scores[1])
+      self.assertEqual(math.log(1*5/(2.0*1), 2), scores[0])
+      self.assertRaises(KeyError, self.pmi.get_top_pmi, 'not a term')
+      self.assertEqual(self.pmi.get_top_pmi('c'), self.pmi.term_pmi['c'].topk())
+      self.assertEqual(sorted(self.iindex.get_terms()), sorted(self.pmi.term_pmi))
+      self.assertEqual({}, PMI(self.iindex).term_pmi)
+      small = PMI(self.iindex, top = 2, score_dtype = numpy.float32)
+      small.build()
+      self.assertEqual(numpy.float32, small.scores.dtype)
+      self.assertEqual(list(neighbors), list(small.get_top_pmi_ids(vocab.get_id('c'))[0]))
+
+    def testSaveLoad(self):
+      path = os.path.join(tempfile.mkdtemp(), "pmi.model")
+      try:
+        self.pmi.save(path)
+        for mmap in (True, False):
+          loaded = PMI.load(path, mmap = mmap)
+          self.assertTrue(loaded.iindex is None)
+          for term in self.iindex.get_terms():
+            self.assertEqual([e.get_pair() for e in self.pmi.get_top_pmi(term)],
+              [e.get_pair() for e in loaded.get_top_pmi(term)])
+          loaded = None
+        npmi = NPMI(self.iindex, top = 3, score_dtype = numpy.float32)
+        npmi.build()
+        npmi.save(path)
+        loaded = NPMI.load(path, inverted_index = self.iindex)
+        self.assertEqual(numpy.float32, loaded.scores.dtype)
+        self.assertEqual([e.get_pair() for e in npmi.get_top_pmi('c')],
+          [e.get_pair() for e in loaded.get_top_pmi('c')])
+        self.assertEqual(npmi.compute_pmi('a', 'c'), loaded.compute_pmi('a', 'c'))
+        loaded = None
+      finally:
+        shutil.rmtree(os.path.dirname(path))
+      self.assertRaises(ValueError, PMI(self.iindex).save, path)
+
+    def assertSameTop(self, expected, result):
+      for term in self.iindex.get_terms():
+        pairs = [e.get_pair() for e in result.get_top_pmi(term)]
+        self.assertEqual([e.t2 for e in expected.get_top_pmi(term)], [t2 for t2, _ in pairs])
+        for e, (_, pmi) in zip(expected.get_top_pmi(term), pairs):
+          self.assertAlmostEqual(e.pmi, pmi)
+
+    def testUpdate(self):
+      lines = [line.strip() for line in file("./nlp_basic/test/test.file")]
+      for cls in (PMI, NPMI):
+        self.iindex = InvertedIndex()
+        self.iindex.add_documents(lines + ["g h", "h i"])
+        pmi = cls(self.iindex, top = 3)
+        pmi.build()
+        # only g, i and h holding them
+        self.assertEqual(3, pmi.update(["g i"], stale_ratio = 1.0))
+        self.assertTrue(0 < pmi.update(["a j", "j c"], rebuild_ratio = 1.0, stale_ratio = 1.0))
+        self.assertEqual(10, pmi.num_docs)
+        expected = cls(self.iindex, top = 3)
+        expected.build()
+        if cls is PMI:
+          self.assertSameTop(expected, pmi)
         else:
-          self.assertEqual(a, self.pmi.get_top_pmi('c')[i])
+          self.assertEqual(7, pmi.built_num_docs)
+          # too stale, so rebuilt
+          self.assertEqual(len(self.iindex.get_terms()), pmi.update(["a"], stale_ratio = 0.1))
+          self.assertEqual(11, pmi.built_num_docs)
+      self.assertEqual(0, pmi.update([]))
+
+    def testUpdateModes(self):
+      lines = [line.strip() for line in file("./nlp_basic/test/test.file")]
+      for args, build_args in (({}, {'sparse': True}), ({'min_pair_count': 1}, {}),
+          ({}, {}), ({}, {'workers': 2})):
+        self.iindex = InvertedIndex()
+        self.iindex.add_documents(lines)
+        pmi = PMI(self.iindex, top = 5, **args)
+        pmi.build(**build_args)
+        self.assertTrue(0 < pmi.update(['a c'], rebuild_ratio = 1.0))
+        self.assertTrue(0 < pmi.update(['g a', 'g h', 'b c'], rebuild_ratio = 1.0))
+        expected = PMI(self.iindex, top = 5, **args)
+        expected.build(**build_args)
+        self.assertSameTop(expected, pmi)
+        self.assertEqual(len(expected.neighbors), len(pmi.neighbors))
+        # a too large repair rebuilds with the same arguments
+        self.assertEqual(len(pmi.get_term_ids()), pmi.update(['a h'], rebuild_ratio = 0.0))
+        expected.build(**build_args)
+        self.assertSameTop(expected, pmi)
+      # documents not added by update make a full build
+      self.iindex.add_input_document('b h')
+      self.assertEqual(len(pmi.get_term_ids()), pmi.update(['c'], rebuild_ratio = 1.0))
+      self.assertTrue(0 < pmi.update(['b g'], rebuild_ratio = 1.0))
+      expected.build()
+      self.assertSameTop(expected, pmi)
+
+    def testUpdateInPlace(self):
+      neighbors, scores = self.pmi.neighbors, self.pmi.scores
+      self.assertTrue(0 < self.pmi.update(['a c'], rebuild_ratio = 1.0))
+      self.assertTrue(neighbors is self.pmi.neighbors and scores is self.pmi.scores)
+      expected = PMI(self.iindex, top = 2)
+      expected.build()
+      self.assertSameTop(expected, self.pmi)
+
+    def testPruning(self):
+      self.iindex.add_documents(["x y", "x y", "x z"])
+      for cls in (PMI, NPMI):
+        sparse = cls(self.iindex, top = 3)
+        sparse.build(sparse = True)
+        walked = cls(self.iindex, top = 3, min_pair_count = 1)
+        walked.build()
+        for term in self.iindex.get_terms():
+          self.assertEqual([e.get_pair() for e in sparse.get_top_pmi(term)],
+            [e.get_pair() for e in walked.get_top_pmi(term)])
+
+      pmi = PMI(self.iindex, top = 3, min_term_df = 2, max_term_df = 4, min_pair_count = 2)
+      pmi.build()
+      self.assertEqual(['c', 'd', 'e', 'x', 'y'], sorted(self.iindex.vocab.get_term(t) for t in pmi.get_term_ids()))
+      self.assertEqual([], pmi.get_top_pmi('a'))
+      self.assertEqual(['y'], [e.t2 for e in pmi.get_top_pmi('x')])
+      self.assertEqual(['d', 'e'], sorted(e.t2 for e in pmi.get_top_pmi('c')))
+      dense = PMI(self.iindex, top = 3, min_term_df = 2, max_term_df = 4, min_pair_count = 2)
+      dense.build(workers = 2)
+      self.assertEqual(['d', 'e'], sorted(e.t2 for e in dense.get_top_pmi('c')))
+
+      # z gets into the df range, b goes out of it
+      self.assertTrue(pmi.update(["z", "b c d e", "b", "b", "b"], rebuild_ratio = 1.0) > 0)
+      expected = PMI(self.iindex, top = 3, min_term_df = 2, max_term_df = 4, min_pair_count = 2)
+      expected.build()
+      self.assertSameTop(expected, pmi)
+
+    def testCountArrays(self):
+      # never appeared, never together, every document, and some usual pairs
+      counts = [(0, 0, 3, 5), (0, 2, 3, 5), (5, 5, 5, 5), (1, 2, 1, 5), (2, 3, 4, 5), (3, 7, 9, 20)]
+      concurrence, app1, app2, num_docs = [numpy.array(c, dtype = numpy.float64) for c in zip(*counts)]
+      for cls in (PMI, NPMI):
+        pmi = cls(self.iindex)
+        expected = [pmi.pmi_from_counts(*map(float, c)) for c in counts]
+        self.assertEqual(expected, list(pmi.pmi_from_count_arrays(concurrence, app1, app2, num_docs)))
+      npmi, pmi = npmi_arrays(concurrence, app1, app2, num_docs)
+      self.assertEqual([-float('inf'), -1, 1], list(npmi[:3]))
+      self.assertEqual(list(pmi_arrays(concurrence, app1, app2, num_docs)), list(pmi))
 
     def testPrintSomething(self):
       pass
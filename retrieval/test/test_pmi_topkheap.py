@@ -6,8 +6,12 @@
 # @author: Jason Wu (Jasonwbw@yahoo.com)
 
 from ..basic.topkheap import TopkHeap
+from ..basic.topkheap import ConcurrentTopkHeap
+from ..basic.topkheap import top_candidates
 from ..basic.pmi import PMIElement
+import random
 import sys
+import threading
 import unittest
 
 class TopkHeapTestCase(unittest.TestCase):  
@@ -54,6 +58,75 @@ class TopkHeapTestCase(unittest.TestCase):
       self.heap.push(f)
       self.assertEqual([f, c], self.heap.topk())
 
+    def testPushMany(self):
+      rand = random.Random(0)
+      for k in (1, 3, 10, 50):
+        pushed, bulk = TopkHeap(k), TopkHeap(k)
+        for _ in range(5):
+          # few distinct scores to have a lot of ties
+          scores = [rand.choice([-float('inf'), 0.0, 1.5, 2.0]) for _ in range(20)]
+          ids = rand.sample(range(1000), 20)
+          for score, i in zip(scores, ids):
+            pushed.push((score, i))
+          bulk.push_many(scores, ids)
+          self.assertEqual(pushed.topk(), bulk.topk())
+        # push still works after push_many
+        pushed.push((3.0, 1000))
+        bulk.push((3.0, 1000))
+        self.assertEqual(pushed.topk(), bulk.topk())
+      self.heap.push_many([], [])
+      self.assertEqual([], self.heap.topk())
+
+    def testTopCandidates(self):
+      scores = [1.0, 3.0, 2.0, 2.0, 0.0]
+      self.assertEqual([1, 2, 3], sorted(top_candidates(scores, 2)))
+      self.assertEqual([1], list(top_candidates(scores, 1)))
+      self.assertEqual([0, 1, 2, 3, 4], sorted(top_candidates(scores, 9)))
+      self.assertEqual([], list(top_candidates(scores, 0)))
+
+    def testTopkCache(self):
+      self.heap.push_many([1, 5, 3], ['a', 'b', 'c'])
+      self.assertEqual([(5, 'b'), (3, 'c')], self.heap.topk())
+      self.heap.topk().append(None)
+      self.assertEqual([(5, 'b'), (3, 'c')], self.heap.topk())
+      self.heap.push((4, 'd'))
+      self.assertEqual([(5, 'b'), (4, 'd')], self.heap.topk())
+      self.heap.push((0, 'e'))
+      self.assertEqual([(5, 'b'), (4, 'd')], self.heap.topk())
+
+    def testMerge(self):
+      self.assertEqual(None, self.heap.current_min())
+      self.heap.push(3)
+      self.assertEqual(None, self.heap.current_min())
+      other = TopkHeap(k = 3)
+      for elem in (1, 5, 4, 2):
+        other.push(elem)
+      self.assertEqual(2, other.current_min())
+      self.assertTrue(self.heap.merge(other) is self.heap)
+      self.assertEqual([5, 4], self.heap.topk())
+      self.assertEqual(4, self.heap.current_min())
+      self.assertEqual([5, 4, 2], other.topk())
+
+    def testConcurrent(self):
+      rand = random.Random(0)
+      elems = [(rand.random(), i) for i in range(2000)]
+      heap = ConcurrentTopkHeap(k = 10)
+      def produce(part):
+        for elem in part:
+          current_min = heap.current_min()
+          if current_min is None or elem > current_min:
+            heap.push(elem)
+      threads = [threading.Thread(target = produce, args = (elems[i::4], )) for i in range(4)]
+      for thread in threads:
+        thread.start()
+      for thread in threads:
+        thread.join()
+      self.assertEqual(sorted(elems)[::-1][:10], heap.topk())
+      self.assertTrue(len(heap.heaps) <= 4)
+      self.assertTrue(heap.current_min() <= heap.topk()[-1])
+      heap.push_many([2.0, 3.0], [-1, -2])
+      self.assertEqual([(3.0, -2), (2.0, -1)], heap.topk()[:2])
+
     def testPrintSomething(self):
       pass
 
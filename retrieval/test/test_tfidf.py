@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+#
+# The unit test case for tfidf.TfIdf
+#
+# @author: Jason Wu (Jasonwbw@yahoo.com)
+
+from ..basic.inverted_index import InvertedIndex
+from ..basic.tfidf import TfIdf
+from ..basic.vocabulary import Vocabulary
+import math
+import sys
+import unittest
+
+class TfIdfCorpusMixin(object):
+    '''The test corpus and keyword assertions, shared with test_keyword_server.'''
+    def setUp(self):
+      self.tfidf = TfIdf()
+      for line in file("./nlp_basic/test/test.file"):
+        self.tfidf.add_input_document(line.strip())
+      self.tfidf.stopwords = set(['f'])
+      self.docs = ["a b b c", "d e x f", "", "x x y"]
+
+    def tearDown(self):
+      self.tfidf = None
+
+    def assertKeywordsEqual(self, expected, result):
+      self.assertEqual(len(expected), len(result))
+      for (t1, s1), (t2, s2) in zip(expected, result):
+        self.assertAlmostEqual(s1, s2)
+      self.assertEqual(dict((t, round(s, 9)) for t, s in expected),
+        dict((t, round(s, 9)) for t, s in result))
+
+class TfIdfTestCase(TfIdfCorpusMixin, unittest.TestCase):
+
+    def testGetIdfArray(self):
+      idf = self.tfidf.get_idf_array()
+      for term in ['a', 'b', 'c', 'f']:
+        self.assertAlmostEqual(self.tfidf.get_idf(term), idf[self.tfidf.vocab.get_id(term)])
+
+    def testIdfMemo(self):
+      self.assertAlmostEqual(math.log(6.0 / 4), self.tfidf.get_idf('d'))
+      self.assertEqual(0, self.tfidf.get_idf('f'))
+      self.assertEqual(1.5, self.tfidf.get_idf('x'))
+      self.tfidf.get_idf_array()
+      # the memo follows new documents
+      self.tfidf.add_input_document("d x")
+      self.assertAlmostEqual(math.log(7.0 / 5), self.tfidf.get_idf('d'))
+      self.assertAlmostEqual(math.log(7.0 / 2), self.tfidf.get_idf('x'))
+      self.assertAlmostEqual(math.log(7.0 / 6), self.tfidf.get_idf('a'))
+      idf = self.tfidf.get_idf_array()
+      self.assertAlmostEqual(math.log(7.0 / 2), idf[self.tfidf.vocab.get_id('x')])
+
+    def testFreeze(self):
+      self.tfidf.freeze()
+      self.assertAlmostEqual(math.log(6.0 / 4), self.tfidf.get_idf('d'))
+      self.assertRaises(RuntimeError, self.tfidf.add_input_document, "a")
+
+    def testGetBatchKeywords(self):
+      result = self.tfidf.get_batch_keywords(self.docs)
+      self.assertEqual(len(self.docs), len(result))
+      for doc, keywords in zip(self.docs, result):
+        self.assertKeywordsEqual(self.tfidf.get_doc_keywords(doc), keywords)
+        scores = [score for _, score in keywords]
+        self.assertEqual(sorted(scores, reverse = True), scores)
+
+    def testGetBatchKeywordsTopK(self):
+      full = self.tfidf.get_batch_keywords(self.docs)
+      top = self.tfidf.get_batch_keywords(self.docs, top_k = 2)
+      for keywords, top_keywords in zip(full, top):
+        self.assertEqual([s for _, s in keywords[:2]], [s for _, s in top_keywords])
+
+    def testGetBatchMatrix(self):
+      matrix = self.tfidf.get_batch_matrix(self.docs)
+      self.assertEqual((4, len(self.tfidf.vocab)), matrix.shape)
+      b = self.tfidf.vocab.get_id('b')
+      self.assertAlmostEqual(0.5 * self.tfidf.get_idf('b'), matrix[0, b])
+      # x is unknown and has no column
+      self.assertEqual(0, matrix[3].nnz)
+      # a shared vocabulary has terms this TfIdf never counted
+      self.tfidf.vocab.add('z')
+      matrix = self.tfidf.get_batch_matrix(["z b"])
+      self.assertEqual((1, len(self.tfidf.vocab)), matrix.shape)
+      self.assertAlmostEqual(0.5 * self.tfidf.idf_default, matrix[0, self.tfidf.vocab.get_id('z')])
+      # and their stopwords score 0 as get_idf gives
+      self.tfidf.stopwords.add('z')
+      self.assertEqual(0, self.tfidf.get_batch_matrix(["z b"])[0, self.tfidf.vocab.get_id('z')])
+
+    def testSharedVocabulary(self):
+      vocab = Vocabulary()
+      tfidf = TfIdf(vocabulary = vocab)
+      tfidf.add_input_document("a b c", filter_num = False)
+      InvertedIndex(vocabulary = vocab).add_input_document("x y z")
+      result = tfidf.get_batch_keywords(["q r a"])
+      self.assertKeywordsEqual(tfidf.get_doc_keywords("q r a"), result[0])
+      self.assertEqual(['a', 'q', 'r'], sorted(term for term, _ in result[0]))
+
+    def testPrintSomething(self):
+      pass
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+#
+# The unit test case for vocabulary.Vocabulary
+#
+# @author: Jason Wu (Jasonwbw@yahoo.com)
+
+from ..basic.vocabulary import Vocabulary
+from ..basic.emi_keywords import ClassInvertedIndex
+from ..basic.inverted_index import InvertedIndex
+from ..basic.tfidf import TfIdf
+import os
+import sys
+import tempfile
+import unittest
+
+class VocabularyTestCase(unittest.TestCase):
+    def setUp(self):
+      self.vocab = Vocabulary(['a', 'b'])
+
+    def tearDown(self):
+      self.vocab = None
+
+    def testAdd(self):
+      self.assertEqual(0, self.vocab.add('a'))
+      self.assertEqual(2, self.vocab.add('c'))
+      self.assertEqual('c', self.vocab.get_term(2))
+      self.assertEqual(1, self.vocab.get_id('b'))
+      self.assertEqual(None, self.vocab.get_id('d'))
+      self.assertEqual(3, len(self.vocab))
+
+    def testFreeze(self):
+      self.vocab.freeze()
+      self.assertEqual(None, self.vocab.add('c'))
+      self.assertEqual(1, self.vocab.add('b'))
+      self.assertEqual(False, 'c' in self.vocab)
+
+    def testSaveLoad(self):
+      fd, filename = tempfile.mkstemp()
+      os.close(fd)
+      try:
+        self.vocab.save(filename)
+        vocab = Vocabulary.load(filename)
+      finally:
+        os.remove(filename)
+      self.assertEqual(['a', 'b'], list(vocab))
+      self.assertEqual(True, vocab.frozen)
+
+    def testRestrictIndex(self):
+      iindex = InvertedIndex(vocabulary = ['a', 'c'])
+      for line in file("./nlp_basic/test/test.file"):
+        iindex.add_input_document(line.strip())
+      self.assertEqual(set(['a', 'c']), set(iindex.get_terms()))
+      self.assertEqual(0, iindex.get_word_appear('b'))
+      self.assertTrue(iindex.have_vocabulary)
+      self.assertEqual(['a', 'c'], iindex.vocabulary)
+      self.assertFalse(InvertedIndex().have_vocabulary)
+      self.assertEqual(None, InvertedIndex().vocabulary)
+      ciindex = ClassInvertedIndex(vocabulary = ['a', 'c'])
+      self.assertEqual((True, ['a', 'c']), (ciindex.have_vocabulary, ciindex.vocabulary))
+      self.assertEqual((False, None), (ClassInvertedIndex().have_vocabulary, ClassInvertedIndex().vocabulary))
+
+    def testShare(self):
+      iindex = InvertedIndex(vocabulary = self.vocab)
+      tfidf = TfIdf(vocabulary = self.vocab)
+      tfidf.add_input_document("x b")
+      iindex.add_input_document("y a")
+      self.assertEqual(['a', 'b', 'x', 'y'], list(self.vocab))
+      self.assertEqual(set(['a', 'y']), set(iindex.get_terms()))
+      self.assertEqual(set(['b', 'x']), set(dict(tfidf)))
+      self.assertEqual(1, tfidf.get_term_num_docs('x'))
+      self.assertEqual(0, tfidf.get_term_num_docs('y'))
+
+    def testPrintSomething(self):
+      pass
+
+if __name__ == "__main__":
+    unittest.main()